@@ -0,0 +1,406 @@
+# bmp.py
+# ストリームから1行ずつBMPを読み込むデコーダ (machineに依存しないのでホスト側でも使える)
+#
+# 対応形式:
+#   1/2/4/8ビット インデックスカラー (BI_RGB, BI_RLE8, BI_RLE4)
+#   16/32ビット (BI_RGB, BI_BITFIELDS)
+#   24ビット (BI_RGB)
+#   高さが負のトップダウン形式 (RLEは除く)
+
+BI_RGB = 0
+BI_RLE8 = 1
+BI_RLE4 = 2
+BI_BITFIELDS = 3
+
+FILE_HEADER_SIZE = 14
+
+
+def read_into(stream, view):
+    """
+    view (memoryview) が埋まるまで stream から読み込み、読み込めたバイト数を返す。
+    readinto を持たないストリームでは read で代用する。
+    """
+    size = len(view)
+    pos = 0
+    readinto = getattr(stream, "readinto", None)
+    while pos < size:
+        if readinto is not None:
+            n = readinto(view[pos:])
+        else:
+            chunk = stream.read(size - pos)
+            n = len(chunk) if chunk else 0
+            view[pos:pos + n] = chunk
+        if not n:
+            break
+        pos += n
+    return pos
+
+
+def _read_exact(stream, size):
+    buf = bytearray(size)
+    if read_into(stream, memoryview(buf)) < size:
+        raise ValueError("Unexpected end of BMP header")
+    return buf
+
+
+def _skip(stream, size, chunk_size=256):
+    # seek() を使わずに read() で読み飛ばす
+    while size > 0:
+        data = stream.read(min(size, chunk_size))
+        if not data:
+            raise ValueError("Connection closed while skipping to pixel data")
+        size -= len(data)
+
+
+def _mask_shift(mask):
+    """ビットマスクのシフト量と幅を返す。"""
+    shift = 0
+    if mask:
+        while not (mask >> shift) & 1:
+            shift += 1
+    bits = 0
+    while (mask >> (shift + bits)) & 1:
+        bits += 1
+    return shift, bits
+
+
+def _scale_table(bits):
+    """bits ビットの値を 0-255 に引き伸ばすテーブル。"""
+    if bits == 0:
+        return bytes(1)
+    top = (1 << bits) - 1
+    return bytes((v * 255 + top // 2) // top for v in range(top + 1))
+
+
+class _ByteSource:
+    """RLEのように1バイトずつ読む形式のための小さな読み込みバッファ。"""
+
+    def __init__(self, stream, size=256):
+        self.stream = stream
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.pos = 0
+        self.end = 0
+
+    def u8(self):
+        if self.pos >= self.end:
+            self.end = self._fill()
+            if not self.end:
+                raise EOFError
+        value = self.buf[self.pos]
+        self.pos += 1
+        return value
+
+    def _fill(self):
+        readinto = getattr(self.stream, "readinto", None)
+        if readinto is not None:
+            n = readinto(self.view)
+        else:
+            chunk = self.stream.read(len(self.buf))
+            n = len(chunk) if chunk else 0
+            self.view[0:n] = chunk
+        self.pos = 0
+        return n or 0
+
+
+class BMPReader:
+    """
+    BMPのヘッダを読み込み、ピクセルデータを1行ずつ返す。
+    行はファイルに格納されている順 (ボトムアップなら画像の下から) に返る。
+
+    header には、形式の判別のために先に読んだファイルヘッダ (14バイト) を渡せる。
+    """
+
+    def __init__(self, stream, header=None):
+        self.stream = stream
+        if header is None:
+            header = _read_exact(stream, FILE_HEADER_SIZE)
+        if len(header) < FILE_HEADER_SIZE or header[:2] != b'BM':
+            raise ValueError("Not a valid BMP file")
+        self.offset = int.from_bytes(header[10:14], 'little')
+
+        dib_size = int.from_bytes(_read_exact(stream, 4), 'little')
+        dib = _read_exact(stream, dib_size - 4)
+        consumed = FILE_HEADER_SIZE + dib_size
+
+        if dib_size == 12:
+            # OS/2 BITMAPCOREHEADER
+            width = int.from_bytes(dib[0:2], 'little')
+            height = int.from_bytes(dib[2:4], 'little')
+            self.bpp = int.from_bytes(dib[6:8], 'little')
+            self.compression = BI_RGB
+            colors_used = 0
+            palette_entry = 3
+        elif dib_size >= 40:
+            width = int.from_bytes(dib[0:4], 'little')
+            height = int.from_bytes(dib[4:8], 'little')
+            if height >= 0x80000000:
+                height -= 0x100000000 # 符号付き
+            self.bpp = int.from_bytes(dib[10:12], 'little')
+            self.compression = int.from_bytes(dib[12:16], 'little')
+            colors_used = int.from_bytes(dib[28:32], 'little')
+            palette_entry = 4
+        else:
+            raise ValueError(f"Unsupported DIB header size: {dib_size}")
+
+        self.width = width
+        self.top_down = height < 0
+        self.height = -height if height < 0 else height
+        self.indexed = self.bpp <= 8
+
+        # --- 形式のチェック ---
+        compression = self.compression
+        if compression == BI_RLE8 and self.bpp != 8 or compression == BI_RLE4 and self.bpp != 4:
+            raise ValueError(f"RLE compression {compression} does not match bit depth {self.bpp}")
+        if compression == BI_BITFIELDS and self.bpp not in (16, 32):
+            raise ValueError(f"BI_BITFIELDS is not supported for bit depth {self.bpp}")
+        if compression not in (BI_RGB, BI_RLE8, BI_RLE4, BI_BITFIELDS):
+            raise ValueError(f"Unsupported compression: {compression}")
+        if self.bpp not in (1, 2, 4, 8, 16, 24, 32):
+            raise ValueError(f"Unsupported bit depth: {self.bpp}")
+        if self.top_down and compression in (BI_RLE8, BI_RLE4):
+            raise ValueError("Top-down RLE BMP is not allowed")
+
+        # --- カラーマスク (16/32ビット) ---
+        masks = None
+        if compression == BI_BITFIELDS:
+            if dib_size >= 52:
+                masks = dib[36:48]
+            else:
+                masks = _read_exact(stream, 12)
+                consumed += 12
+            masks = (
+                int.from_bytes(masks[0:4], 'little'),
+                int.from_bytes(masks[4:8], 'little'),
+                int.from_bytes(masks[8:12], 'little'),
+            )
+        elif self.bpp == 16:
+            masks = (0x7C00, 0x03E0, 0x001F) # 5-5-5
+        elif self.bpp == 32:
+            masks = (0xFF0000, 0x00FF00, 0x0000FF)
+        if masks:
+            self._channels = tuple(_mask_shift(mask) for mask in masks)
+            self._scales = tuple(_scale_table(bits) for _, bits in self._channels)
+
+        # --- パレット (BGR の順に3バイトずつ保持する) ---
+        self.palette = None
+        if self.indexed:
+            count = colors_used or (1 << self.bpp)
+            raw = _read_exact(stream, count * palette_entry)
+            consumed += count * palette_entry
+            palette = bytearray(count * 3)
+            for i in range(count):
+                palette[i * 3:i * 3 + 3] = raw[i * palette_entry:i * palette_entry + 3]
+            self.palette = palette
+
+        # --- ピクセルデータの開始位置まで読み飛ばす ---
+        if self.offset > consumed:
+            _skip(stream, self.offset - consumed)
+
+        self.row_size = ((self.bpp * width + 31) // 32) * 4
+        self.short_rows = 0 # データが足りずにゼロ埋めした行数
+        self._bgr = bytearray(width * 3)
+        self._idx = bytearray(width)
+        if compression in (BI_RLE8, BI_RLE4):
+            self._source = _ByteSource(stream)
+            self._rle_x = 0
+            self._rle_skip = 0
+            self._rle_done = False
+        else:
+            self._raw = bytearray(self.row_size)
+            self._raw_view = memoryview(self._raw)
+
+    def palette_map(self, epd_palette, nearest):
+        """
+        BMPのパレットの各色をEPDのパレットのインデックスに変換する表を返す。
+        戻り値は (表, すべての色がEPDの色と一致したか)。
+        nearest は dither.rgb_to_epd_color と同じ形の関数。
+        """
+        palette = self.palette
+        count = len(palette) // 3
+        table = bytearray(count)
+        exact = True
+        for i in range(count):
+            b, g, r = palette[i * 3], palette[i * 3 + 1], palette[i * 3 + 2]
+            index = nearest(r, g, b, epd_palette)
+            table[i] = index
+            if epd_palette[index] != (r, g, b):
+                exact = False
+        return table, exact
+
+    def _read_raw(self):
+        raw = self._raw
+        n = read_into(self.stream, self._raw_view)
+        if n < self.row_size:
+            self.short_rows += 1
+            for i in range(n, self.row_size):
+                raw[i] = 0 # 足りない分をゼロ埋め
+        return raw
+
+    def _read_indices(self):
+        """インデックスカラーの1行をパレットインデックスとして self._idx に展開する。"""
+        idx = self._idx
+        if self.compression != BI_RGB:
+            self._decode_rle_row()
+            return idx
+
+        raw = self._read_raw()
+        width = self.width
+        bpp = self.bpp
+        if bpp == 8:
+            idx[:] = memoryview(raw)[0:width]
+        elif bpp == 4:
+            x = 0
+            for i in range(width >> 1):
+                value = raw[i]
+                idx[x] = value >> 4
+                idx[x + 1] = value & 0x0F
+                x += 2
+            if width & 1:
+                idx[x] = raw[width >> 1] >> 4
+        elif bpp == 2:
+            for x in range(width):
+                idx[x] = (raw[x >> 2] >> (6 - ((x & 3) << 1))) & 0b11
+        else: # 1ビット
+            for x in range(width):
+                idx[x] = (raw[x >> 3] >> (7 - (x & 7))) & 1
+        return idx
+
+    def _decode_rle_row(self):
+        idx = self._idx
+        width = self.width
+        for i in range(width):
+            idx[i] = 0 # 記述されないピクセルはパレットの0番
+
+        if self._rle_skip:
+            # デルタで飛ばされた行
+            self._rle_skip -= 1
+            return
+        if self._rle_done:
+            return
+
+        src = self._source
+        rle4 = self.compression == BI_RLE4
+        x = self._rle_x
+        self._rle_x = 0
+        try:
+            while True:
+                count = src.u8()
+                value = src.u8()
+                if count:
+                    # エンコードモード: 同じ値 (RLE4は2つの値の交互) を count 個
+                    end = min(width, x + count)
+                    if rle4:
+                        high = value >> 4
+                        low = value & 0x0F
+                        for i in range(x, end):
+                            idx[i] = low if (i - x) & 1 else high
+                    else:
+                        for i in range(x, end):
+                            idx[i] = value
+                    x += count
+                elif value == 0: # 行の終わり
+                    return
+                elif value == 1: # ビットマップの終わり
+                    self._rle_done = True
+                    return
+                elif value == 2: # デルタ
+                    x += src.u8()
+                    dy = src.u8()
+                    if dy:
+                        self._rle_skip = dy - 1
+                        self._rle_x = x
+                        return
+                else:
+                    # 絶対モード: value 個の値がそのまま続く (2バイト境界に揃える)
+                    if rle4:
+                        nbytes = (value + 1) >> 1
+                        for i in range(value):
+                            if i & 1:
+                                pixel = data & 0x0F
+                            else:
+                                data = src.u8()
+                                pixel = data >> 4
+                            if x < width:
+                                idx[x] = pixel
+                            x += 1
+                    else:
+                        nbytes = value
+                        for i in range(value):
+                            data = src.u8()
+                            if x < width:
+                                idx[x] = data
+                            x += 1
+                    if nbytes & 1:
+                        src.u8()
+        except EOFError:
+            self.short_rows += 1
+            self._rle_done = True
+
+    def read_row(self):
+        """
+        次の行を24ビットBGR (BMPの並び順) で返す。
+        戻り値は内部バッファなので、次の呼び出しまでに使い終えること。
+        """
+        bpp = self.bpp
+        if bpp == 24:
+            return self._read_raw()
+
+        bgr = self._bgr
+        width = self.width
+        if self.indexed:
+            idx = self._read_indices()
+            palette = self.palette
+            count = len(palette) // 3
+            p = 0
+            for x in range(width):
+                i = idx[x]
+                if i >= count:
+                    i = 0
+                i *= 3
+                bgr[p] = palette[i]
+                bgr[p + 1] = palette[i + 1]
+                bgr[p + 2] = palette[i + 2]
+                p += 3
+            return bgr
+
+        raw = self._read_raw()
+        (r_shift, _), (g_shift, _), (b_shift, _) = self._channels
+        r_scale, g_scale, b_scale = self._scales
+        r_max = len(r_scale) - 1
+        g_max = len(g_scale) - 1
+        b_max = len(b_scale) - 1
+        step = bpp >> 3
+        p = 0
+        q = 0
+        for x in range(width):
+            if step == 2:
+                value = raw[q] | (raw[q + 1] << 8)
+            else:
+                value = raw[q] | (raw[q + 1] << 8) | (raw[q + 2] << 16) | (raw[q + 3] << 24)
+            bgr[p] = b_scale[(value >> b_shift) & b_max]
+            bgr[p + 1] = g_scale[(value >> g_shift) & g_max]
+            bgr[p + 2] = r_scale[(value >> r_shift) & r_max]
+            p += 3
+            q += step
+        return bgr
+
+    def read_row_indices(self, out, index_map, reverse=False):
+        """
+        インデックスカラーの次の行を、index_map (palette_map の表) で変換して out に書き込む。
+        reverse=True なら左右反転して書き込む。
+        """
+        idx = self._read_indices()
+        width = self.width
+        count = len(index_map)
+        if reverse:
+            x = width - 1
+            for i in range(width):
+                value = idx[i]
+                out[x] = index_map[value] if value < count else index_map[0]
+                x -= 1
+        else:
+            for i in range(width):
+                value = idx[i]
+                out[i] = index_map[value] if value < count else index_map[0]
+        return out
@@ -0,0 +1,352 @@
+# dither.py
+# EPDの4色パレットへの色変換 (machineに依存しないのでホスト側でも使える)
+from array import array
+
+# --- オーダード・ディザリング設定 ---
+# 2x2 Bayer Matrix (0-3の範囲の値)
+# このパターンが画面全体で繰り返される
+BAYER_MATRIX_2X2 = (
+    (0, 2),
+    (3, 1)
+)
+
+# ディザリング強度係数 (値を大きくするとディザリング効果が強くなるが、ざらつきも増える可能性)
+# どの程度の値が良いかは試行錯誤が必要 (例: 16, 32, 48)
+DITHER_FACTOR = 32
+
+# --- 色削減処理の改善 ---
+
+# EPDの4色パレット (RGBタプルのタプル)
+# C++コードの palette 配列に対応します。
+# インデックス 0: 黒, 1: 白, 2: 黄, 3: 赤 の順序が重要です。
+# EPDの実際の発色に合わせて微調整が必要な場合があります。
+EPD_PALETTE = (
+    (0, 0, 0),       # Black (Index 0)
+    (255, 255, 255), # White (Index 1)
+    (255, 255, 0),   # Yellow (Index 2)
+    (255, 0, 0),     # Red (Index 3)
+    # 必要であれば他の色を追加したり、RGB値を調整したりできます
+    # 例えば、より暗い赤を表現したい場合など (ただし、EPDが表現できる範囲で)
+    # (128, 0, 0), # 暗い赤？ (もし使うならインデックス4になる)
+)
+
+# C++のdepalette関数を参考に書き換えた色変換関数
+def rgb_to_epd_color(r, g, b, palette):
+    """
+    入力されたRGB値に最も近い色をパレットから探し、そのインデックスを返す。
+    距離計算にはRGB各成分の差の二乗和を使用。
+    """
+    min_diff_sq = 3 * (255**2) + 1 # 差の二乗和の最大値(255^2 * 3)より大きい初期値
+    best_index = 0                 # デフォルトは黒インデックス
+
+    # enumerateを使って、インデックスと色タプルを同時に取得
+    for index, pal_color in enumerate(palette):
+        pal_r, pal_g, pal_b = pal_color
+
+        # RGB各成分の差を計算
+        diff_r = r - pal_r
+        diff_g = g - pal_g
+        diff_b = b - pal_b
+
+        # 差の二乗和を計算 (ユークリッド距離の二乗)
+        # math.pow を使うより直接計算する方が速いことが多い
+        diff_sq = (diff_r * diff_r) + (diff_g * diff_g) + (diff_b * diff_b)
+
+        # 現在の最小距離よりも小さければ更新
+        if diff_sq < min_diff_sq:
+            min_diff_sq = diff_sq
+            best_index = index
+            # 完全に色が一致した場合、それ以上探す必要はない
+            if min_diff_sq == 0:
+                break
+
+    return best_index # 最も色が近いパレットのインデックス (0, 1, 2, or 3)
+
+
+# --- 量子化ルックアップテーブル (LUT) ---
+# RGB各成分の上位LUT_BITSビットをインデックスにして、最も近いパレットの
+# インデックス(0-3)を2ビットずつbytearrayに詰めて持つ。
+# 5ビットの場合 32*32*32 エントリ = 8192 バイト。
+LUT_BITS = 5
+LUT_SHIFT = 8 - LUT_BITS
+
+# LUTのキャッシュファイル (フラッシュ上)
+LUT_CACHE_FILE = "color_lut.bin"
+LUT_MAGIC = b"LUT"
+
+_color_lut = None
+
+
+def build_color_lut(palette=EPD_PALETTE, bits=LUT_BITS):
+    """
+    パレットから量子化LUTを作成する。
+    各セルの中心値で厳密な最近傍探索 (rgb_to_epd_color) を行う。
+    """
+    levels = 1 << bits
+    shift = 8 - bits
+    half = (1 << shift) >> 1 # セルの中心へのオフセット
+    lut = bytearray((levels * levels * levels) // 4)
+
+    i = 0
+    for r in range(levels):
+        rv = (r << shift) + half
+        for g in range(levels):
+            gv = (g << shift) + half
+            for b in range(levels):
+                bv = (b << shift) + half
+                index = rgb_to_epd_color(rv, gv, bv, palette)
+                lut[i >> 2] |= index << ((i & 3) << 1)
+                i += 1
+    return lut
+
+
+def _lut_header(palette, bits):
+    header = bytearray(LUT_MAGIC)
+    header.append(bits)
+    header.append(len(palette))
+    for pal_color in palette:
+        header.extend(bytes(pal_color))
+    return bytes(header)
+
+
+def load_color_lut(path=LUT_CACHE_FILE, palette=EPD_PALETTE, bits=LUT_BITS):
+    """
+    フラッシュにキャッシュしたLUTを読み込む。
+    ファイルが無い、またはパレットが変わっている場合は作り直して保存する。
+    """
+    header = _lut_header(palette, bits)
+    lut_size = (1 << (3 * bits)) // 4
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(header)) == header:
+                lut = bytearray(lut_size)
+                if f.readinto(lut) == lut_size:
+                    return lut
+    except OSError:
+        pass
+
+    print("Building color LUT...")
+    lut = build_color_lut(palette, bits)
+    try:
+        with open(path, "wb") as f:
+            f.write(header)
+            f.write(lut)
+    except OSError as e:
+        print(f"Warning: failed to cache color LUT: {e}")
+    return lut
+
+
+def get_color_lut():
+    """起動中に一度だけLUTを読み込み、以降は同じものを返す。"""
+    global _color_lut
+    if _color_lut is None:
+        _color_lut = load_color_lut()
+    return _color_lut
+
+
+# --- Bayerセルごとの閾値を畳み込んだテーブル ---
+# 各セルの閾値の加算とクリッピング、LUTインデックスへのシフトを事前に済ませた
+# 256エントリのテーブルを R, G, B それぞれに持つ。
+# LUTのインデックスは R[r] | G[g] | B[b] だけで求まる。
+def build_bayer_tables(factor=DITHER_FACTOR):
+    """BAYER_MATRIX_2X2 と同じ形で、各セルの (R, G, B) テーブルを返す。"""
+    tables = []
+    for bayer_row in BAYER_MATRIX_2X2:
+        cells = []
+        for bayer_value in bayer_row:
+            # Bayer値(0-3)を中心化して強度を掛けた閾値 (-F/2 〜 +F/2)
+            threshold = int(((bayer_value / 3.0) - 0.5) * factor)
+            r_table = array('H', bytes(512))
+            g_table = array('H', bytes(512))
+            b_table = bytearray(256)
+            for v in range(256):
+                q = max(0, min(255, v + threshold)) >> LUT_SHIFT
+                r_table[v] = q << (2 * LUT_BITS)
+                g_table[v] = q << LUT_BITS
+                b_table[v] = q
+            cells.append((r_table, g_table, b_table))
+        tables.append(tuple(cells))
+    return tuple(tables)
+
+
+_bayer_tables = None
+
+
+def quantize_row_bayer(row_data, y, width, indices, lut):
+    """
+    24ビットBMPの1行 (BGR, BMPの並び順) をディザリングして、
+    パネルの並び順 (左右反転) のパレットインデックスを indices に書き込む。
+    内側のループでは浮動小数点演算もクリッピングも行わない。
+    """
+    global _bayer_tables
+    if _bayer_tables is None:
+        _bayer_tables = build_bayer_tables()
+    (r_even, g_even, b_even), (r_odd, g_odd, b_odd) = _bayer_tables[y & 1]
+
+    pair_end = width & ~1
+    p = (width - 1) * 3 # x_epd = 0 は BMPの行末のピクセル
+    for x in range(0, pair_end, 2):
+        i = r_even[row_data[p + 2]] | g_even[row_data[p + 1]] | b_even[row_data[p]]
+        indices[x] = (lut[i >> 2] >> ((i & 3) << 1)) & 0b11
+        p -= 3
+        i = r_odd[row_data[p + 2]] | g_odd[row_data[p + 1]] | b_odd[row_data[p]]
+        indices[x + 1] = (lut[i >> 2] >> ((i & 3) << 1)) & 0b11
+        p -= 3
+    if pair_end < width:
+        i = r_even[row_data[p + 2]] | g_even[row_data[p + 1]] | b_even[row_data[p]]
+        indices[pair_end] = (lut[i >> 2] >> ((i & 3) << 1)) & 0b11
+
+
+# --- ディザリングエンジン ---
+# どのエンジンも convert_row(row_data, y, indices) を持ち、
+# 24ビットBMPの1行 (BGR, BMPの並び順) からパネルの並び順 (左右反転) の
+# パレットインデックスを indices に書き込む。
+# 行は y = 0 から順に1回ずつ渡される (ストリーミング時のBMPの行順と同じ)。
+
+class NearestDither:
+    """ディザリングなし。LUTで最も近い色を選ぶだけ。"""
+    name = "none"
+
+    def __init__(self, width, lut):
+        self.width = width
+        self.lut = lut
+
+    def convert_row(self, row_data, y, indices):
+        lut = self.lut
+        p = (self.width - 1) * 3
+        for x in range(self.width):
+            i = ((row_data[p + 2] >> LUT_SHIFT) << (2 * LUT_BITS)) | ((row_data[p + 1] >> LUT_SHIFT) << LUT_BITS) | (row_data[p] >> LUT_SHIFT)
+            indices[x] = (lut[i >> 2] >> ((i & 3) << 1)) & 0b11
+            p -= 3
+
+
+class BayerDither(NearestDither):
+    """2x2 Bayer のオーダード・ディザリング (従来の方式)。"""
+    name = "bayer"
+
+    def convert_row(self, row_data, y, indices):
+        quantize_row_bayer(row_data, y, self.width, indices, self.lut)
+
+
+class ErrorDiffusionDither(NearestDither):
+    """
+    誤差拡散ディザリングの基底クラス。
+    KERNEL は (dx, dy, weight) のタプルで、重みの合計は 1 << SHIFT 以下。
+    誤差は (dy の最大値 + 1) 行分の array('h') のリングに溜めるので、
+    メモリ使用量は画像の幅に比例するだけで済む。
+    """
+    KERNEL = ()
+    SHIFT = 0
+    MARGIN = 2 # 左右にはみ出す誤差を受けるための余白 (ピクセル)
+
+    def __init__(self, width, lut, palette=EPD_PALETTE):
+        super().__init__(width, lut)
+        self.palette = palette
+        self.depth = max(dy for _, dy, _ in self.KERNEL) + 1
+        size = (width + 2 * self.MARGIN) * 3 # RGBを並べて保持する
+        self._zero = array('h', bytes(size * 2))
+        rows = [array('h', self._zero) for _ in range(self.depth)]
+        self._half = (1 << self.SHIFT) >> 1 # 四捨五入用
+        # y % depth ごとに (現在の行, (誤差を足す行, バッファ内のオフセット, 重み) のタプル)
+        # を作っておき、行ごとにリストやタプルを確保しない
+        self._phases = []
+        for k in range(self.depth):
+            ring = [rows[(k + dy) % self.depth] for dy in range(self.depth)]
+            taps = tuple((ring[dy], dx * 3, weight) for dx, dy, weight in self.KERNEL)
+            self._phases.append((ring[0], taps))
+
+    def convert_row(self, row_data, y, indices):
+        lut = self.lut
+        palette = self.palette
+        shift = self.SHIFT
+        half = self._half
+        current, taps = self._phases[y % self.depth]
+
+        p = (self.width - 1) * 3
+        j = self.MARGIN * 3
+        for x in range(self.width):
+            r = row_data[p + 2] + current[j]
+            g = row_data[p + 1] + current[j + 1]
+            b = row_data[p] + current[j + 2]
+            r = 0 if r < 0 else (255 if r > 255 else r)
+            g = 0 if g < 0 else (255 if g > 255 else g)
+            b = 0 if b < 0 else (255 if b > 255 else b)
+
+            i = ((r >> LUT_SHIFT) << (2 * LUT_BITS)) | ((g >> LUT_SHIFT) << LUT_BITS) | (b >> LUT_SHIFT)
+            index = (lut[i >> 2] >> ((i & 3) << 1)) & 0b11
+            indices[x] = index
+
+            pal_r, pal_g, pal_b = palette[index]
+            err_r = r - pal_r
+            err_g = g - pal_g
+            err_b = b - pal_b
+            for buf, offset, weight in taps:
+                k = j + offset
+                buf[k] += (err_r * weight + half) >> shift
+                buf[k + 1] += (err_g * weight + half) >> shift
+                buf[k + 2] += (err_b * weight + half) >> shift
+            p -= 3
+            j += 3
+
+        # 処理が終わった行は、リングの末尾 (y + depth 行目) として再利用する
+        current[:] = self._zero
+
+
+class FloydSteinbergDither(ErrorDiffusionDither):
+    name = "floyd-steinberg"
+    KERNEL = ((1, 0, 7), (-1, 1, 3), (0, 1, 5), (1, 1, 1))
+    SHIFT = 4
+
+
+class AtkinsonDither(ErrorDiffusionDither):
+    name = "atkinson"
+    KERNEL = ((1, 0, 1), (2, 0, 1), (-1, 1, 1), (0, 1, 1), (1, 1, 1), (0, 2, 1))
+    SHIFT = 3
+
+
+class SierraLiteDither(ErrorDiffusionDither):
+    name = "sierra-lite"
+    KERNEL = ((1, 0, 2), (-1, 1, 1), (0, 1, 1))
+    SHIFT = 2
+
+
+DITHER_ENGINES = {
+    engine.name: engine
+    for engine in (NearestDither, BayerDither, FloydSteinbergDither, AtkinsonDither, SierraLiteDither)
+}
+
+
+def make_dither_engine(name, width, lut):
+    """credentials.json の "dither" の値からエンジンを作る。"""
+    try:
+        engine = DITHER_ENGINES[name]
+    except KeyError:
+        print(f"Warning: unknown dither mode '{name}', using bayer.")
+        engine = BayerDither
+    return engine(width, lut)
+
+
+# --- 2bppへのパック ---
+def pack_2bpp(indices, out, offset=0):
+    """
+    パレットインデックス (0-3) を4つずつ1バイトに詰めて out[offset:] に書き込む。
+    先頭のピクセルが上位ビットに入る。出力の各バイトは1回だけ書き込まれる。
+    戻り値は書き込んだ次の位置。
+    """
+    o = offset
+    n = len(indices)
+    end = n - (n & 3)
+    # 添字で読む (zip のように出力1バイトごとにタプルを作らない)
+    for i in range(0, end, 4):
+        out[o] = (indices[i] << 6) | (indices[i + 1] << 4) | (indices[i + 2] << 2) | indices[i + 3]
+        o += 1
+
+    # 4で割り切れない場合の残り (下位ビットは0で埋める)
+    rest = n & 3
+    if rest:
+        value = 0
+        for i in range(end, n):
+            value = (value << 2) | indices[i]
+        out[o] = value << ((4 - rest) * 2)
+        o += 1
+    return o
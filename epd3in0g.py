@@ -1,13 +1,80 @@
 # epd3in0g.py
 import time
-from machine import Pin, SPI
+from machine import Pin, SPI, idle
+from dither import pack_2bpp
 
 # Display resolution
 EPD_WIDTH = 168
 EPD_HEIGHT = 400
 
+# BUSYの解除を待つ最大時間 (リフレッシュは十数秒かかる)
+BUSY_TIMEOUT_MS = 60000
+
+# 記録しておくBUSY時間の件数
+BUSY_LOG_SIZE = 16
+
+# SPIの接続と既定の設定
+SPI_ID = 0
+SCK_PIN = 18
+MOSI_PIN = 19
+SPI_BAUDRATE = 4000000
+# コントローラのシリアルインターフェースの上限 (書き込みサイクル 100ns)。
+# パネル側は MOSI のみで読み返せないため、これを超える設定は受け付けない
+SPI_MAX_BAUDRATE = 10000000
+# 1回の spi.write() で送る最大バイト数 (0なら分割せずに1回で送る)
+SPI_CHUNK = 0
+
+# benchmark_spi() で試す設定 (SPI_MAX_BAUDRATE 以下)
+SPI_BENCHMARK_BAUDRATES = (4000000, 6000000, 8000000, 10000000)
+SPI_BENCHMARK_CHUNKS = (0, 4096, 1024)
+SPI_BENCHMARK_REPEATS = 3
+# 計測のばらつき (最大と最小の差) がこの割合 (%) を超える設定は除く。
+# 割り込みなどによる計測の乱れを除くためのもので、パネルが正しく受信できたかは
+# 時間からは分からない
+SPI_BENCHMARK_JITTER = 20
+# 最速との差がこの割合 (%) 以内なら、より低いボーレートを選ぶ
+SPI_BENCHMARK_MARGIN = 5
+
+
+# コマンドテーブル: (コマンド, データ長, データ...) を並べたバイト列。
+# send_sequence() で1コマンドにつきCSを1回だけ下げ、データはまとめて送る。
+# 別の型番のパネルでは EPD の init_sequence などを差し替える。
+INIT_SEQUENCE = bytes((
+    0x66, 6, 0x49, 0x55, 0x13, 0x5D, 0x05, 0x10,
+    0xB0, 1, 0x00,                   # 1 boost
+    0x01, 2, 0x0F, 0x00,
+    0x00, 2, 0x4F, 0x6B,
+    0x06, 3, 0xD7, 0xDE, 0x12,
+    0x61, 4, 0x00, 0xA8, 0x01, 0x90, # 168 x 400
+    0x50, 1, 0x37,
+    0x60, 2, 0x0C, 0x05,
+    0xE3, 1, 0xFF,
+    0x84, 1, 0x00,
+))
+POWER_ON_SEQUENCE = bytes((0x04, 0))             # POWER_ON
+REFRESH_SEQUENCE = bytes((0x12, 1, 0x01))        # DISPLAY_REFRESH
+POWER_OFF_SEQUENCE = bytes((0x02, 1, 0x00))      # POWER_OFF
+DEEP_SLEEP_SEQUENCE = bytes((0x02, 1, 0x00,      # POWER_OFF
+                             0x07, 1, 0xA5))     # DEEP_SLEEP
+PARTIAL_IN_SEQUENCE = bytes((0x91, 0))           # PARTIAL_IN
+PARTIAL_OUT_SEQUENCE = bytes((0x92, 0))          # PARTIAL_OUT
+PARTIAL_WINDOW = 0x90
+
+
+class BusyTimeoutError(OSError):
+    pass
+
 class EPD:
-    def __init__(self, rst_pin, dc_pin, cs_pin, busy_pin):
+    init_sequence = INIT_SEQUENCE
+    power_on_sequence = POWER_ON_SEQUENCE
+    refresh_sequence = REFRESH_SEQUENCE
+    power_off_sequence = POWER_OFF_SEQUENCE
+    deep_sleep_sequence = DEEP_SLEEP_SEQUENCE
+    partial_in_sequence = PARTIAL_IN_SEQUENCE
+    partial_out_sequence = PARTIAL_OUT_SEQUENCE
+
+    def __init__(self, rst_pin, dc_pin, cs_pin, busy_pin, busy_timeout_ms=BUSY_TIMEOUT_MS,
+                 baudrate=SPI_BAUDRATE, chunk_size=SPI_CHUNK):
         self.rst_pin = Pin(rst_pin, Pin.OUT)
         self.dc_pin = Pin(dc_pin, Pin.OUT)
         self.cs_pin = Pin(cs_pin, Pin.OUT)
@@ -20,7 +87,25 @@ class EPD:
         self.RED = 0x0000ff  # 11
 
         # Initialize SPI
-        self.spi = SPI(0, baudrate=4000000, sck=Pin(18), mosi=Pin(19)) # SPIの初期化
+        self.configure_spi(baudrate, chunk_size)
+        self._byte = bytearray(1) # 1バイト送信用 (呼び出しごとに確保しない)
+
+        # BUSY待ち: ピン割り込みで machine.idle() から起こし、その間CPUを休ませる
+        self.busy_timeout_ms = busy_timeout_ms
+        self.busy_log = [] # (ラベル, ミリ秒) の直近 BUSY_LOG_SIZE 件
+
+        self.partial_mode = False # 部分リフレッシュのモードに入っているか
+
+    def configure_spi(self, baudrate=SPI_BAUDRATE, chunk_size=SPI_CHUNK):
+        """
+        SPIのボーレートと、まとめて送るときの1回の書き込みサイズを設定する。
+        SPI_MAX_BAUDRATE を超えるボーレートは ValueError。
+        """
+        if not 0 < baudrate <= SPI_MAX_BAUDRATE:
+            raise ValueError(f"SPI baudrate {baudrate} is out of range (max {SPI_MAX_BAUDRATE})")
+        self.spi = SPI(SPI_ID, baudrate=baudrate, sck=Pin(SCK_PIN), mosi=Pin(MOSI_PIN))
+        self.baudrate = baudrate
+        self.chunk_size = chunk_size
 
     # Hardware reset
     def reset(self):
@@ -32,93 +117,118 @@ class EPD:
         time.sleep_ms(200)
 
     def send_command(self, command):
+        self._byte[0] = command
         self.dc_pin.value(0)
         self.cs_pin.value(0)
-        self.spi.write(bytes([command]))
+        self.spi.write(self._byte)
         self.cs_pin.value(1)
 
     def send_data(self, data):
+        self._byte[0] = data
         self.dc_pin.value(1)
         self.cs_pin.value(0)
-        self.spi.write(bytes([data]))
+        self.spi.write(self._byte)
         self.cs_pin.value(1)
 
-    def ReadBusyH(self):
-        print("e-Paper busy H")
-        while self.busy_pin.value() == 0:  # 0: idle, 1: busy
-            time.sleep_ms(5)
-        print("e-Paper busy H release")
+    # DC/CSを一度だけ切り替えて、まとめてデータを転送する
+    # chunk_size が設定されていれば、CSを下げたまま chunk_size ずつ書き込む
+    def send_data_bulk(self, data):
+        self.dc_pin.value(1)
+        self.cs_pin.value(0)
+        chunk = self.chunk_size
+        if chunk and len(data) > chunk:
+            view = memoryview(data)
+            for i in range(0, len(data), chunk):
+                self.spi.write(view[i:i + chunk])
+        else:
+            self.spi.write(data)
+        self.cs_pin.value(1)
 
-    def ReadBusyL(self):
-        print("e-Paper busy L")
-        while self.busy_pin.value() == 1:  # 0: busy, 1: idle
-            time.sleep_ms(5)
-        print("e-Paper busy L release")
+    def send_sequence(self, table):
+        """
+        コマンドテーブル (コマンド, データ長, データ...) を順に送る。
+        1コマンドごとにCSを下げたまま、コマンドとデータをそれぞれ1回で書き込む。
+        """
+        view = memoryview(table)
+        i = 0
+        end = len(table)
+        while i < end:
+            if i + 2 > end or i + 2 + table[i + 1] > end:
+                raise ValueError(f"Truncated command table at offset {i}")
+            n = table[i + 1]
+            self.dc_pin.value(0)
+            self.cs_pin.value(0)
+            self.spi.write(view[i:i + 1])
+            if n:
+                self.dc_pin.value(1)
+                self.spi.write(view[i + 2:i + 2 + n])
+            self.cs_pin.value(1)
+            i += 2 + n
+
+    # BUSYピンがHになる(処理が終わる)まで待つ
+    def ReadBusyH(self, label="busy"):
+        return self.wait_busy(1, label)
+
+    # BUSYピンがLになるまで待つ
+    def ReadBusyL(self, label="busy"):
+        return self.wait_busy(0, label)
+
+    # 割り込みは idle() から戻るためだけのもので、ハンドラでは何もしない
+    def _on_busy_edge(self, pin):
+        pass
+
+    def wait_busy(self, level, label="busy"):
+        """
+        BUSYピンが level になるまで待ち、かかった時間 (ミリ秒) を返す。
+        待っている間は machine.idle() で次の割り込みまでCPUを止め、BUSYのエッジ割り込みで
+        起きたらピンのレベルを確かめる。busy_timeout_ms を過ぎたら BusyTimeoutError。
+        """
+        start = time.ticks_ms()
+        if self.busy_pin.value() != level:
+            self.busy_pin.irq(handler=self._on_busy_edge,
+                              trigger=Pin.IRQ_RISING if level else Pin.IRQ_FALLING)
+            try:
+                # 割り込みを設定する前に変化していた場合に備えてピンも見る。
+                # エッジが来てもレベルが戻っていればグリッチなので待ち続ける
+                while self.busy_pin.value() != level:
+                    if time.ticks_diff(time.ticks_ms(), start) > self.busy_timeout_ms:
+                        raise BusyTimeoutError(f"e-Paper busy timeout ({label})")
+                    idle()
+            finally:
+                self.busy_pin.irq(handler=None)
+
+        return self._record_busy(label, start)
+
+    # start からの経過時間を busy_log に記録して返す
+    def _record_busy(self, label, start):
+        elapsed = time.ticks_diff(time.ticks_ms(), start)
+        self.busy_log.append((label, elapsed))
+        if len(self.busy_log) > BUSY_LOG_SIZE:
+            self.busy_log.pop(0)
+        print(f"e-Paper busy ({label}): {elapsed} ms")
+        return elapsed
 
     def TurnOnDisplay(self):
-        self.send_command(0x12)  # DISPLAY_REFRESH
-        self.send_data(0x01)
-        self.ReadBusyH()
+        self.send_sequence(self.refresh_sequence)
+        self.ReadBusyH("refresh")
 
-        self.send_command(0x02)  # POWER_OFF
-        self.send_data(0X00)
-        self.ReadBusyH()
+        self.send_sequence(self.power_off_sequence)
+        self.ReadBusyH("power_off")
 
     def init(self):
         # EPD hardware init start
         self.reset()
+        return self.init_registers()
 
-        self.send_command(0x66)
-        self.send_data(0x49)
-        self.send_data(0x55)
-        self.send_data(0x13)
-        self.send_data(0x5D)
-        self.send_data(0x05)
-        self.send_data(0x10)
-
-        self.send_command(0xB0)
-        self.send_data(0x00)  # 1 boost
-
-        self.send_command(0x01)
-        self.send_data(0x0F)
-        self.send_data(0x00)
-
-        self.send_command(0x00)
-        self.send_data(0x4F)
-        self.send_data(0x6B)
-
-        self.send_command(0x06)
-        self.send_data(0xD7)
-        self.send_data(0xDE)
-        self.send_data(0x12)
-
-        self.send_command(0x61)
-        self.send_data(0x00)
-        self.send_data(0xA8)
-        self.send_data(0x01)
-        self.send_data(0x90)
-
-        self.send_command(0x50)
-        self.send_data(0x37)
-
-        self.send_command(0x60)
-        self.send_data(0x0C)
-        self.send_data(0x05)
-
-        self.send_command(0xE3)
-        self.send_data(0xFF)
-
-        self.send_command(0x84)
-        self.send_data(0x00)
+    # リセット後のレジスタ設定
+    def init_registers(self):
+        self.send_sequence(self.init_sequence)
         return 0
 
     def getbuffer(self, image):
         # into a single byte to transfer to the panel
         buf = bytearray(int(self.width * self.height / 4))
-        idx = 0
-        for i in range(0, len(image), 4):
-            buf[idx] = (image[i] << 6) + (image[i+1] << 4) + (image[i+2] << 2) + image[i+3]
-            idx += 1
+        pack_2bpp(image, buf)
         return buf
 
     def display(self, image):
@@ -128,15 +238,63 @@ class EPD:
             Width = self.width // 4 + 1
         Height = self.height
 
-        self.send_command(0x04)
-        self.ReadBusyH()
-
-        self.send_command(0x10)
-        for j in range(0, Height):
-            for i in range(0, Width):
-                    self.send_data(image[i + j * Width])
-
+        self.display_begin()
+        self.display_write(memoryview(image)[0:Width * Height])
+        self.display_end()
+
+    # ストリーミング転送用: DATA_START_TRANSMISSIONのウィンドウを開く
+    def display_begin(self):
+        self.send_sequence(self.power_on_sequence)
+        self.ReadBusyH("power_on")
+        if self.partial_mode:
+            self.send_sequence(self.partial_out_sequence)
+            self.partial_mode = False
+
+        self.send_command(0x10)  # DATA_START_TRANSMISSION
+
+    def partial_window(self, start, end):
+        """
+        フレームの start 行目から end 行目の手前までを覆う部分ウィンドウの
+        コマンドテーブル (PARTIAL_WINDOW: 水平の開始/終了, 垂直の開始/終了, PT_SCAN)。
+        行は横幅いっぱいに取る。
+        """
+        last_x = self.width - 1
+        last_y = end - 1
+        return bytes((PARTIAL_WINDOW, 9,
+                      0, 0, last_x >> 8, last_x & 0xFF,
+                      start >> 8, start & 0xFF, last_y >> 8, last_y & 0xFF,
+                      0x01))
+
+    def display_partial(self, image, start, end):
+        """
+        フレームのうち start 行目から end 行目の手前までだけを送り、
+        その範囲を部分リフレッシュする。リフレッシュは display_end() で行う。
+        """
+        if not 0 <= start < end <= self.height:
+            raise ValueError(f"Invalid partial window rows {start}-{end}")
+        row = (self.width + 3) // 4
+
+        self.send_sequence(self.power_on_sequence)
+        self.ReadBusyH("power_on")
+        self.send_sequence(self.partial_in_sequence)
+        self.partial_mode = True
+        self.send_sequence(self.partial_window(start, end))
+
+        self.send_command(0x10)  # DATA_START_TRANSMISSION
+        self.display_write(memoryview(image)[start * row:end * row])
+        self.display_end()
+
+    # 変換済みの行(またはその一部)をそのままパネルへ送る
+    def display_write(self, data):
+        self.send_data_bulk(data)
+
+    def display_end(self):
         self.TurnOnDisplay()
+
+    # 転送途中で失敗した場合はリフレッシュせずに電源を切る
+    def display_abort(self):
+        self.send_sequence(self.power_off_sequence)
+        self.ReadBusyH("power_off")
         
     def Clear(self, color=0x55):
         if self.width % 4 == 0 :
@@ -145,23 +303,81 @@ class EPD:
             Width = self.width // 4 + 1
         Height = self.height
 
-        self.send_command(0x04)
-        self.ReadBusyH()
-
-        self.send_command(0x10)
+        self.display_begin()
+        row = bytearray([color]) * Width
         for j in range(0, Height):
-            for i in range(0, Width):
-                self.send_data(color)
+            self.send_data_bulk(row)
 
         self.TurnOnDisplay()
 
-    def sleep(self):
-        self.send_command(0x02)  # POWER_OFF
-        self.send_data(0x00)
-
-        self.send_command(0x07)  # DEEP_SLEEP
-        self.send_data(0XA5)
+    def enter_deep_sleep(self):
+        self.send_sequence(self.deep_sleep_sequence)
 
+    def sleep(self):
+        self.enter_deep_sleep()
         time.sleep_ms(2000)
         # Picoではpoweroffは不要なので、ここでは何もしない
-        # poweroff
\ No newline at end of file
+        # poweroff
+
+
+def _ticks_us():
+    try:
+        return time.ticks_us()
+    except AttributeError:
+        return int(time.perf_counter() * 1000000)
+
+
+def benchmark_spi(epd, frame, settings=None, repeats=SPI_BENCHMARK_REPEATS, clock=_ticks_us):
+    """
+    (ボーレート, チャンクサイズ) ごとに、frame を DATA_START_TRANSMISSION で送る時間を
+    repeats 回計測し、[(ボーレート, チャンクサイズ, [マイクロ秒, ...]), ...] を返す。
+    設定できなかったり送信に失敗した設定は時間のリストが空になる。
+    リフレッシュはせず、計測後は元の設定に戻す。
+    計測できるのは送信側の時間だけで、パネルが正しく受信できたかは分からない。
+    """
+    if settings is None:
+        settings = [(baudrate, chunk)
+                    for baudrate in SPI_BENCHMARK_BAUDRATES
+                    for chunk in SPI_BENCHMARK_CHUNKS]
+    original = (epd.baudrate, epd.chunk_size)
+    results = []
+    try:
+        for baudrate, chunk in settings:
+            timings = []
+            try:
+                epd.configure_spi(baudrate, chunk)
+                for _ in range(repeats):
+                    epd.send_command(0x10)  # DATA_START_TRANSMISSION
+                    start = clock()
+                    epd.send_data_bulk(frame)
+                    timings.append(clock() - start)
+            except (OSError, ValueError) as e:
+                print(f"SPI {baudrate} Hz / chunk {chunk}: {e}")
+                timings = []
+            results.append((baudrate, chunk, timings))
+    finally:
+        epd.configure_spi(*original)
+    return results
+
+
+def select_spi_setting(results, jitter=SPI_BENCHMARK_JITTER, margin=SPI_BENCHMARK_MARGIN):
+    """
+    benchmark_spi() の結果から、計測の最大と最小の差が jitter % 以内に収まった設定のうち
+    最も速いもの (最速との差が margin % 以内なら、より低いボーレート) を
+    (ボーレート, チャンクサイズ) で返す。安定した設定がなければ None。
+    """
+    stable = []
+    for baudrate, chunk, timings in results:
+        if not timings:
+            continue
+        slowest = max(timings)
+        if (slowest - min(timings)) * 100 > jitter * slowest:
+            continue
+        stable.append((slowest, baudrate, chunk))
+    if not stable:
+        return None
+
+    best = min(stable)[0]
+    for slowest, baudrate, chunk in sorted(stable, key=lambda r: (r[1], r[0])):
+        if slowest * 100 <= best * (100 + margin):
+            return baudrate, chunk
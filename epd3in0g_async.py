@@ -0,0 +1,121 @@
+# epd3in0g_async.py
+# asyncio版のEPDドライバ。待ち時間 (リセット, BUSY, ディープスリープ前の待機) を
+# await にして、その間にWi-Fi接続などを進められるようにする。
+# MicroPython では uasyncio、CPython では asyncio を使う。
+import time
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+from machine import Pin
+from epd3in0g import EPD, BusyTimeoutError
+
+
+def sleep_ms(ms):
+    if hasattr(asyncio, "sleep_ms"):
+        return asyncio.sleep_ms(ms)
+    return asyncio.sleep(ms / 1000)
+
+
+def wait_for_ms(awaitable, ms):
+    if hasattr(asyncio, "wait_for_ms"):
+        return asyncio.wait_for_ms(awaitable, ms)
+    return asyncio.wait_for(awaitable, ms / 1000)
+
+
+if hasattr(asyncio, "ThreadSafeFlag"):
+    ThreadSafeFlag = asyncio.ThreadSafeFlag
+else:
+    class ThreadSafeFlag:
+        """
+        CPython 用の ThreadSafeFlag。set() は別のスレッド (割り込みの代わり) からも呼べ、
+        wait() は set() されるまで待ってフラグを下ろす。実行中のイベントループの中で作ること。
+        """
+
+        def __init__(self):
+            self._event = asyncio.Event()
+            self._loop = asyncio.get_running_loop()
+
+        def set(self):
+            self._loop.call_soon_threadsafe(self._event.set)
+
+        def clear(self):
+            self._event.clear()
+
+        async def wait(self):
+            await self._event.wait()
+            self._event.clear()
+
+
+class AsyncEPD(EPD):
+    """
+    EPD の待ち時間を await にしたもの。
+
+    display_end() はリフレッシュを開始するだけで、完了は wait_refresh() で待つ。
+    同期版の display_bmp_from_url() などはそのまま使え、リフレッシュ中に
+    Wi-Fiを切るなど別の処理を進められる。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.refresh_pending = False
+
+    async def reset_async(self):
+        self.rst_pin.value(1)
+        await sleep_ms(200)
+        self.rst_pin.value(0)
+        await sleep_ms(2)
+        self.rst_pin.value(1)
+        await sleep_ms(200)
+
+    async def init_async(self):
+        await self.reset_async()
+        return self.init_registers()
+
+    async def wait_busy_async(self, level, label="busy"):
+        """
+        BUSYピンが level になるまで待ち、かかった時間 (ミリ秒) を返す。
+        エッジ割り込みで ThreadSafeFlag を立て、フラグが立つまでは他のタスクに
+        処理を譲る (ピンはポーリングしない)。busy_timeout_ms を過ぎたら BusyTimeoutError。
+        """
+        start = time.ticks_ms()
+        if self.busy_pin.value() != level:
+            flag = ThreadSafeFlag()
+            self.busy_pin.irq(handler=lambda pin: flag.set(),
+                              trigger=Pin.IRQ_RISING if level else Pin.IRQ_FALLING)
+            try:
+                # 割り込みを設定する前に変化していた場合に備えてピンも見る。
+                # エッジが来てもレベルが戻っていればグリッチなので待ち続ける
+                while self.busy_pin.value() != level:
+                    remaining = self.busy_timeout_ms - time.ticks_diff(time.ticks_ms(), start)
+                    if remaining <= 0:
+                        raise BusyTimeoutError(f"e-Paper busy timeout ({label})")
+                    try:
+                        await wait_for_ms(flag.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.busy_pin.irq(handler=None)
+
+        return self._record_busy(label, start)
+
+    # リフレッシュを開始するだけで、BUSYは待たない
+    def display_end(self):
+        self.send_sequence(self.refresh_sequence)
+        self.refresh_pending = True
+
+    async def wait_refresh(self):
+        """開始したリフレッシュの完了を待ち、パネルの電源を切る。"""
+        if not self.refresh_pending:
+            return
+        self.refresh_pending = False
+        await self.wait_busy_async(1, "refresh")
+
+        self.send_sequence(self.power_off_sequence)
+        await self.wait_busy_async(1, "power_off")
+
+    async def sleep_async(self):
+        await self.wait_refresh()
+        self.enter_deep_sleep()
+        await sleep_ms(2000)
@@ -0,0 +1,138 @@
+# epdframe.py
+# パネルにそのまま送れる2bppフレーム (.epd) の形式と、BMPからの変換処理
+# (machineに依存しないのでホスト側の変換ツールでも同じものを使う)
+#
+# .epd ファイルの形式 (リトルエンディアン, ヘッダはBMPのファイルヘッダと同じ14バイト):
+#   0  4  マジックナンバー b'EPDF'
+#   4  1  バージョン (1)
+#   5  1  予約 (0)
+#   6  2  幅 (ピクセル)
+#   8  2  高さ (ピクセル)
+#   10 4  フレームデータの CRC32
+#   14 -  フレームデータ (EPD.display が受け取る形式そのまま)
+import struct
+from array import array
+try:
+    from ubinascii import crc32
+except ImportError:
+    from binascii import crc32
+
+from dither import (
+    EPD_PALETTE,
+    rgb_to_epd_color,
+    get_color_lut,
+    make_dither_engine,
+    pack_2bpp,
+)
+
+MAGIC = b'EPDF'
+VERSION = 1
+HEADER_SIZE = 14
+_HEADER_FORMAT = '<4sBBHHI'
+
+
+def row_bytes(width):
+    """1行のバイト数 (4ピクセルで1バイト、端数は切り上げ)。"""
+    return (width + 3) // 4
+
+
+def frame_size(width, height):
+    return row_bytes(width) * height
+
+
+def pack_header(width, height, crc):
+    return struct.pack(_HEADER_FORMAT, MAGIC, VERSION, 0, width, height, crc)
+
+
+def parse_header(header):
+    """ヘッダを検証して (幅, 高さ, CRC32) を返す。"""
+    if len(header) < HEADER_SIZE or header[:4] != MAGIC:
+        raise ValueError("Not an EPD frame")
+    _, version, _, width, height, crc = struct.unpack(_HEADER_FORMAT, header[:HEADER_SIZE])
+    if version != VERSION:
+        raise ValueError(f"Unsupported EPD frame version: {version}")
+    return width, height, crc
+
+
+def update_crc(data, crc=0):
+    return crc32(data, crc) & 0xFFFFFFFF
+
+
+def row_crcs(frame, width, rows=None, first=0):
+    """
+    フレーム (またはその一部) の1行ごとの CRC32 を rows[first:] に書き込む。
+    rows を省略した場合は行数分の array('I') を作って返す。
+    """
+    n = row_bytes(width)
+    count = len(frame) // n
+    if rows is None:
+        rows = array('I', [0] * count)
+    view = memoryview(frame)
+    for i in range(count):
+        rows[first + i] = update_crc(view[i * n:(i + 1) * n])
+    return rows
+
+
+def diff_rows(old, new):
+    """
+    行ごとの CRC を比べ、変わった行を含む範囲 (start, end) を返す。
+    すべて同じなら None。old が None や行数の違うものなら全体を返す。
+    """
+    height = len(new)
+    if old is None or len(old) != height:
+        return 0, height
+    start = 0
+    while start < height and old[start] == new[start]:
+        start += 1
+    if start == height:
+        return None
+    end = height
+    while old[end - 1] == new[end - 1]:
+        end -= 1
+    return start, end
+
+
+class BMPFrameConverter:
+    """
+    BMPReader が返す行を、パネルの形式 (2bpp, 180度回転) の行に変換する。
+    インデックスカラーでパレットがEPDの色と一致していれば、ディザリングせずに
+    パレットインデックスをそのまま変換する。
+    """
+
+    def __init__(self, reader, dither_mode="bayer", lut=None):
+        self.reader = reader
+        self.width = reader.width
+        self.height = reader.height
+        self.indices = bytearray(reader.width) # 1行分のパレットインデックス
+
+        self.index_map = None
+        if reader.indexed:
+            index_map, exact = reader.palette_map(EPD_PALETTE, rgb_to_epd_color)
+            if exact:
+                self.index_map = index_map
+
+        self.engine = None
+        if self.index_map is None:
+            # 色変換用のLUT (初回のみフラッシュから読み込む)
+            if lut is None:
+                lut = get_color_lut()
+            self.engine = make_dither_engine(dither_mode, reader.width, lut)
+
+    def panel_row(self, y):
+        """
+        ファイルの y 行目 (0始まり) が入るパネルの行。
+        パネルは180度回転して取り付けられているので、ボトムアップのBMPは
+        ファイルの行順のままパネルの上から送ればよい。
+        """
+        if self.reader.top_down:
+            return self.height - 1 - y
+        return y
+
+    def convert_row(self, y, out, offset=0):
+        """ファイルの次の行 (y 行目) を読み込み、パック済みの行を out[offset:] に書き込む。"""
+        indices = self.indices
+        if self.index_map is not None:
+            self.reader.read_row_indices(indices, self.index_map, reverse=True)
+        else:
+            self.engine.convert_row(self.reader.read_row(), y, indices)
+        return pack_2bpp(indices, out, offset)
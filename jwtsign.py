@@ -0,0 +1,105 @@
+# jwtsign.py
+# RS256 の JWT を組み立てて署名する。
+# ヘッダとクレームの固定部分は base64url 済みのものを使い回し、トークンは
+# 事前に確保したバッファへ1回で書き込む。SHA-256 もそのバッファから直接計算する
+# (header + b"." + payload のような連結を作らない)。
+try:
+    import ujson as json
+except ImportError:
+    import json
+try:
+    from ubinascii import b2a_base64
+except ImportError:
+    from binascii import b2a_base64
+import hashlib
+
+from rsa.pkcs1 import sign_hash
+from rsa.common import byte_size
+
+# PyJWT と同じヘッダ (キーをソートし、区切りに空白を入れない)
+HEADER_JSON = b'{"alg":"RS256","typ":"JWT"}'
+
+
+def b64url_len(n):
+    """n バイトを base64url (パディングなし) にしたときの長さ。"""
+    return (n * 4 + 2) // 3
+
+
+def b64url_into(data, out, offset):
+    """
+    data を base64url (パディングなし) で out[offset:] に書き込み、次の位置を返す。
+    b2a_base64 の出力をそのままコピーし、'+' と '/' の位置だけを書き換える。
+    """
+    enc = b2a_base64(data)
+    n = b64url_len(len(data))
+    out[offset:offset + n] = memoryview(enc)[:n]
+    for src, dst in ((b"+", 45), (b"/", 95)): # '-', '_'
+        i = enc.find(src, 0, n)
+        while i >= 0:
+            out[offset + i] = dst
+            i = enc.find(src, i + 1, n)
+    return offset + n
+
+
+def b64url(data):
+    out = bytearray(b64url_len(len(data)))
+    b64url_into(data, out, 0)
+    return bytes(out)
+
+
+HEADER_B64 = b64url(HEADER_JSON)
+
+
+def _json_value(value):
+    s = json.dumps(value)
+    return s.encode() if isinstance(s, str) else s
+
+
+def _sign_into(key, out, signing_len):
+    """out[:signing_len] を署名して、"." と署名を out の続きに書き込む。"""
+    digest = hashlib.sha256(memoryview(out)[:signing_len]).digest()
+    signature = sign_hash(digest, key, "SHA-256")
+    out[signing_len] = 46 # '.'
+    return b64url_into(signature, out, signing_len + 1)
+
+
+class JWTBuilder:
+    """
+    固定のクレーム (iss, sub, aud, scope など) と、発行ごとに変わる iat/exp から
+    RS256 の JWT を作る。
+
+    クレームは PyJWT (json.dumps(separators=(",", ":"))) と同じ形で
+    {固定のクレーム...,"iat":<iat>,"exp":<exp>} の順に並べる。固定部分のうち
+    3バイトの倍数までは base64url にした結果を初めに作っておき、発行時は
+    残りの数バイトと iat/exp の部分だけをエンコードする。
+    """
+
+    def __init__(self, key, static_claims):
+        """
+        key: rsa.key.PrivateKey
+        static_claims: (名前, 値) のリスト (MicroPython の dict は順序を保たないため)
+        """
+        self.key = key
+        self.static_claims = list(static_claims)
+        prefix = b"{" + b"".join(
+            _json_value(name) + b":" + _json_value(value) + b","
+            for name, value in self.static_claims
+        ) + b'"iat":'
+
+        cut = len(prefix) - len(prefix) % 3
+        self.prefix_tail = prefix[cut:]
+
+        # ヘッダ + "." + クレームのうち先頭の3バイト単位の部分
+        self.head = HEADER_B64 + b"." + b64url(prefix[:cut])
+        self.signature_len = b64url_len(byte_size(key.n))
+
+    def build(self, iat, exp):
+        """iat/exp を入れた JWT を署名して文字列で返す。"""
+        rest = self.prefix_tail + str(iat).encode() + b',"exp":' + str(exp).encode() + b"}"
+        signing_len = len(self.head) + b64url_len(len(rest))
+        out = bytearray(signing_len + 1 + self.signature_len)
+        out[:len(self.head)] = self.head
+        b64url_into(rest, out, len(self.head))
+        _sign_into(self.key, out, signing_len)
+        return bytes(out).decode()
+
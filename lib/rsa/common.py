@@ -12,6 +12,8 @@ Common functionality shared by several modules.
 
 # pylint: disable=invalid-name
 
+from rsa.machine_size import MACHINE_WORD_SIZE
+
 try:
     from typing import Optional, Tuple, Sequence
 except ImportError:
@@ -25,11 +27,26 @@ def bit_length(int_type: int) -> int:
     :param int int_type: The integer to check
     """
 
-    length = 0
-    while int_type:
-        int_type >>= 1
-        length += 1
-    return length
+    if _HAVE_BIT_LENGTH:
+        return int_type.bit_length()
+
+    if int_type < 0:
+        int_type = -int_type
+    if not int_type:
+        return 0
+
+    # Formatting as hex is linear in the size of the number, unlike shifting
+    # it one bit at a time.
+    digits = "%x" % int_type
+    return (len(digits) - 1) * 4 + _NIBBLE_BITS[int(digits[0], 16)]
+
+
+_NIBBLE_BITS = (0, 1, 2, 2, 3, 3, 3, 3, 4, 4, 4, 4, 4, 4, 4, 4)
+
+try:
+    _HAVE_BIT_LENGTH = (1 << 70).bit_length() == 71
+except AttributeError:
+    _HAVE_BIT_LENGTH = False
 
 
 class NotRelativePrimeError(ValueError):
@@ -120,8 +137,20 @@ def ceil_div(num: int, div: int) -> int:
     return quanta
 
 
+# Size of the leading digits Lehmer's algorithm works on. Keeping them a few
+# bits below the machine word keeps the single-precision steps in small ints.
+_LEHMER_BITS = MACHINE_WORD_SIZE - 4
+
+
 def extended_gcd(a: int, b: int) -> Tuple[int, int, int]:
-    """Returns a tuple (r, i, j) such that r = gcd(a, b) = ia + jb"""
+    """Returns a tuple (r, i, j) such that r = gcd(a, b) = ia + jb
+
+    Uses Lehmer's algorithm (Knuth, TAOCP vol. 2, 4.5.2, Algorithm L) while
+    the numbers are larger than a machine word: the Euclidean quotients are
+    simulated on the leading digits and applied to the full numbers in one
+    step. The remainder sequence, and therefore the result, is the same as
+    with the plain Euclidean algorithm.
+    """
     # r = gcd(a,b) i = multiplicitive inverse of a mod b
     #      or      j = multiplicitive inverse of b mod a
     # Neg return values for i or j are made positive mod b or a respectively
@@ -132,6 +161,33 @@ def extended_gcd(a: int, b: int) -> Tuple[int, int, int]:
     ly = 0
     oa = a  # Remember original a/b to remove
     ob = b  # negative values from return results
+
+    while b >> _LEHMER_BITS:
+        shift = bit_size(a if a > b else b) - _LEHMER_BITS
+        ah = a >> shift
+        bh = b >> shift
+
+        # Simulate Euclid on the leading digits while the quotient is certain.
+        A, B, C, D = 1, 0, 0, 1
+        while bh + C and bh + D:
+            q = (ah + A) // (bh + C)
+            if q != (ah + B) // (bh + D):
+                break
+            A, C = C, A - q * C
+            B, D = D, B - q * D
+            ah, bh = bh, ah - q * bh
+
+        if B == 0:
+            # No quotient could be determined; do one multi-precision step.
+            q = a // b
+            (a, b) = (b, a % b)
+            (x, lx) = ((lx - (q * x)), x)
+            (y, ly) = ((ly - (q * y)), y)
+        else:
+            (a, b) = (A * a + B * b, C * a + D * b)
+            (lx, x) = (A * lx + B * x, C * lx + D * x)
+            (ly, y) = (A * ly + B * y, C * ly + D * y)
+
     while b != 0:
         q = a // b
         (a, b) = (b, a % b)
@@ -144,6 +200,13 @@ def extended_gcd(a: int, b: int) -> Tuple[int, int, int]:
     return a, lx, ly  # Return only positive values
 
 
+try:
+    # Modular inverse with a negative exponent (CPython 3.8+).
+    _HAVE_POW_INVERSE = pow(3, -1, 7) == 5
+except (TypeError, ValueError):
+    _HAVE_POW_INVERSE = False
+
+
 def inverse(x: int, n: int) -> int:
     """Returns the inverse of x % n under multiplication, a.k.a x^-1 (mod n)
 
@@ -153,6 +216,12 @@ def inverse(x: int, n: int) -> int:
     1
     """
 
+    if _HAVE_POW_INVERSE:
+        try:
+            return pow(x, -1, n)
+        except ValueError:
+            pass  # Not invertible; let extended_gcd() find the divider.
+
     (divider, inv, _) = extended_gcd(x, n)
 
     if divider != 1:
@@ -14,20 +14,26 @@ mathematically on integers.
 """
 
 # pylint: disable=invalid-name
+import time
+
 from rsa._compat import is_integer
+from rsa.common import bit_size
 
 try:
-    from typing import Any
+    from typing import Any, Callable, Optional
 except ImportError:
     pass
 
 
-def fast_pow(x: int, e: int, m: int) -> int:
-    """Performs fast modular exponentiation, saves RAM on small CPUs/micros.
+def bit_serial_pow(x: int, e: int, m: int) -> int:
+    """Performs modular exponentiation one exponent bit at a time.
+
+    This is the original, smallest implementation; it is kept as a reference
+    backend.
 
     :param int x: Base
-    :param int y: Exponent
-    :param int e: Second exponent
+    :param int e: Exponent
+    :param int m: Modulus
     """
     X = x
     E = e
@@ -42,6 +48,194 @@ def fast_pow(x: int, e: int, m: int) -> int:
     return Y
 
 
+def _window_size(exponent_bits: int) -> int:
+    """Returns the sliding window width that minimises multiplications."""
+    if exponent_bits > 768:
+        return 6
+    if exponent_bits > 240:
+        return 5
+    if exponent_bits > 80:
+        return 4
+    if exponent_bits > 24:
+        return 3
+    return 1
+
+
+def _sliding_window(x: int, e: int, mul: Callable[[int, int], int], one: int) -> int:
+    """Left-to-right sliding window exponentiation over an abstract multiplication.
+
+    :param int x: Base, already reduced (and in Montgomery form if ``mul`` is
+        a Montgomery multiplication).
+    :param int e: Exponent, must be positive.
+    :param mul: ``mul(a, b)`` returns the reduced product of a and b.
+    :param int one: The representation of 1.
+    """
+    bits = bit_size(e)
+    k = _window_size(bits)
+
+    # Precompute the odd powers x^1, x^3, ..., x^(2^k - 1).
+    table = [x]
+    if k > 1:
+        x2 = mul(x, x)
+        for _ in range((1 << (k - 1)) - 1):
+            table.append(mul(table[-1], x2))
+
+    result = one
+    i = bits - 1
+    while i >= 0:
+        if not (e >> i) & 1:
+            result = mul(result, result)
+            i -= 1
+            continue
+
+        # Find the longest window e[i..low] of at most k bits ending in a 1.
+        low = i - k + 1
+        if low < 0:
+            low = 0
+        while not (e >> low) & 1:
+            low += 1
+        width = i - low + 1
+        window = (e >> low) & ((1 << width) - 1)
+
+        for _ in range(width):
+            result = mul(result, result)
+        result = mul(result, table[window >> 1])
+        i = low - 1
+    return result
+
+
+def sliding_window_pow(x: int, e: int, m: int) -> int:
+    """Performs k-ary sliding window modular exponentiation.
+
+    Uses a precomputed table of odd powers of ``x``, so it needs roughly
+    ``bits + bits / (k + 1)`` multiplications instead of ``1.5 * bits``.
+
+    :param int x: Base
+    :param int e: Exponent
+    :param int m: Modulus
+    """
+    if e == 0:
+        return 1
+    return _sliding_window(x % m, e, lambda a, b: (a * b) % m, 1)
+
+
+def montgomery_pow(x: int, e: int, m: int) -> int:
+    """Performs sliding window modular exponentiation with Montgomery reduction.
+
+    Reductions modulo ``m`` are replaced with masks, multiplications and a
+    shift. Only odd moduli are supported; other moduli fall back to
+    :py:func:`sliding_window_pow`.
+
+    :param int x: Base
+    :param int e: Exponent
+    :param int m: Modulus
+    """
+    if e == 0:
+        return 1
+    if not m & 1:
+        return sliding_window_pow(x, e, m)
+
+    r_bits = bit_size(m)
+    mask = (1 << r_bits) - 1
+
+    # m_prime = -m^-1 mod R, computed with Newton iteration (R is a power of two).
+    inv = 1
+    for _ in range(bit_size(r_bits) + 1):
+        inv = (inv * (2 - m * inv)) & mask
+    m_prime = (-inv) & mask
+
+    def mul(a: int, b: int) -> int:
+        t = a * b
+        u = ((t & mask) * m_prime) & mask
+        t = (t + u * m) >> r_bits
+        return t - m if t >= m else t
+
+    one = (1 << r_bits) % m
+    result = _sliding_window((x << r_bits) % m, e, mul, one)
+    return mul(result, 1)
+
+
+def _builtin_pow(x: int, e: int, m: int) -> int:
+    return pow(x, e, m)
+
+
+POW_BACKENDS = {
+    "builtin": _builtin_pow,
+    "sliding-window": sliding_window_pow,
+    "montgomery": montgomery_pow,
+    "bit-serial": bit_serial_pow,
+}
+
+
+def _has_builtin_pow() -> bool:
+    """Returns True if the runtime supports three-argument pow() on big ints."""
+    try:
+        return pow(3, (1 << 70) + 1, (1 << 71) + 5) == bit_serial_pow(
+            3, (1 << 70) + 1, (1 << 71) + 5
+        )
+    except (TypeError, ValueError, NotImplementedError):
+        return False
+
+
+def _ticks_us() -> int:
+    try:
+        return time.ticks_us()  # pylint: disable=no-member
+    except AttributeError:
+        return int(time.perf_counter() * 1000000)
+
+
+def benchmark_backend(name: str, bits: int = 256, rounds: int = 1) -> int:
+    """Returns the time in microseconds a backend needs for ``rounds``
+    exponentiations with a ``bits``-bit odd modulus and exponent."""
+    func = POW_BACKENDS[name]
+    m = (1 << (bits - 1)) | 0x5DEECE66D | 1
+    e = m - 0xB
+    x = m // 3
+    start = _ticks_us()
+    for _ in range(rounds):
+        func(x, e, m)
+    return _ticks_us() - start
+
+
+def select_backend(name: Optional[str] = None) -> str:
+    """Selects the exponentiation backend used by :py:func:`fast_pow`.
+
+    Without a name, builtin ``pow`` is used when it is available and not
+    slower than the pure Python sliding window; otherwise the sliding window
+    (or Montgomery, whichever benchmarks faster) is used.
+
+    :param str name: force one of the keys of :py:const:`POW_BACKENDS`.
+    :return: the name of the selected backend.
+    """
+    global _pow, POW_BACKEND  # pylint: disable=global-statement
+
+    if name is None:
+        candidates = ["sliding-window", "montgomery"]
+        if _has_builtin_pow():
+            candidates.insert(0, "builtin")
+        timings = [(benchmark_backend(candidate), candidate) for candidate in candidates]
+        name = min(timings)[1]
+
+    _pow = POW_BACKENDS[name]
+    POW_BACKEND = name
+    return name
+
+
+_pow = bit_serial_pow  # type: Callable[[int, int, int], int]
+POW_BACKEND = "bit-serial"
+select_backend()
+
+
+def fast_pow(x: int, e: int, m: int) -> int:
+    """Performs fast modular exponentiation with the selected backend.
+
+    :param int x: Base
+    :param int e: Exponent
+    :param int m: Modulus
+    """
+    return _pow(x, e, m)
+
+
 def assert_int(var: Any, name: str) -> None:
     """Asserts provided variable is an integer."""
     if is_integer(var):
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+`rsa.der`
+====================================================
+
+Minimal DER decoder for RSA private keys.
+
+Reads PKCS#1 ``RSAPrivateKey`` and PKCS#8 ``PrivateKeyInfo`` structures
+without pyasn1. Integers are converted straight from slices of the input
+buffer; no intermediate ASN.1 objects are built.
+"""
+
+from rsa import transform
+
+try:
+    from typing import Tuple, Union
+except ImportError:
+    pass
+
+TAG_INTEGER = 0x02
+TAG_OCTET_STRING = 0x04
+TAG_NULL = 0x05
+TAG_OBJECT_IDENTIFIER = 0x06
+TAG_SEQUENCE = 0x30
+
+# DER encoding of the rsaEncryption OID, 1.2.840.113549.1.1.1
+RSA_ENCRYPTION_OID = b"\x2a\x86\x48\x86\xf7\x0d\x01\x01\x01"
+
+
+def read_header(data: Union[bytes, memoryview], offset: int, tag: int) -> Tuple[int, int]:
+    """Reads the tag and length of the element at ``offset``.
+
+    :param data: the DER-encoded data.
+    :param int offset: position of the element's tag byte.
+    :param int tag: the expected tag.
+    :return: ``(start, end)`` of the element's contents.
+    :raise ValueError: when the tag does not match or the element is truncated.
+
+    >>> read_header(b'\\x02\\x01\\x05', 0, TAG_INTEGER)
+    (2, 3)
+    """
+
+    if offset + 2 > len(data):
+        raise ValueError("Truncated DER element at offset %i" % offset)
+    if data[offset] != tag:
+        raise ValueError(
+            "Expected DER tag 0x%02x at offset %i, found 0x%02x" % (tag, offset, data[offset])
+        )
+
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        # Long form: the low bits give the number of length bytes.
+        count = length & 0x7F
+        if count == 0 or count > 4 or offset + count > len(data):
+            raise ValueError("Invalid DER length at offset %i" % (offset - 1))
+        length = 0
+        for i in range(count):
+            length = (length << 8) | data[offset + i]
+        offset += count
+
+    end = offset + length
+    if end > len(data):
+        raise ValueError("Truncated DER element at offset %i" % offset)
+    return offset, end
+
+
+def read_integer(data: Union[bytes, memoryview], offset: int) -> Tuple[int, int]:
+    """Reads a non-negative INTEGER at ``offset``.
+
+    :return: ``(value, offset of the next element)``
+    :raise ValueError: when the element is not a non-negative INTEGER.
+
+    >>> read_integer(b'\\x02\\x02\\x00\\x80', 0)
+    (128, 4)
+    """
+
+    start, end = read_header(data, offset, TAG_INTEGER)
+    if start == end or data[start] & 0x80:
+        raise ValueError("Only non-negative DER integers are supported")
+    return transform.bytes2int(memoryview(data)[start:end]), end
+
+
+def parse_pkcs1_private_key(data: Union[bytes, memoryview]) -> Tuple[int, ...]:
+    """Parses a PKCS#1 RSAPrivateKey.
+
+    .. code-block:: shell
+
+        RSAPrivateKey ::= SEQUENCE {
+            version           Version,
+            modulus           INTEGER,  -- n
+            publicExponent    INTEGER,  -- e
+            privateExponent   INTEGER,  -- d
+            prime1            INTEGER,  -- p
+            prime2            INTEGER,  -- q
+            exponent1         INTEGER,  -- d mod (p-1)
+            exponent2         INTEGER,  -- d mod (q-1)
+            coefficient       INTEGER,  -- (inverse of q) mod p
+            otherPrimeInfos   OtherPrimeInfos OPTIONAL
+        }
+
+    :param data: the DER-encoded key.
+    :return: ``(n, e, d, p, q, exp1, exp2, coef)``
+    :raise ValueError: when the data is not a two-prime PKCS#1 private key.
+    """
+
+    offset, end = read_header(data, 0, TAG_SEQUENCE)
+    version, offset = read_integer(data, offset)
+    if version != 0:
+        raise ValueError("Unable to read this file, version %s != 0" % version)
+
+    values = []
+    for _ in range(8):
+        value, offset = read_integer(data, offset)
+        values.append(value)
+    if offset > end:
+        raise ValueError("Truncated RSAPrivateKey")
+    return tuple(values)
+
+
+def unwrap_pkcs8_private_key(data: Union[bytes, memoryview]) -> memoryview:
+    """Returns the PKCS#1 RSAPrivateKey inside a PKCS#8 PrivateKeyInfo.
+
+    .. code-block:: shell
+
+        PrivateKeyInfo ::= SEQUENCE {
+            version                   INTEGER,
+            privateKeyAlgorithm       AlgorithmIdentifier,
+            privateKey                OCTET STRING
+        }
+
+    :param data: the DER-encoded PrivateKeyInfo.
+    :return: a memoryview of the RSAPrivateKey, without copying.
+    :raise ValueError: when the data is not an unencrypted PKCS#8 RSA key.
+    """
+
+    offset, _ = read_header(data, 0, TAG_SEQUENCE)
+    version, offset = read_integer(data, offset)
+    if version != 0:
+        raise ValueError("Unsupported PKCS#8 version %s" % version)
+
+    algorithm_start, algorithm_end = read_header(data, offset, TAG_SEQUENCE)
+    oid_start, oid_end = read_header(data, algorithm_start, TAG_OBJECT_IDENTIFIER)
+    if bytes(data[oid_start:oid_end]) != RSA_ENCRYPTION_OID:
+        raise ValueError("Not an RSA private key")
+
+    key_start, key_end = read_header(data, algorithm_end, TAG_OCTET_STRING)
+    return memoryview(data)[key_start:key_end]
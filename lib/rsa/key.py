@@ -12,7 +12,8 @@ RSA key generation code.
 Create new keys with the newkeys() function. It will give you a PublicKey and a
 PrivateKey object.
 
-Loading and saving keys requires the pyasn1 module. This module is imported as
+Private keys are loaded with the small DER decoder in rsa.der. Saving keys and
+loading public keys requires the pyasn1 module. This module is imported as
 late as possible, such that other functionality will remain working in absence
 of pyasn1.
 
@@ -32,6 +33,8 @@ import rsa.pem
 import rsa.common
 import rsa.randnum
 import rsa.core
+import rsa.der
+import rsa.transform
 
 try:
     from typing import Any, Tuple, Dict, Callable
@@ -450,7 +453,7 @@ class PrivateKey(AbstractKey):
 
         blind_r = rsa.randnum.randint(self.n - 1)
         blinded = self.blind(encrypted, blind_r)  # blind before decrypting
-        decrypted = rsa.core.decrypt_int(blinded, self.d, self.n)
+        decrypted = self._crt_pow(blinded)
 
         return self.unblind(decrypted, blind_r)
 
@@ -464,9 +467,86 @@ class PrivateKey(AbstractKey):
 
         blind_r = rsa.randnum.randint(self.n - 1)
         blinded = self.blind(message, blind_r)  # blind before encrypting
-        encrypted = rsa.core.encrypt_int(blinded, self.d, self.n)
+        encrypted = self._crt_pow(blinded)
         return self.unblind(encrypted, blind_r)
 
+    def _crt_pow(self, blinded: int) -> int:
+        """Raises a blinded message to the private exponent, modulo n.
+
+        Instead of using the core functionality, use the Chinese Remainder
+        Theorem and be 3-4x faster. This is the same as:
+
+            rsa.core.encrypt_int(blinded, self.d, self.n)
+
+        but with exponents and moduli of half the size.
+
+        :param int blinded: the blinded message, as integer.
+        :return: ``blinded ** d % n``
+        :rtype: int
+        """
+
+        rsa.core.assert_int(blinded, "blinded")
+        if blinded < 0:
+            raise ValueError("Only non-negative numbers are supported")
+        if blinded > self.n:
+            raise OverflowError(
+                "The message %i is too long for n=%i" % (blinded, self.n)
+            )
+
+        s1 = rsa.core.fast_pow(blinded % self.p, self.exp1, self.p)
+        s2 = rsa.core.fast_pow(blinded % self.q, self.exp2, self.q)
+        h = ((s1 - s2) * self.coef) % self.p
+        return s2 + self.q * h
+
+    PRECOMPUTED_MAGIC = b"RSAK\x01"
+
+    def save_precomputed(self) -> bytes:
+        """Saves the key, including exp1, exp2 and coef, in a compact binary format.
+
+        The format is ``PRECOMPUTED_MAGIC`` followed by n, e, d, p, q, exp1,
+        exp2 and coef, each as a 2-byte big-endian length and a big-endian
+        unsigned integer. Loading it with :py:meth:`load_precomputed` skips
+        the modular inverse and reductions done by the constructor.
+
+        :return: the encoded key.
+        :rtype: bytes
+        """
+
+        parts = [self.PRECOMPUTED_MAGIC]
+        for value in self.__getstate__():
+            raw = rsa.transform.int2bytes(value)
+            parts.append(len(raw).to_bytes(2, "big"))
+            parts.append(raw)
+        return b"".join(parts)
+
+    @classmethod
+    def load_precomputed(cls, data: bytes) -> "PrivateKey":
+        """Loads a key saved with :py:meth:`save_precomputed`.
+
+        :param bytes data: the encoded key.
+        :return: a PrivateKey object
+        :raise ValueError: when the data is not a valid precomputed key.
+        """
+
+        magic = cls.PRECOMPUTED_MAGIC
+        if bytes(data[: len(magic)]) != magic:
+            raise ValueError("Not a precomputed private key")
+
+        view = memoryview(data)
+        offset = len(magic)
+        values = []
+        for _ in range(8):
+            if offset + 2 > len(data):
+                raise ValueError("Truncated precomputed private key")
+            length = (data[offset] << 8) | data[offset + 1]
+            offset += 2
+            if offset + length > len(data):
+                raise ValueError("Truncated precomputed private key")
+            values.append(rsa.transform.bytes2int(bytes(view[offset : offset + length])))
+            offset += length
+
+        return cls._from_precomputed(values)
+
     @classmethod
     def _load_pkcs1_der(cls, keyfile: bytes) -> "PrivateKey":
         """Loads a key in PKCS#1 DER format.
@@ -488,42 +568,56 @@ class PrivateKey(AbstractKey):
 
         """
 
-        try:
-            from pyasn1.codec.der import (  # pylint: disable=import-outside-toplevel
-                decoder,
-            )
-        except ImportError as err:
-            raise ImportError("This functionality requires the pyasn1 library") from err
+        key = cls._from_precomputed(rsa.der.parse_pkcs1_private_key(keyfile))
 
-        (priv, _) = decoder.decode(keyfile)
+        # A key file may come from anywhere, so check the CRT values against
+        # d, p and q. This is still much cheaper than the modular inverse.
+        if (
+            key.exp1 != key.d % (key.p - 1)
+            or key.exp2 != key.d % (key.q - 1)
+            or (key.coef * key.q) % key.p != 1
+        ):
+            raise ValueError("Inconsistent private key values")
+        return key
 
-        # ASN.1 contents of DER encoded private key:
-        #
-        # RSAPrivateKey ::= SEQUENCE {
-        #     version           Version,
-        #     modulus           INTEGER,  -- n
-        #     publicExponent    INTEGER,  -- e
-        #     privateExponent   INTEGER,  -- d
-        #     prime1            INTEGER,  -- p
-        #     prime2            INTEGER,  -- q
-        #     exponent1         INTEGER,  -- d mod (p-1)
-        #     exponent2         INTEGER,  -- d mod (q-1)
-        #     coefficient       INTEGER,  -- (inverse of q) mod p
-        #     otherPrimeInfos   OtherPrimeInfos OPTIONAL
-        # }
+    @classmethod
+    def _from_precomputed(cls, values: Tuple[int, ...]) -> "PrivateKey":
+        """Creates a key from n, e, d, p, q, exp1, exp2 and coef, without
+        recalculating exp1, exp2 and coef.
 
-        if priv[0] != 0:
-            raise ValueError("Unable to read this file, version %s != 0" % priv[0])
+        Only ``n == p * q`` is checked, which catches a corrupted or mixed-up
+        cache; the other values are trusted as they were written by
+        :py:meth:`save_precomputed`.
 
-        as_ints = map(int, priv[1:6])
-        key = cls(*as_ints)
+        :raise ValueError: when n is not p * q.
+        """
 
-        exp1, exp2, coef = map(int, priv[6:9])
+        key = cls.__new__(cls)
+        key.__setstate__(tuple(values))
+        if key.n != key.p * key.q:
+            raise ValueError("Inconsistent private key values")
+        return key
 
-        if (key.exp1, key.exp2, key.coef) != (exp1, exp2, coef):
-            pass
+    @classmethod
+    def load_pkcs8(cls, keyfile: bytes, format: Literal["PEM", "DER"] = "PEM") -> "PrivateKey":
+        """Loads an unencrypted PKCS#8 RSA private key.
 
-        return key
+        These files can be recognised in that they start with BEGIN PRIVATE KEY
+        rather than BEGIN RSA PRIVATE KEY. Google service account keys use
+        this format.
+
+        :param bytes keyfile: contents of a DER- or PEM-encoded file that
+            contains the key.
+        :param str format: the format of the file to load; 'PEM' or 'DER'
+        :return: a PrivateKey object
+        """
+
+        if format == "PEM":
+            keyfile = rsa.pem.load_pem(keyfile, b"PRIVATE KEY")
+        elif format != "DER":
+            raise ValueError("Unsupported format: %r, try one of DER, PEM" % format)
+
+        return cls._load_pkcs1_der(rsa.der.unwrap_pkcs8_private_key(keyfile))
 
     def _save_pkcs1_der(self) -> bytes:
         """Saves the private key in PKCS#1 DER format.
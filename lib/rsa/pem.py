@@ -56,49 +56,32 @@ def load_pem(contents: Union[bytes, str], pem_marker: Union[bytes, str]) -> byte
 
     (pem_start, pem_end) = _markers(pem_marker)
 
-    pem_lines = []
-    in_pem_part = False
-
-    for line in contents.split(b"\n"):
-        line = line.strip()
-
-        # Skip empty lines
-        if not line:
-            continue
-
-        # Handle start marker
-        if line == pem_start:
-            if in_pem_part:
-                raise ValueError('Seen start marker "%s" twice' % pem_start)
-
-            in_pem_part = True
-            continue
-
-        # Skip stuff before first marker
-        if not in_pem_part:
-            continue
+    # Find the markers instead of splitting the whole file into lines; the
+    # base64 decoder skips the line breaks between them.
+    start = contents.find(pem_start)
+    if start < 0:
+        raise ValueError('No PEM start marker "%s" found' % pem_start)
+    start += len(pem_start)
 
-        # Handle end marker
-        if in_pem_part and line == pem_end:
-            in_pem_part = False
-            break
+    end = contents.find(pem_end, start)
+    if end < 0:
+        raise ValueError('No PEM end marker "%s" found' % pem_end)
+    if contents.find(pem_start, start, end) >= 0:
+        raise ValueError('Seen start marker "%s" twice' % pem_start)
 
-        # Load fields
-        if b":" in line:
-            continue
+    body = contents[start:end]
 
-        pem_lines.append(line)
+    # Skip header fields such as "Proc-Type: ..."
+    if b":" in body:
+        body = b"".join(
+            line for line in body.split(b"\n") if b":" not in line
+        )
 
-    # Do some sanity checks
-    if not pem_lines:
-        raise ValueError('No PEM start marker "%s" found' % pem_start)
-
-    if in_pem_part:
-        raise ValueError('No PEM end marker "%s" found' % pem_end)
+    if not body.strip():
+        raise ValueError('No PEM data found between "%s" and "%s"' % (pem_start, pem_end))
 
     # Base64-decode the contents
-    pem = b"".join(pem_lines)
-    return a2b_base64(pem)
+    return a2b_base64(body)
 
 
 def save_pem(contents: bytes, pem_marker: Union[bytes, str]) -> bytes:
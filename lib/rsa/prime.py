@@ -14,6 +14,7 @@ Roberto Tamassia, 2002.
 """
 # pylint: disable=invalid-name
 import rsa.common
+import rsa.core
 import rsa.randnum
 
 try:
@@ -27,6 +28,34 @@ except ImportError:
 
 __all__ = ["getprime", "are_relatively_prime"]
 
+# Candidates are trial-divided by all odd primes below this limit before
+# Miller-Rabin is run on them.
+SMALL_PRIME_LIMIT = 2048
+
+# Number of consecutive odd candidates sieved per random starting point.
+SIEVE_SIZE = 1024
+
+
+def _odd_small_primes(limit: int) -> tuple:
+    """Returns the odd primes below limit (sieve of Eratosthenes).
+
+    >>> _odd_small_primes(20)
+    (3, 5, 7, 11, 13, 17, 19)
+    """
+
+    composite = bytearray(limit)
+    primes = []
+    for n in range(3, limit, 2):
+        if composite[n]:
+            continue
+        primes.append(n)
+        for multiple in range(n * n, limit, 2 * n):
+            composite[multiple] = 1
+    return tuple(primes)
+
+
+SMALL_PRIMES = _odd_small_primes(SMALL_PRIME_LIMIT)
+
 
 def gcd(p: int, q: int) -> int:
     """Returns the greatest common divisor of p and q
@@ -119,13 +148,7 @@ def miller_rabin_primality_testing(n: int, k: int) -> bool:
 
 def pow_mod(x: int, y: int, z: int) -> int:
     "Calculate (x ** y) % z efficiently."
-    number = 1
-    while y:
-        if y & 1:
-            number = number * x % z
-        y >>= 1
-        x = x * x % z
-    return number
+    return rsa.core.fast_pow(x, y, z)
 
 
 def is_prime(number: int) -> bool:
@@ -172,14 +195,47 @@ def getprime(nbits: int) -> int:
 
     assert nbits > 3  # the loop wil hang on too small numbers
 
+    limit = 1 << nbits
     while True:
-        integer = rsa.randnum.read_random_odd_int(nbits)
+        base = rsa.randnum.read_random_odd_int(nbits)
+        sieve = _sieve_interval(base, SIEVE_SIZE)
+
+        # Walk the candidates base, base + 2, ... that survived the sieve.
+        for offset in range(SIEVE_SIZE):
+            if sieve[offset]:
+                continue
+            integer = base + 2 * offset
+            if integer >= limit:
+                break
+
+            # Test for primeness
+            if is_prime(integer):
+                return integer
 
-        # Test for primeness
-        if is_prime(integer):
-            return integer
+        # Retry from a new random starting point
+
+
+def _sieve_interval(base: int, size: int) -> bytearray:
+    """Marks the odd numbers base + 2 * i (0 <= i < size) that have a small
+    prime factor.
+
+    :param int base: odd start of the interval.
+    :param int size: number of odd candidates in the interval.
+    :return: a bytearray with 1 for every candidate that is known to be
+        composite, and 0 for the candidates left to test.
+    """
 
-            # Retry if not prime
+    sieve = bytearray(size)
+    for p in SMALL_PRIMES:
+        # Solve base + 2 * i == 0 (mod p); (p + 1) // 2 is the inverse of 2.
+        i = (p - base % p) * ((p + 1) // 2) % p
+        if base + 2 * i == p:
+            # Don't strike out the small prime itself.
+            i += p
+        while i < size:
+            sieve[i] = 1
+            i += p
+    return sieve
 
 
 def are_relatively_prime(a: int, b: int) -> bool:
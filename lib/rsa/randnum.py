@@ -17,26 +17,74 @@ import os
 from rsa import common, transform
 from rsa._compat import byte
 
+# Number of bytes read from os.urandom() at once to refill the pool.
+POOL_SIZE = 512
+
+
+class EntropyPool(object):
+    """Serves random bytes from a buffer refilled from os.urandom() in blocks.
+
+    Blinding factors, Miller-Rabin witnesses and prime candidates each need
+    only a few hundred bits; reading them from one buffer turns many small
+    os.urandom() calls into a few large ones. Requests larger than the pool
+    are passed straight to os.urandom().
+    """
+
+    def __init__(self, size: int = POOL_SIZE) -> None:
+        self.size = size
+        self._buffer = b""
+        self._pos = 0
+        self._pid = None
+
+    def read(self, nbytes: int) -> bytes:
+        """Returns nbytes random bytes."""
+
+        if nbytes > self.size:
+            return os.urandom(nbytes)
+
+        pid = _getpid()
+        if self._pos + nbytes > len(self._buffer) or pid != self._pid:
+            # Refill, and never share buffered bytes with a forked child.
+            self._buffer = os.urandom(self.size)
+            self._pos = 0
+            self._pid = pid
+
+        start = self._pos
+        self._pos += nbytes
+        return self._buffer[start : self._pos]
+
+
+def _getpid() -> int:
+    try:
+        return os.getpid()
+    except AttributeError:
+        return 0
+
+
+_pool = EntropyPool()
+
+
+def read_random_bytes(nbytes: int) -> bytes:
+    """Reads 'nbytes' random bytes from the shared entropy pool."""
+
+    return _pool.read(nbytes)
+
 
 def read_random_bits(nbits: int) -> bytes:
     """Reads 'nbits' random bits.
 
-    If nbits isn't a whole number of bytes, an extra byte will be appended with
-    only the lower bits set.
+    If nbits isn't a whole number of bytes, an extra byte will be prepended
+    with only the lower bits set.
     """
 
     nbytes, rbits = divmod(nbits, 8)
 
-    # Get the random bytes
-    randomdata = os.urandom(nbytes)
+    if not rbits:
+        return read_random_bytes(nbytes)
 
-    # Add the remaining random bits
-    if rbits > 0:
-        randomvalue = ord(os.urandom(1))
-        randomvalue >>= 8 - rbits
-        randomdata = byte(randomvalue) + randomdata
-
-    return randomdata
+    # Get the random bytes, plus one for the remaining bits
+    randomdata = read_random_bytes(nbytes + 1)
+    return byte(randomdata[0] >> (8 - rbits)) + randomdata[1:]
 
 
 def read_random_int(nbits: int) -> int:
@@ -68,24 +116,17 @@ def read_random_odd_int(nbits: int) -> int:
 def randint(maxvalue: int) -> int:
     """Returns a random integer x with 1 <= x <= maxvalue
 
-    May take a very long time in specific situations. If maxvalue needs N bits
-    to store, the closer maxvalue is to (2 ** N) - 1, the faster this function
-    is.
+    Every value in the range is equally likely: values are drawn with exactly
+    as many bits as maxvalue needs and rejected when out of range, which
+    takes fewer than two draws on average.
     """
 
+    if maxvalue < 1:
+        raise ValueError("maxvalue must be at least 1, not %i" % maxvalue)
+
     bit_size = common.bit_size(maxvalue)
 
-    tries = 0
     while True:
-        value = read_random_int(bit_size)
-        if value <= maxvalue:
-            break
-
-        if tries % 10 == 0 and tries:
-            # After a lot of tries to get the right number of bits but still
-            # smaller than maxvalue, decrease the number of bits by 1. That'll
-            # dramatically increase the chances to get a large enough number.
-            bit_size -= 1
-        tries += 1
-
-    return value
+        value = transform.bytes2int(read_random_bits(bit_size))
+        if 0 < value <= maxvalue:
+            return value
@@ -14,10 +14,9 @@ From bytes to a number, number to bytes, etc.
 
 # from __future__ import absolute_import
 
-from struct import pack
-import binascii as binascii
+from struct import pack_into, unpack_from
 
-from rsa._compat import byte, is_integer
+from rsa._compat import is_integer
 from rsa import common, machine_size
 
 try:
@@ -26,6 +25,54 @@ except ImportError:
     pass
 
 
+def _has_native_int_bytes() -> bool:
+    """Returns True if int.from_bytes and int.to_bytes work on big integers."""
+    try:
+        value = (1 << 72) | 0x0102
+        return (
+            int.from_bytes(value.to_bytes(10, "big"), "big") == value
+            and (0x0102).to_bytes(3, "big") == b"\x00\x01\x02"
+        )
+    except (AttributeError, TypeError, ValueError, OverflowError, NotImplementedError):
+        return False
+
+
+HAVE_NATIVE_INT_BYTES = _has_native_int_bytes()
+
+# Largest word the chunked fallback converts per step (8 bytes on 64-bit
+# machines, 4 bytes on 32-bit ones).
+_WORD_BITS, _WORD_BYTES, _WORD_MASK, _WORD_TYPE = machine_size.get_word_alignment(
+    1 << 64
+)
+_WORD_FORMAT = ">%s" % _WORD_TYPE
+
+
+def _bytes2int_chunked(raw_bytes: bytes) -> int:
+    """Converts big-endian bytes to an integer one machine word at a time."""
+    head = len(raw_bytes) % _WORD_BYTES
+    result = 0
+    for value in raw_bytes[:head]:
+        result = (result << 8) | value
+    for offset in range(head, len(raw_bytes), _WORD_BYTES):
+        result = (result << _WORD_BITS) | unpack_from(_WORD_FORMAT, raw_bytes, offset)[0]
+    return result
+
+
+def _to_bytes(number: int, length: int) -> bytes:
+    """Converts a non-negative integer that fits in ``length`` bytes to
+    big-endian bytes, zero-padded to exactly ``length`` bytes."""
+    if HAVE_NATIVE_INT_BYTES:
+        return number.to_bytes(length, "big")
+
+    raw_bytes = bytearray(common.ceil_div(length, _WORD_BYTES) * _WORD_BYTES)
+    offset = len(raw_bytes)
+    while number:
+        offset -= _WORD_BYTES
+        pack_into(_WORD_FORMAT, raw_bytes, offset, number & _WORD_MASK)
+        number >>= _WORD_BITS
+    return bytes(raw_bytes[len(raw_bytes) - length :])
+
+
 def bytes2int(raw_bytes: bytes) -> int:
     """Converts a list of bytes or an 8-bit string to an integer.
 
@@ -38,7 +85,9 @@ def bytes2int(raw_bytes: bytes) -> int:
 
     """
 
-    return int(binascii.hexlify(raw_bytes), 16)
+    if HAVE_NATIVE_INT_BYTES:
+        return int.from_bytes(raw_bytes, "big")
+    return _bytes2int_chunked(raw_bytes)
 
 
 def _int2bytes(number: int, block_size: Optional[int] = None) -> bytes:
@@ -80,12 +129,7 @@ def _int2bytes(number: int, block_size: Optional[int] = None) -> bytes:
         raise ValueError("Negative numbers cannot be used: %i" % number)
 
     # Do some bounds checking
-    if number == 0:
-        needed_bytes = 1
-        raw_bytes = [b"\x00"]
-    else:
-        needed_bytes = common.byte_size(number)
-        raw_bytes = []
+    needed_bytes = common.byte_size(number)
 
     # You cannot compare None > 0 in Python 3x. It will fail with a TypeError.
     if block_size and block_size > 0:
@@ -94,19 +138,9 @@ def _int2bytes(number: int, block_size: Optional[int] = None) -> bytes:
                 "Needed %i bytes for number, but block size "
                 "is %i" % (needed_bytes, block_size)
             )
+        return _to_bytes(number, block_size)
 
-    # Convert the number to bytes.
-    while number > 0:
-        raw_bytes.insert(0, byte(number & 0xFF))
-        number >>= 8
-
-    # Pad with zeroes to fill the block
-    if block_size and block_size > 0:
-        padding = (block_size - needed_bytes) * b"\x00"
-    else:
-        padding = b""
-
-    return padding + b"".join(raw_bytes)
+    return _to_bytes(number, needed_bytes)
 
 
 def bytes_leading(raw_bytes: bytes, needle: bytes = b"\x00") -> int:
@@ -183,32 +217,17 @@ def int2bytes(
     # Ensure these are integers.
     assert isinstance(number, int), "Number must be an unsigned integer, not a float."
 
-    raw_bytes = b""
-
-    # Pack the integer one machine word at a time into bytes.
-    num = number
-    word_bits, _, max_uint, pack_type = machine_size.get_word_alignment(num)
-    pack_format = ">%s" % pack_type
-    while num > 0:
-        raw_bytes = pack(pack_format, num & max_uint) + raw_bytes
-        num >>= word_bits
-    # Obtain the index of the first non-zero byte.
-    zero_leading = bytes_leading(raw_bytes)
-    if number == 0:
-        raw_bytes = b"\x00"
-    # De-padding.
-    raw_bytes = raw_bytes[zero_leading:]
-
-    length = len(raw_bytes)
+    length = common.byte_size(number)
     if fill_size and fill_size > 0:
-        if not overflow and length > fill_size:
-            raise OverflowError(
-                "Need %d bytes for number, but fill size is %d" % (length, fill_size)
-            )
-        raw_bytes = (b"\x00" * (fill_size - len(raw_bytes))) + raw_bytes
+        if length > fill_size:
+            if not overflow:
+                raise OverflowError(
+                    "Need %d bytes for number, but fill size is %d" % (length, fill_size)
+                )
+        else:
+            length = fill_size
     elif chunk_size and chunk_size > 0:
         remainder = length % chunk_size
         if remainder:
-            padding_size = chunk_size - remainder
-            raw_bytes = "% {}s".format(length + padding_size).encode() % raw_bytes
-    return raw_bytes
+            length += chunk_size - remainder
+    return _to_bytes(number, length)
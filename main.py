@@ -7,9 +7,13 @@ import urequests  # MicroPython 用の requests ライブラリ
 import gc # ガーベジコレクションをインポート
 import ujson
 import utime
-import ubinascii
 import ntptime
-from rsa.pkcs1 import sign
+import hashlib
+import os
+from array import array
+from bmp import BMPReader, read_into
+import epdframe
+from jwtsign import JWTBuilder
 from rsa.key import PrivateKey
 import network
 wlan = network.WLAN(network.STA_IF)
@@ -21,6 +25,25 @@ password = None
 # bitmap url
 url = None
 
+# Trueなら変換した行を即座にパネルへ送る (フルフレームバッファを使わない)
+stream_upload = False
+
+# Trueならパネルの初期化/リフレッシュとネットワーク処理を並行して行う (asyncio版)
+async_main = False
+
+# Trueなら前回から変わった行の範囲だけを部分リフレッシュする
+# (パネルのコントローラが部分ウィンドウに対応している場合のみ有効にする)
+partial_refresh = False
+
+# SPIのボーレートと1回の書き込みサイズ (0なら既定の 4MHz, 分割なし)
+spi_baudrate = 0
+spi_chunk = 0
+# Trueならベンチマークで選んだSPIの設定を使う (Falseに戻すと保存した結果を消す)
+spi_benchmark = False
+
+# ディザリングの方式 (none, bayer, floyd-steinberg, atkinson, sierra-lite)
+dither_mode = "bayer"
+
 # Pin configuration
 RST_PIN = 11
 DC_PIN = 21
@@ -32,13 +55,36 @@ TOKEN_ENDPOINT = "https://oauth2.googleapis.com/token"
 
 ACCESS_TOKEN = ''
 
+# アクセストークンのキャッシュ (ディープスリープをまたいで再利用する)
+TOKEN_CACHE_FILE = "token_cache.json"
+# 有効期限までの残りがこの秒数を切ったら、前もって取得し直す
+TOKEN_REFRESH_MARGIN = 300
+
+
+# 事前計算済みの秘密鍵 (exp1, exp2, coef を含むバイナリ, フラッシュ上)
+PRIVATE_KEY_CACHE_FILE = "private_key.bin"
+
+# 読み込んだ秘密鍵 (起動中は使い回す)
+private_key = None
+
+# JWTアサーションの組み立て (固定のクレームをエンコード済み)
+jwt_builder = None
+
 
 # サービスアカウントのクレデンシャルファイルのパス
 CREDENTIALS_FILE = "service-account-key.json"  # 置き換えてください
 
 
-# Initialize EPD
-epd = epd3in0g.EPD(RST_PIN, DC_PIN, CS_PIN, BUSY_PIN)
+# Initialize EPD (async_main を読み込んでから main() で create_epd() により作る)
+epd = None
+
+
+def create_epd():
+    """async_main なら asyncio版の AsyncEPD、そうでなければ EPD を作る。"""
+    if async_main:
+        import epd3in0g_async
+        return epd3in0g_async.AsyncEPD(RST_PIN, DC_PIN, CS_PIN, BUSY_PIN)
+    return epd3in0g.EPD(RST_PIN, DC_PIN, CS_PIN, BUSY_PIN)
 
 def load_config():
     
@@ -46,23 +92,88 @@ def load_config():
     global ssid
     global password
     global url
-    global n
-    global e
-    global d
-    global p
-    global q
+    global stream_upload
+    global dither_mode
+    global async_main
+    global partial_refresh
+    global spi_baudrate
+    global spi_chunk
+    global spi_benchmark
         
     with open("credentials.json", "r") as f:
         credential = ujson.load(f)
         ssid = credential["wifi_ssid"]
         password = credential["wifi_password"]
         url = credential["url"]
-                
-        n = credential["n"]
-        e = credential["e"]
-        d = credential["d"]
-        p = credential["p"]
-        q = credential["q"]
+        stream_upload = credential.get("stream_upload", False)
+        dither_mode = credential.get("dither", "bayer")
+        async_main = credential.get("async_main", False)
+        partial_refresh = credential.get("partial_refresh", False)
+        spi_baudrate = credential.get("spi_baudrate", 0)
+        spi_chunk = credential.get("spi_chunk", 0)
+        spi_benchmark = credential.get("spi_benchmark", False)
+
+# ベンチマークで選んだSPIの設定 (フラッシュ上)
+SPI_CONFIG_FILE = "spi_config.json"
+
+
+def reset_spi_config():
+    """保存したベンチマーク結果を消す (次に spi_benchmark を有効にしたときに測り直す)。"""
+    try:
+        os.remove(SPI_CONFIG_FILE)
+        print("Saved SPI config removed.")
+    except OSError:
+        pass
+
+
+def setup_spi(epd):
+    """
+    credentials.json で spi_baudrate が指定されていればその設定を使う。
+    spi_benchmark が有効なら保存済みのベンチマーク結果を使い、なければ
+    ベンチマークを実行して、最も速く安定していた設定を保存する。
+    どちらでもなければ既定の設定 (4MHz) のままにし、保存した結果は消す。
+    """
+    if spi_baudrate:
+        try:
+            epd.configure_spi(spi_baudrate, spi_chunk)
+        except ValueError as e:
+            print(f"Error: {e}. Using default SPI settings.")
+        return
+
+    if not spi_benchmark:
+        reset_spi_config()
+        return
+
+    try:
+        with open(SPI_CONFIG_FILE, "r") as f:
+            config = ujson.load(f)
+        epd.configure_spi(config["baudrate"], config["chunk"])
+        return
+    except (OSError, ValueError, KeyError):
+        pass
+
+    print("Benchmarking SPI transfer...")
+    gc.collect()
+    frame = bytearray([0x55]) * epdframe.frame_size(epd.width, epd.height)
+    results = epd3in0g.benchmark_spi(epd, frame)
+    for baudrate, chunk, timings in results:
+        print(f"SPI {baudrate} Hz / chunk {chunk}: {timings} us")
+    del frame
+    gc.collect()
+
+    setting = epd3in0g.select_spi_setting(results)
+    if setting is None:
+        print("No stable SPI setting found. Using defaults.")
+        return
+    baudrate, chunk = setting
+    print(f"Selected SPI {baudrate} Hz / chunk {chunk}.")
+    epd.configure_spi(baudrate, chunk)
+    try:
+        with open(SPI_CONFIG_FILE, "w") as f:
+            ujson.dump({"baudrate": baudrate, "chunk": chunk}, f)
+    except OSError as e:
+        print(f"Warning: failed to save SPI config: {e}")
+
 
 # Wi-Fi接続関数
 def connect_wifi():
@@ -85,265 +196,329 @@ def connect_wifi():
         print('already connected:', wlan.ifconfig())
     return wlan.isconnected()
 
-# --- オーダード・ディザリング設定 ---
-# 2x2 Bayer Matrix (0-3の範囲の値)
-# このパターンが画面全体で繰り返される
-BAYER_MATRIX_2X2 = (
-    (0, 2),
-    (3, 1)
-)
-
-# ディザリング強度係数 (値を大きくするとディザリング効果が強くなるが、ざらつきも増える可能性)
-# どの程度の値が良いかは試行錯誤が必要 (例: 16, 32, 48)
-DITHER_FACTOR = 32
-
-# --- 色削減処理の改善 ---
-
-# EPDの4色パレット (RGBタプルのタプル)
-# C++コードの palette 配列に対応します。
-# インデックス 0: 黒, 1: 白, 2: 黄, 3: 赤 の順序が重要です。
-# EPDの実際の発色に合わせて微調整が必要な場合があります。
-EPD_PALETTE = (
-    (0, 0, 0),       # Black (Index 0)
-    (255, 255, 255), # White (Index 1)
-    (255, 255, 0),   # Yellow (Index 2)
-    (255, 0, 0),     # Red (Index 3)
-    # 必要であれば他の色を追加したり、RGB値を調整したりできます
-    # 例えば、より暗い赤を表現したい場合など (ただし、EPDが表現できる範囲で)
-    # (128, 0, 0), # 暗い赤？ (もし使うならインデックス4になる)
-)
-
-# C++のdepalette関数を参考に書き換えた色変換関数
-def rgb_to_epd_color(r, g, b, palette):
+# Wi-Fi接続関数 (asyncio版: 接続を待つ間に他のタスクを進める)
+async def connect_wifi_async():
+    from epd3in0g_async import sleep_ms
+
+    wlan.active(True)
+    if not wlan.isconnected():
+        print('connecting to network...')
+        wlan.connect(ssid, password)
+        max_wait = 300
+        while max_wait > 0 and not wlan.isconnected():
+            await sleep_ms(100)
+            max_wait -= 1
+        if wlan.isconnected():
+            print('network connected:', wlan.ifconfig())
+        else:
+            print('network connection failed.')
+    else:
+        print('already connected:', wlan.ifconfig())
+    return wlan.isconnected()
+
+
+# 前回表示した画像のURL, ディザリング, ETag/Last-Modified (フラッシュ上)
+IMAGE_CACHE_FILE = "image_cache.json"
+
+
+def load_image_cache():
+    try:
+        with open(IMAGE_CACHE_FILE, "r") as f:
+            return ujson.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_image_cache(cache):
+    try:
+        with open(IMAGE_CACHE_FILE, "w") as f:
+            ujson.dump(cache, f)
+    except OSError as e:
+        print(f"Warning: failed to save image cache: {e}")
+
+
+# 前回表示したフレームの1行ごとの CRC32 (フラッシュ上, array('I') のバイナリ)
+FRAME_ROWS_FILE = "frame_rows.bin"
+# 変わった行の範囲がこれより広ければ、部分リフレッシュせずに全体を書き換える
+PARTIAL_REFRESH_MAX_ROWS = 200
+
+
+def load_frame_rows(height):
+    try:
+        rows = array('I', [0] * height)
+        with open(FRAME_ROWS_FILE, "rb") as f:
+            if f.readinto(rows) == len(rows) * 4:
+                return rows
+    except OSError:
+        pass
+    return None
+
+
+def save_frame_rows(rows):
+    try:
+        with open(FRAME_ROWS_FILE, "wb") as f:
+            f.write(rows)
+    except OSError as e:
+        print(f"Warning: failed to save frame rows: {e}")
+
+
+def clear_frame_rows():
+    try:
+        os.remove(FRAME_ROWS_FILE)
+    except OSError:
+        pass
+
+
+def refresh_frame(epd, rows, frame=None):
     """
-    入力されたRGB値に最も近い色をパレットから探し、そのインデックスを返す。
-    距離計算にはRGB各成分の差の二乗和を使用。
+    変換済みのフレームをパネルに反映し、リフレッシュを始めたら True を返す。
+    frame が None の場合はストリーミングで送信済みなので、display_end() でリフレッシュする。
+    前回表示したフレームと行ごとの CRC がすべて同じならリフレッシュしない。
+    partial_refresh が有効なら、変わった行の範囲だけを送って部分リフレッシュする。
     """
-    min_diff_sq = 3 * (255**2) + 1 # 差の二乗和の最大値(255^2 * 3)より大きい初期値
-    best_index = 0                 # デフォルトは黒インデックス
+    changed = epdframe.diff_rows(load_frame_rows(len(rows)), rows)
+    if changed is None:
+        print("Image content unchanged. Skipping refresh.")
+        if frame is None:
+            epd.display_abort()
+        return False
+
+    # 途中で失敗するとパネルの表示が分からなくなるので、先に記録を消しておく。
+    # 新しい記録はリフレッシュが終わってから frame_commit() で保存する
+    clear_frame_rows()
+    start, end = changed
+    if frame is None:
+        print("Refreshing EPD...")
+        epd.display_end()
+    elif partial_refresh and end - start <= PARTIAL_REFRESH_MAX_ROWS:
+        print(f"Partial refresh of rows {start}-{end - 1}...")
+        epd.display_partial(frame, start, end)
+    else:
+        print("Displaying image on EPD...")
+        epd.display(frame)
+    return True
+
 
-    # enumerateを使って、インデックスと色タプルを同時に取得
-    for index, pal_color in enumerate(palette):
-        pal_r, pal_g, pal_b = pal_color
+def frame_commit(rows, refreshed, image_cache=None):
+    """
+    パネルのリフレッシュが終わってから呼ぶ関数を返す。リフレッシュした場合は
+    行ごとの CRC を、image_cache があれば画像キャッシュを保存する。
+    (asyncio版ではリフレッシュの完了を wait_refresh() で待ってから呼ぶ)
+    """
+    def commit():
+        if refreshed:
+            print("Image displayed.")
+            save_frame_rows(rows)
+        if image_cache is not None:
+            save_image_cache(image_cache)
+    return commit
 
-        # RGB各成分の差を計算
-        diff_r = r - pal_r
-        diff_g = g - pal_g
-        diff_b = b - pal_b
 
-        # 差の二乗和を計算 (ユークリッド距離の二乗)
-        # math.pow を使うより直接計算する方が速いことが多い
-        diff_sq = (diff_r * diff_r) + (diff_g * diff_g) + (diff_b * diff_b)
+def get_response_header(response, name):
+    """レスポンスヘッダを大文字小文字を区別せずに取得する。"""
+    headers = getattr(response, "headers", None) or {}
+    name = name.lower()
+    for key in headers:
+        if key.lower() == name:
+            return headers[key]
+    return None
 
-        # 現在の最小距離よりも小さければ更新
-        if diff_sq < min_diff_sq:
-            min_diff_sq = diff_sq
-            best_index = index
-            # 完全に色が一致した場合、それ以上探す必要はない
-            if min_diff_sq == 0:
-                break
 
-    return best_index # 最も色が近いパレットのインデックス (0, 1, 2, or 3)
+# パック済みフレームを受信するときの1回の読み込みサイズ (行単位に切り捨てる)
+EPD_FRAME_CHUNK = 1024
 
 
-# ディザリング対応の色変換関数
-def rgb_to_epd_color_dithered(r, g, b, x, y, palette):
+def display_epd_frame(data_source, header, epd, stream=False, image_cache=None):
     """
-    オーダード・ディザリング (2x2 Bayer) を適用し、
-    入力されたRGB値に最も近い色をパレットから探し、そのインデックスを返す。
-    x, y はピクセルの座標。
+    サーバー側でパック済みのフレーム (.epd) を表示する。ピクセルごとの処理は行わない。
+    stream=Trueの場合は受信したデータをそのままパネルへ送り、最後にCRCを確認する。
+    CRCが合わなければリフレッシュせずに中断する。
+    前回と同じ画像ならリフレッシュしない (refresh_frame() を参照)。
+    フレームを受け取れた場合は、リフレッシュ後に呼ぶ関数 (frame_commit()) を返す。
+    失敗した場合は None を返す。
+    """
+    try:
+        width, height, expected_crc = epdframe.parse_header(header)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
+
+    if width != epd.width or height != epd.height:
+        print(f"Error: EPD frame size ({width}x{height}) does not match EPD size ({epd.width}x{epd.height}).")
+        return None
+
+    size = epdframe.frame_size(width, height)
+    row_len = epdframe.row_bytes(width)
+    rows = array('I', [0] * height)
+    if stream:
+        frame = None
+        # 行ごとの CRC を取れるよう、1回の読み込みは行の倍数にする
+        chunk = bytearray(EPD_FRAME_CHUNK - EPD_FRAME_CHUNK % row_len)
+        view = memoryview(chunk)
+        crc = 0
+        received = 0
+        epd.display_begin()
+        try:
+            while received < size:
+                n = read_into(data_source, view[0:min(len(chunk), size - received)])
+                if not n:
+                    break
+                crc = epdframe.update_crc(view[0:n], crc)
+                epd.display_write(view[0:n])
+                epdframe.row_crcs(view[0:n], width, rows, received // row_len)
+                received += n
+        except Exception:
+            epd.display_abort()
+            raise
+    else:
+        frame = bytearray(size)
+        received = read_into(data_source, memoryview(frame))
+        crc = epdframe.update_crc(frame)
+
+    if received < size or crc != expected_crc:
+        print(f"Error: EPD frame is incomplete or corrupted ({received}/{size} bytes).")
+        if stream:
+            epd.display_abort()
+        return None
+
+    if frame is not None:
+        epdframe.row_crcs(frame, width, rows)
+    print("Displaying EPD frame...")
+    refreshed = refresh_frame(epd, rows, frame)
+    return frame_commit(rows, refreshed, image_cache)
+
+
+def display_bmp_from_url(url, epd, stream=False):
+    """
+    BMP (またはパック済みの .epd フレーム) をダウンロードしてEPDに表示する。
+    stream=Trueの場合はフレームバッファを確保せず、1行変換するごとに
+    DATA_START_TRANSMISSIONのウィンドウへ直接送信する。
+    画像を表示 (またはリフレッシュ不要と判断) した場合は、リフレッシュが
+    終わってから呼ぶ関数を返す。キャッシュはその関数で保存する。
     """
-    # 1. ピクセル座標(x, y)に基づいてBayerパターンの値を取得
-    bayer_value = BAYER_MATRIX_2X2[y % 2][x % 2]
-
-    # 2. 閾値を計算
-    # Bayer値(0-3)を正規化(0-0.75)し、強度係数を掛けることで、
-    # RGB値に加算/減算するためのオフセットを計算する。
-    # 中心化 (bayer_value / 4.0 - 0.5) して、強度を掛ける。
-    # 例: bayer=0 -> -0.5*F, bayer=1 -> -0.25*F, bayer=2 -> +0.25*F, bayer=3 -> +0.5*F
-    threshold = int(((bayer_value / 3.0) - 0.5) * DITHER_FACTOR) # 3.0で割る方が分布が良いかも
-
-    # 3. 元のRGB値に閾値を加算 (0-255の範囲に収めるクリッピング処理)
-    rd = max(0, min(255, r + threshold))
-    gd = max(0, min(255, g + threshold))
-    bd = max(0, min(255, b + threshold))
-
-    # 4. 閾値適用後のRGB値(rd, gd, bd)に対して、最も近いパレット色を探す
-    min_diff_sq = 3 * (255**2) + 1
-    best_index = 0
-
-    for index, pal_color in enumerate(palette):
-        pal_r, pal_g, pal_b = pal_color
-        diff_r = rd - pal_r # ディザリング後の値(rd, gd, bd)と比較
-        diff_g = gd - pal_g
-        diff_b = bd - pal_b
-        diff_sq = (diff_r * diff_r) + (diff_g * diff_g) + (diff_b * diff_b)
-
-        if diff_sq < min_diff_sq:
-            min_diff_sq = diff_sq
-            best_index = index
-            if diff_sq == 0:
-                break
-
-    return best_index
-
-
-def display_bmp_from_url(url, epd):
     buffer = None
     response = None
+    streaming = False # パネルへの転送ウィンドウを開いているか
     # stream 変数は使わず、response.raw か BytesIO を直接使う
 
+    # 前回と同じURLとディザリングなら条件付きリクエストにする
+    cache = load_image_cache()
+    if cache.get("url") != url or cache.get("dither") != dither_mode:
+        cache = {}
+
     try:
         print(f"Downloading BMP from {url} (stream mode)...")
         headers = {
             "Authorization": "Bearer " + ACCESS_TOKEN,
         }
+        if cache.get("etag"):
+            headers["If-None-Match"] = cache["etag"]
+        if cache.get("last_modified"):
+            headers["If-Modified-Since"] = cache["last_modified"]
         # stream=True を使ってレスポンスを取得
         response = urequests.get(url, headers=headers, stream=True)
 
+        if response.status_code == 304:
+             print("Image not modified. Skipping download and display.")
+             response.close()
+             return
+
         if response.status_code == 200:
              print("BMP download successful (stream mode).")
              # response.raw (SSLSocket) をデータソースとして使用
              data_source = response.raw
-
-             # --- BMPヘッダ読み込み ---
-             # data_source から直接 read する
-             header_chunk1 = data_source.read(14) # ファイルヘッダ読み込み
-             if len(header_chunk1) < 14 or header_chunk1[:2] != b'BM':
-                 print("Not a valid BMP file or failed to read header.")
+             new_cache = {
+                 "url": url,
+                 "dither": dither_mode,
+                 "etag": get_response_header(response, "ETag"),
+                 "last_modified": get_response_header(response, "Last-Modified"),
+             }
+
+             # --- ファイルヘッダ (14バイト) を読んで形式を判別する ---
+             header = bytearray(epdframe.HEADER_SIZE)
+             if read_into(data_source, memoryview(header)) < len(header):
+                 print("Failed to read file header.")
                  if response: response.close()
                  return
 
-             bfSize = int.from_bytes(header_chunk1[2:6], 'little')
-             bfOffBits = int.from_bytes(header_chunk1[10:14], 'little')
+             if header[:4] == epdframe.MAGIC:
+                 print("Pre-packed EPD frame detected.")
+                 commit = display_epd_frame(data_source, header, epd, stream, new_cache)
+                 if response: response.close()
+                 return commit
 
-             header_chunk2 = data_source.read(40) # DIBヘッダ (BitmapInfoHeader, 40バイト) を読み込み
-             if len(header_chunk2) < 40:
-                  print("Failed to read DIB header.")
-                  if response: response.close()
-                  return
+             # --- BMPヘッダ読み込み (パレットやマスクも含めてピクセルデータの手前まで) ---
+             try:
+                 reader = BMPReader(data_source, header)
+             except ValueError as header_e:
+                 print(f"Error: {header_e}")
+                 if response: response.close()
+                 return
 
-             biSize = int.from_bytes(header_chunk2[0:4], 'little')
-             biWidth = int.from_bytes(header_chunk2[4:8], 'little')
-             biHeight = int.from_bytes(header_chunk2[8:12], 'little')
-             biPlanes = int.from_bytes(header_chunk2[12:14], 'little')
-             biBitCount = int.from_bytes(header_chunk2[14:16], 'little')
-             biCompression = int.from_bytes(header_chunk2[16:20], 'little')
-             # ... 必要なら他のDIBヘッダ情報も読む ...
-
-             # --- ヘッダ読み込み後、ピクセルデータ開始位置までスキップ ---
-             header_bytes_read = 14 + 40 # 今読み込んだバイト数 (54バイト)
-             # DIBヘッダサイズが40より大きい場合なども考慮が必要だが、まずはこれで試す
-             bytes_to_skip = bfOffBits - header_bytes_read
-             if bytes_to_skip < 0:
-                  print(f"Warning: bfOffBits ({bfOffBits}) seems smaller than header size ({header_bytes_read}).")
-                  bytes_to_skip = 0 # スキップしない
-
-             if bytes_to_skip > 0:
-                  print(f"Skipping {bytes_to_skip} bytes to reach pixel data...")
-                  # seek() を使わずに read() で読み飛ばす
-                  chunk_size = 256 # 一度に読み飛ばすサイズ（小さめにする）
-                  skipped_total = 0
-                  while skipped_total < bytes_to_skip:
-                      read_len = min(bytes_to_skip - skipped_total, chunk_size)
-                      skipped_data = data_source.read(read_len)
-                      if not skipped_data:
-                           print(f"Error: Connection closed while skipping {bytes_to_skip} bytes. Skipped only {skipped_total}.")
-                           if response: response.close()
-                           return
-                      skipped_total += len(skipped_data)
-                      # print(f"Skipped {len(skipped_data)} bytes, total {skipped_total}/{bytes_to_skip}")
-                      # time.sleep_ms(1) # 読み飛ばし中のCPU負荷軽減（必要なら）
-                  print(f"Skipped {skipped_total} bytes successfully.")
-
-             # --- 以降の処理 (解像度チェック、バッファ確保、ピクセル処理) ---
-             print(f"Image Size: {biWidth}x{biHeight}, BitDepth: {biBitCount}, Offset: {bfOffBits}")
-
-             if biWidth != epd.width or biHeight != epd.height:
-                  print(f"Error: BMP size ({biWidth}x{biHeight}) does not match EPD size ({epd.width}x{epd.height}).")
+             print(f"Image Size: {reader.width}x{reader.height}, BitDepth: {reader.bpp}, Compression: {reader.compression}, Offset: {reader.offset}")
+
+             if reader.width != epd.width or reader.height != epd.height:
+                  print(f"Error: BMP size ({reader.width}x{reader.height}) does not match EPD size ({epd.width}x{epd.height}).")
                   if response: response.close()
                   return
 
-             if biBitCount != 24:
-                 print(f"Error: Unsupported bit depth: {biBitCount}. Only 24-bit BMP is currently supported.")
-                 if response: response.close()
-                 return
-
-             buffer_size = (epd.width * epd.height) // 4
-             buffer = bytearray(buffer_size)
-             print(f"Allocating buffer: {buffer_size} bytes")
+             # トップダウンのBMPはパネルと行順が逆になるため、フレームバッファが必要
+             if reader.top_down and stream:
+                 print("Top-down BMP cannot be streamed. Using frame buffer.")
+                 stream = False
+
+             converter = epdframe.BMPFrameConverter(reader, dither_mode)
+
+             row_bytes = epdframe.row_bytes(epd.width)
+             rows = array('I', [0] * epd.height) # 1行ごとの CRC32
+             if stream:
+                 # 1行分のバッファだけを確保し、パネルの書き込みウィンドウを開く
+                 row_buffer = bytearray(row_bytes)
+                 print("Opening EPD data window (stream mode)...")
+                 epd.display_begin()
+                 streaming = True
+             else:
+                 buffer_size = epdframe.frame_size(epd.width, epd.height)
+                 buffer = bytearray(buffer_size)
+                 print(f"Allocating buffer: {buffer_size} bytes")
              gc.collect()
              print(f"Memory after buffer allocation: {gc.mem_free()} bytes")
-
-             row_size_padded = ((biBitCount * biWidth + 31) // 32) * 4
-             row_size_actual = biWidth * 3 # 24bitの場合
+             ok = True
 
              print("Processing pixel data row by row...")
              start_time = time.ticks_ms() # 処理時間計測開始
 
-             for y_epd in range(epd.height):
-                 y_bmp = epd.height - 1 - y_epd
+             for y in range(epd.height):
+                 if stream:
+                     target = row_buffer
+                     row_base = 0
+                 else:
+                     target = buffer
+                     row_base = converter.panel_row(y) * row_bytes
 
-                 # --- BMPの1行分のデータを読み込む ---
-                 row_data = b''
-                 bytes_read = 0
+                 # --- BMPの1行分を読み込み、パネルの形式に変換してバッファに書き込む ---
                  try:
-                     # row_size_padded 分を読み込むまでループ
-                     while bytes_read < row_size_padded:
-                          # 小さなチャンクで読むように試す (メモリ効率と安定性のため)
-                          read_request_size = min(row_size_padded - bytes_read, 256)
-                          chunk = data_source.read(read_request_size)
-                          if not chunk:
-                              print(f"\nWarning: End of stream reached prematurely at y_bmp={y_bmp}, row byte {bytes_read}/{row_size_padded}")
-                              row_data += b'\x00' * (row_size_padded - bytes_read) # 足りない分をゼロ埋め
-                              break # ループを抜ける
-                          row_data += chunk
-                          bytes_read += len(chunk)
+                     converter.convert_row(y, target, row_base)
                  except Exception as read_e:
-                      print(f"\nError reading row data at y_bmp={y_bmp}: {read_e}")
+                      print(f"\nError reading row data at row {y}: {read_e}")
                       # エラーが発生したら処理中断
-                      buffer = None # バッファを無効化
-                      break
-
-                 if buffer is None: # 上の try でエラーが発生した場合
+                      ok = False
                       break
 
-                 if len(row_data) < row_size_padded:
-                      print(f"\nError: Incomplete row data received for y_bmp={y_bmp}.")
-                      buffer = None # バッファを無効化
-                      break
+                 if stream:
+                     # パック済みの行をすぐにパネルへ送る
+                     epd.display_write(row_buffer)
+                     rows[y] = epdframe.update_crc(row_buffer)
 
-                 # --- 1行分のピクセルを処理してバッファに書き込む ---
-                 for x_epd in range(epd.width):
-                     x_bmp = epd.width - 1 - x_epd
-                     pixel_index_in_row = x_bmp * 3
-                     if pixel_index_in_row + 2 < row_size_actual: # 実データ範囲内
-                        blue = row_data[pixel_index_in_row]
-                        green = row_data[pixel_index_in_row + 1]
-                        red = row_data[pixel_index_in_row + 2]
-
-                        # ***** ディザリング対応の色変換関数を呼び出す *****
-                        # ピクセル座標 (x_epd, y_epd) を渡す
-                        epd_color_index = rgb_to_epd_color_dithered(red, green, blue, x_epd, y_epd, EPD_PALETTE)
-                        # ************************************************
-
-                     else: # パディング部分
-                        epd_color_index = 1 # 白 (パレットのインデックス1)
-
-
-                     buffer_index = (x_epd + y_epd * epd.width) // 4
-                     shift = (3 - (x_epd % 4)) * 2
-                     mask = ~(0b11 << shift)
-                     buffer[buffer_index] &= mask
-                     buffer[buffer_index] |= (epd_color_index << shift)
-
-                 # 定期的に進捗表示とメモリ解放
-                 if (y_epd + 1) % 50 == 0:
-                      gc.collect()
+                 # 定期的に進捗表示
+                 if (y + 1) % 50 == 0:
                       elapsed_ms = time.ticks_diff(time.ticks_ms(), start_time)
-                      print(f"Processed line {y_epd + 1}/{epd.height} [{elapsed_ms/1000:.1f}s]. Mem free: {gc.mem_free()}", end='\r')
+                      print(f"Processed line {y + 1}/{epd.height} [{elapsed_ms/1000:.1f}s]. Mem free: {gc.mem_free()}", end='\r')
                       # time.sleep_ms(1) # 必要なら
 
+             if reader.short_rows:
+                 print(f"\nWarning: End of stream reached prematurely. {reader.short_rows} rows were zero-filled.")
+
              # --- ピクセルデータ処理完了 ---
              print("\nPixel data processing finished.") # 改行してプロンプトを綺麗に
              gc.collect()
@@ -356,15 +531,25 @@ def display_bmp_from_url(url, epd):
                   gc.collect()
 
              # --- EPDに表示 ---
-             if buffer: # バッファが正常に作成された場合のみ表示
-                 print("Displaying image on EPD...")
-                 epd.display(buffer)
-                 print("Image displayed.")
+             if ok: # バッファ (またはストリーミング) が正常に作成された場合のみ表示
+                 if not stream:
+                     epdframe.row_crcs(buffer, epd.width, rows)
+                 streaming = False
+                 refreshed = refresh_frame(epd, rows, None if stream else buffer)
+                 # 途中で切れた画像はキャッシュしない (次回304になって表示し直せなくなる)
+                 return frame_commit(rows, refreshed,
+                                     None if reader.short_rows else new_cache)
              else:
                  print("Image display skipped due to processing errors.")
+                 if streaming:
+                     streaming = False
+                     epd.display_abort()
 
         else:
             print(f"Error downloading BMP: Status code {response.status_code}")
+            if response.status_code == 401:
+                # キャッシュしたトークンが無効になっている場合は次回取得し直す
+                clear_token_cache()
             # エラー内容を表示してみる (urequestsが対応していれば)
             try:
                 print("Response body:", response.text)
@@ -380,6 +565,7 @@ def display_bmp_from_url(url, epd):
         print(f"##################################################")
         if buffer: del buffer
         if response: response.close()
+        if streaming: epd.display_abort()
         gc.collect()
 
     except Exception as e:
@@ -389,6 +575,7 @@ def display_bmp_from_url(url, epd):
         sys.print_exception(e)
         if buffer: del buffer
         if response: response.close()
+        if streaming: epd.display_abort()
         gc.collect()
 
 def time_sync():
@@ -426,13 +613,65 @@ def get_next_runtime():
     # 今日の実行時刻をすべて過ぎている場合、翌日の最初の時刻まで
     return (86400 - day_seconds) + run_times[0]
 
+def load_token_cache():
+    try:
+        with open(TOKEN_CACHE_FILE, "r") as f:
+            return ujson.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_token_cache(access_token, expires_at):
+    try:
+        with open(TOKEN_CACHE_FILE, "w") as f:
+            ujson.dump({"access_token": access_token, "expires_at": expires_at}, f)
+    except OSError as e:
+        print(f"Warning: failed to save token cache: {e}")
+
+
+def clear_token_cache():
+    try:
+        os.remove(TOKEN_CACHE_FILE)
+    except OSError:
+        pass
+
+
 def renew_token():
+    """
+    キャッシュしたトークンの有効期限に余裕があればそれを使い、
+    なければJWTを署名して新しいトークンを取得する。
+    取得に失敗した場合は、期限が切れていなければキャッシュしたトークンを使う。
+    """
     global ACCESS_TOKEN
-    
-    ACCESS_TOKEN = get_access_token(CREDENTIALS_FILE)        
-        
+
+    now = utime.time()
+    cached = load_token_cache()
+    if cached.get("access_token") and cached.get("expires_at", 0) - now > TOKEN_REFRESH_MARGIN:
+        print(f"Reusing cached access token (expires in {cached['expires_at'] - now} s).")
+        ACCESS_TOKEN = cached["access_token"]
+        return
+
+    try:
+        token, expires_in = get_access_token(CREDENTIALS_FILE)
+    except OSError as e:
+        print(f"Error getting access token: {e}")
+        token, expires_in = None, 0
+    if token:
+        ACCESS_TOKEN = token
+        save_token_cache(token, now + expires_in)
+    elif cached.get("access_token") and cached.get("expires_at", 0) > now:
+        # 取り直せなくても、期限が切れるまではキャッシュしたトークンを使う
+        print("Token refresh failed. Using cached access token until it expires.")
+        ACCESS_TOKEN = cached["access_token"]
+    else:
+        ACCESS_TOKEN = None
+
 def get_access_token(credentials_file):
-    """サービスアカウントのクレデンシャルファイルを使用してアクセストークンを取得する"""
+    """
+    サービスアカウントのクレデンシャルファイルを使用してアクセストークンを取得する
+    Returns:
+        tuple: (アクセストークン, 有効期間の秒数)。失敗した場合は (None, 0)
+    """
     with open(credentials_file, "r") as f:
         credentials = ujson.load(f)
 
@@ -448,78 +687,75 @@ def get_access_token(credentials_file):
     response = urequests.post(TOKEN_ENDPOINT, headers=headers, data=ujson.dumps(data), timeout=30)
 
     if response.status_code == 200:
-        access_token = response.json()["access_token"]
+        token = response.json()
         response.close()
-        return access_token
+        return token["access_token"], token.get("expires_in", 3600)
     else:
         print(
             f"Error getting access token: {response.status_code} {response.text}"
         )
         response.close()
-        return None
+        return None, 0
     
 def generate_jwt_assertion(credentials):
     """JWTアサーションを生成する"""
     # ペイロード
-    now = int(utime.time())
-    payload = {
-        "iss": credentials["client_email"],
-        "sub": credentials["client_email"],
-        "aud": TOKEN_ENDPOINT,
-        "iat": now,
-        "exp": now + 3600,  # 有効期限: 1時間
-        "scope": "https://www.googleapis.com/auth/devstorage.read_only",
-    }
-    
-    return jwt_encode(payload, credentials["private_key"])
-
-def _to_b64url(data):
-    return (
-        ubinascii.b2a_base64(data)
-        .rstrip(b"\n")
-        .rstrip(b"=")
-        .replace(b"+", b"-")
-        .replace(b"/", b"_")
-    )
-
-
-def _from_b64url(data):
-    return ubinascii.a2b_base64(data.replace(b"-", b"+").replace(b"_", b"/") + b"===")
-
+    global jwt_builder
+
+    # 固定のクレーム (base64url 済みのものを使い回す)
+    claims = [
+        ("iss", credentials["client_email"]),
+        ("sub", credentials["client_email"]),
+        ("aud", TOKEN_ENDPOINT),
+        ("scope", "https://www.googleapis.com/auth/devstorage.read_only"),
+    ]
+    if jwt_builder is None or jwt_builder.static_claims != claims:
+        jwt_builder = JWTBuilder(load_private_key(credentials["private_key"]), claims)
 
-class exceptions:
-    class PyJWTError(Exception):
-        pass
+    now = int(utime.time())
+    return jwt_builder.build(now, now + 3600)  # 有効期限: 1時間
 
-    class InvalidTokenError(PyJWTError):
-        pass
 
-    class InvalidAlgorithmError(PyJWTError):
-        pass
+def parse_private_key(pem_content):
+    """PEM (PKCS#8 または PKCS#1) の秘密鍵を読み込む。"""
+    if "BEGIN RSA PRIVATE KEY" in pem_content:
+        return PrivateKey.load_pkcs1(pem_content)
+    return PrivateKey.load_pkcs8(pem_content)
 
-    class InvalidSignatureError(PyJWTError):
-        pass
+def load_private_key(pem_content):
+    """
+    秘密鍵を返す。フラッシュに同じPEMから作った事前計算済みの鍵があれば
+    それを読み込み、なければ service-account-key.json の private_key を
+    読み込んで保存する。
 
-    class ExpiredTokenError(PyJWTError):
-        pass
+    private_key.bin の形式: PEMのSHA-256 (32バイト) + PrivateKey.save_precomputed()
+    """
+    global private_key
 
-def jwt_encode(payload, pem_content, algorithm="RS256"):
-    global n
-    global e
-    global d
-    global p
-    global q
-    
-    if algorithm != "RS256":
-        raise exceptions.InvalidAlgorithmError()
+    if private_key is not None:
+        return private_key
 
-    key = PrivateKey(n, e, d, p, q)
-    
-    header = _to_b64url(ujson.dumps({"typ": "JWT", "alg": algorithm}).encode())
-    payload = _to_b64url(ujson.dumps(payload).encode())
-    message = header + b"." + payload
-    signature = _to_b64url(sign(message, key, "SHA-256"))
-    return (header + b"." + payload + b"." + signature).decode()
+    digest = hashlib.sha256(pem_content.encode()).digest()
+    try:
+        with open(PRIVATE_KEY_CACHE_FILE, "rb") as f:
+            data = f.read()
+        # 鍵が差し替えられていたら作り直す
+        if data[:len(digest)] == digest:
+            private_key = PrivateKey.load_precomputed(memoryview(data)[len(digest):])
+            return private_key
+        print("Private key changed, rebuilding key cache")
+    except (OSError, ValueError) as err:
+        print(f"Private key cache not available: {err}")
+
+    key = parse_private_key(pem_content)
+    try:
+        with open(PRIVATE_KEY_CACHE_FILE, "wb") as f:
+            f.write(digest)
+            f.write(key.save_precomputed())
+    except OSError as err:
+        print(f"Warning: failed to save private key cache: {err}")
+    private_key = key
+    return key
 
 def is_active_time():
     """
@@ -544,16 +780,98 @@ def is_active_time():
             return True   
     return False
 
+def get_sleep_ms():
+    """次の実行時刻までのディープスリープ時間 (ミリ秒, 最大30分)"""
+    wait_time = get_next_runtime() * 1000  # ミリ秒に変換
+    if wait_time > 1800 * 1000:
+        wait_time = 1800 * 1000
+    return wait_time
+
+# main関数 (asyncio版)
+async def main_async(status_led):
+    """
+    パネルのリセット/初期化を Wi-Fi接続と並行して行い、リフレッシュ中に Wi-Fi を切る。
+    NTP とトークン取得は同期処理なので、パネルの初期化とは重ならない。
+    epd は create_epd() で作った AsyncEPD。
+    """
+    import epd3in0g_async
+
+    print("Initializing EPD...")
+    init_task = epd3in0g_async.asyncio.create_task(epd.init_async())
+
+    print("Connecting to WiFi...")
+    if not await connect_wifi_async():
+        print("WiFi connection failed.")
+
+        machine.reset()
+
+    time_sync()
+
+    active = is_active_time()
+    if active:
+        renew_token()
+
+    commit = None
+    await init_task
+    setup_spi(epd)
+
+    if active:
+        gc.collect()
+        print(f"Initial memory free: {gc.mem_free()} bytes")
+
+        # リフレッシュは開始するだけで、完了は下で待つ
+        commit = display_bmp_from_url(url, epd, stream=stream_upload)
+
+        gc.collect()
+        print(f"Memory free after display attempt: {gc.mem_free()} bytes")
+    else:
+        print("Not in active time. Skipping display.")
+
+    # パネルのリフレッシュ中に Wi-Fi を切る
+    wlan.disconnect()
+    wlan.active(False)
+
+    try:
+        await epd.wait_refresh()
+        # リフレッシュが終わってからキャッシュを保存する
+        if commit:
+            commit()
+    except epd3in0g.BusyTimeoutError as e:
+        # BUSY が戻らなくてもリセットを繰り返さず、保存せずにディープスリープする
+        print(f"Error: {e}")
+    print(f"EPD busy times (ms): {epd.busy_log}")
+
+    machine.Pin(23, machine.Pin.OUT).low()
+    wait_time = get_sleep_ms()
+    print(f"Sleeping for {wait_time / 1000} seconds until next run.")
+
+    print("Putting EPD to sleep.")
+    await epd.sleep_async()
+    print("EPD is sleeping.")
+
+    status_led.value(0)
+
+    machine.deepsleep(wait_time)
+
 # main関数
 def main():
+    global epd
+
     status_led = machine.Pin('LED', machine.Pin.OUT)
     status_led.value(1)
     
     try:
+        load_config()
+        epd = create_epd()
+
+        if async_main:
+            import epd3in0g_async
+            epd3in0g_async.asyncio.run(main_async(status_led))
+            return
+
         print("Initializing EPD...")
         epd.init()
-        
-        load_config()
+        setup_spi(epd)
         
         print("Connecting to WiFi...")
         if not connect_wifi():
@@ -573,7 +891,10 @@ def main():
             print(f"Memory after EPD init/clear: {gc.mem_free()} bytes")
 
             # BMP表示関数を呼び出す
-            display_bmp_from_url(url, epd)
+            commit = display_bmp_from_url(url, epd, stream=stream_upload)
+            if commit:
+                commit()
+            print(f"EPD busy times (ms): {epd.busy_log}")
 
             gc.collect()
             print(f"Memory free after display attempt: {gc.mem_free()} bytes")
@@ -585,9 +906,7 @@ def main():
         
         
         machine.Pin(23, machine.Pin.OUT).low()
-        wait_time = get_next_runtime() * 1000  # ミリ秒に変換
-        if wait_time > 1800 * 1000:
-            wait_time = 1800 * 1000
+        wait_time = get_sleep_ms()
         print(f"Sleeping for {wait_time / 1000} seconds until next run.")
         
         print("Putting EPD to sleep.")
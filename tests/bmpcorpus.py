@@ -0,0 +1,216 @@
+# bmpcorpus.py
+# テスト用のBMPを生成する。画像は上の行から並べた (r, g, b) の行のリストで表す。
+import random
+import struct
+
+EPD_WIDTH = 168
+EPD_HEIGHT = 400
+
+
+def gradient(width=EPD_WIDTH, height=EPD_HEIGHT, seed=1):
+    """グラデーションにノイズを加えた画像。"""
+    rnd = random.Random(seed)
+    return [
+        [((x * 3 + rnd.randrange(40)) % 256,
+          (y // 2 + rnd.randrange(40)) % 256,
+          (x + y + rnd.randrange(60)) % 256) for x in range(width)]
+        for y in range(height)
+    ]
+
+
+def _file(dib, palette, pixel_data):
+    offset = 14 + len(dib) + len(palette)
+    header = b"BM" + struct.pack("<IHHI", offset + len(pixel_data), 0, 0, offset)
+    return header + dib + palette + pixel_data
+
+
+def _info_header(width, height, bpp, compression, image_size, colors=0):
+    return struct.pack("<IiiHHIIiiII", 40, width, height, 1, bpp, compression,
+                       image_size, 2835, 2835, colors, 0)
+
+
+def _pad(row):
+    return row + b"\0" * (-len(row) % 4)
+
+
+def bmp24(image, top_down=False):
+    """24ビット, 無圧縮のBMP。"""
+    width = len(image[0])
+    height = len(image)
+    rows = image if top_down else image[::-1]
+    data = b"".join(_pad(bytes(c for r, g, b in row for c in (b, g, r))) for row in rows)
+    dib = _info_header(width, -height if top_down else height, 24, 0, len(data))
+    return _file(dib, b"", data)
+
+
+# 各チャンネルが 0 か 255 の8色 (16ビットでも誤差なく表せる)。先頭の4色はEPDのパレット
+COLORS = (
+    (0, 0, 0), (255, 255, 255), (255, 255, 0), (255, 0, 0),
+    (0, 0, 255), (0, 255, 0), (0, 255, 255), (255, 0, 255),
+)
+
+
+def indices(width=EPD_WIDTH, height=EPD_HEIGHT, colors=len(COLORS), seed=1):
+    """
+    パレットインデックスの画像。RLEのエンコードモードと絶対モードの両方が出るように、
+    長さの違う同色の区間とノイズの区間を混ぜ、全体が0の行も入れる。
+    """
+    rnd = random.Random(seed)
+    image = []
+    for y in range(height):
+        if y % 37 in (5, 6) or y in (0, height - 1):
+            image.append([0] * width)
+            continue
+        row = []
+        while len(row) < width:
+            if rnd.randrange(3):
+                row += [rnd.randrange(colors)] * rnd.randrange(1, 300)
+            else:
+                row += [rnd.randrange(colors) for _ in range(rnd.randrange(1, 12))]
+        image.append(row[:width])
+    return image
+
+
+def to_rgb(image, palette=COLORS):
+    return [[palette[i] for i in row] for row in image]
+
+
+def _palette(palette, entry=4):
+    return b"".join(bytes((b, g, r, 0)[:entry]) for r, g, b in palette)
+
+
+def _pack(row, bpp):
+    """インデックスの行を bpp ビットずつ上位から詰める。"""
+    per_byte = 8 // bpp
+    out = bytearray((len(row) + per_byte - 1) // per_byte)
+    for x, value in enumerate(row):
+        out[x // per_byte] |= value << (8 - bpp - (x % per_byte) * bpp)
+    return bytes(out)
+
+
+def bmp_indexed(image, palette, bpp, top_down=False, core=False):
+    """1/2/4/8ビット, 無圧縮のBMP。core=True なら OS/2 の BITMAPCOREHEADER を使う。"""
+    width = len(image[0])
+    height = len(image)
+    rows = image if top_down else image[::-1]
+    data = b"".join(_pad(_pack(row, bpp)) for row in rows)
+    if core:
+        dib = struct.pack("<IHHHH", 12, width, height, 1, bpp)
+        return _file(dib, _palette(palette, 3) + b"\0" * 3 * ((1 << bpp) - len(palette)), data)
+    dib = _info_header(width, -height if top_down else height, bpp, 0, len(data), len(palette))
+    return _file(dib, _palette(palette), data)
+
+
+def _runs(row):
+    """同じ値が続く区間 (値, 長さ) に分ける。"""
+    runs = []
+    for value in row:
+        if runs and runs[-1][0] == value:
+            runs[-1][1] += 1
+        else:
+            runs.append([value, 1])
+    return runs
+
+
+def _rle_absolute(values, bpp):
+    if bpp == 8:
+        data = bytes(values)
+    else:
+        data = bytes((values[i] << 4) | (values[i + 1] if i + 1 < len(values) else 0)
+                     for i in range(0, len(values), 2))
+    return bytes((0, len(values))) + data + b"\0" * (len(data) & 1)
+
+
+def _rle_row(row, bpp):
+    """1行をエンコードする。3個以上続く値はエンコードモード、それ以外は絶対モードにまとめる。"""
+    out = bytearray()
+    literal = []
+
+    def flush():
+        while literal:
+            part = literal[:255]
+            del literal[:255]
+            if len(part) < 3:
+                # 絶対モードは3個以上なので、短い端数はエンコードモードで書く
+                for value in part:
+                    out.extend((1, (value << 4) if bpp == 4 else value))
+            else:
+                out.extend(_rle_absolute(part, bpp))
+
+    for value, count in _runs(row):
+        if count < 3:
+            literal.extend([value] * count)
+            continue
+        flush()
+        while count:
+            n = min(count, 255)
+            out.extend((n, (value << 4) | value if bpp == 4 else value))
+            count -= n
+    flush()
+    return bytes(out)
+
+
+def bmp_rle(image, palette, bpp):
+    """BI_RLE8 (bpp=8) / BI_RLE4 (bpp=4) のBMP。全体が0の行はデルタで飛ばす。"""
+    width = len(image[0])
+    height = len(image)
+    rows = image[::-1]
+    out = bytearray()
+    y = 0
+    while y < height:
+        if not any(rows[y]):
+            skip = 1
+            while y + skip < height and not any(rows[y + skip]):
+                skip += 1
+            if y + skip == height:
+                out.extend((0, 1)) # 残りはすべて0: ビットマップの終わり
+                break
+            out.extend((0, 2, 0, skip))
+            y += skip
+            continue
+        out += _rle_row(rows[y], bpp)
+        out.extend((0, 0))
+        y += 1
+    else:
+        out.extend((0, 1))
+    dib = _info_header(width, height, bpp, 1 if bpp == 8 else 2, len(out), len(palette))
+    return _file(dib, _palette(palette), bytes(out))
+
+
+def _bitfields(image, bpp, masks):
+    data = bytearray()
+    size = bpp // 8
+    for row in image[::-1]:
+        line = bytearray()
+        for pixel in row:
+            value = 0
+            for channel, mask in zip(pixel, masks):
+                shift = (mask & -mask).bit_length() - 1
+                value |= (channel * (mask >> shift) // 255) << shift
+            line += value.to_bytes(size, "little")
+        data += _pad(bytes(line))
+    return bytes(data)
+
+
+def bmp16(image, masks=None):
+    """16ビットのBMP。masks (R, G, B) を渡すと BI_BITFIELDS、省略すると 5-5-5 の BI_RGB。"""
+    data = _bitfields(image, 16, masks or (0x7C00, 0x03E0, 0x001F))
+    dib = _info_header(len(image[0]), len(image), 16, 3 if masks else 0, len(data))
+    if masks:
+        return _file(dib + struct.pack("<III", *masks), b"", data)
+    return _file(dib, b"", data)
+
+
+def bmp32(image, masks=None):
+    """
+    32ビットのBMP。masks (R, G, B) を渡すと BITMAPV4HEADER にマスクを入れた BI_BITFIELDS、
+    省略すると BI_RGB (BGRX)。
+    """
+    data = _bitfields(image, 32, masks or (0xFF0000, 0x00FF00, 0x0000FF))
+    width = len(image[0])
+    height = len(image)
+    if not masks:
+        return _file(_info_header(width, height, 32, 0, len(data)), b"", data)
+    dib = struct.pack("<IiiHHIIiiII", 108, width, height, 1, 32, 3, len(data), 2835, 2835, 0, 0)
+    dib += struct.pack("<IIII", *masks, 0) + b"\0" * 52 # アルファのマスク, 色空間
+    return _file(dib, b"", data)
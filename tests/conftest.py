@@ -0,0 +1,44 @@
+# conftest.py
+# テストは CPython で動かす。tools/fakes の偽の machine などを MicroPython の
+# モジュールの代わりに使い、リポジトリ直下と lib, tools (ホスト側のツール) を
+# import できるようにする。
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+for path in (os.path.join(ROOT, "lib"), ROOT, os.path.join(ROOT, "tools"),
+             os.path.join(ROOT, "tools", "fakes")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import machine  # noqa: E402
+import mpcompat  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fake_hardware(monkeypatch):
+    """テストごとに偽のハードウェアの状態を戻し、待ち時間をなくす。"""
+    machine.reset_state()
+    monkeypatch.setattr(mpcompat, "time_scale", 0)
+    yield machine
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """キャッシュなどのファイルを書き込む作業ディレクトリ。"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def epd():
+    """main.py と同じピン配置の EPD。BUSY は解除された状態 (H), CS は非選択 (H) から始める。"""
+    import epd3in0g
+    panel = epd3in0g.EPD(11, 21, 17, 12)
+    panel.busy_pin.drive(1)
+    panel.cs_pin.drive(1)
+    panel.spi.dc = panel.dc_pin
+    return panel
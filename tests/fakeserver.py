@@ -0,0 +1,91 @@
+# fakeserver.py
+# 偽の urequests.handler として使う HTTP サーバーの代わり。
+# 受け取ったリクエストを requests に (メソッド, URL, ヘッダ) で記録する。
+import urequests
+
+
+class ImageServer:
+    """
+    1つの画像を返すサーバー。ETag / Last-Modified を付けて 200 を返し、
+    If-None-Match / If-Modified-Since が今の画像と一致すれば 304 を返す。
+    truncate を設定すると、ボディをそのバイト数で打ち切る (途中で切れた転送)。
+    """
+
+    def __init__(self, body, etag='"v1"', last_modified="Mon, 05 Oct 2026 00:00:00 GMT"):
+        self.requests = []
+        self.truncate = None
+        self.version = 1
+        self.update(body, etag, last_modified)
+
+    def update(self, body, etag=None, last_modified=None):
+        """画像を差し替える。etag を省略すると新しい値を付ける。"""
+        self.body = body
+        self.etag = etag or f'"v{self.version + 1}"'
+        self.last_modified = last_modified
+        self.version += 1
+
+    def __call__(self, method, url, headers, data):
+        self.requests.append((method, url, headers))
+        if (self.etag and headers.get("If-None-Match") == self.etag
+                or self.last_modified and headers.get("If-Modified-Since") == self.last_modified):
+            return urequests.Response(304)
+        response_headers = {}
+        if self.etag:
+            response_headers["ETag"] = self.etag
+        if self.last_modified:
+            response_headers["Last-Modified"] = self.last_modified
+        body = self.body if self.truncate is None else self.body[:self.truncate]
+        return urequests.Response(200, body, response_headers)
+
+    @property
+    def last_headers(self):
+        return self.requests[-1][2]
+
+
+class TokenServer:
+    """
+    OAuth2 のトークンエンドポイント。POST のたびにJWTアサーションの署名を
+    public_key で確かめ、新しいアクセストークンを返す。
+    posts に受け取った回数、claims に最後のアサーションのクレームを記録する。
+    status を 200 以外にするとエラーを返す。
+    """
+
+    def __init__(self, public_key, expires_in=3600):
+        self.public_key = public_key
+        self.expires_in = expires_in
+        self.status = 200
+        self.posts = 0
+        self.claims = None
+
+    def __call__(self, method, url, headers, data):
+        import base64
+        import json
+
+        from rsa.pkcs1 import verify
+
+        assert method == "POST"
+        self.posts += 1
+        if self.status != 200:
+            return urequests.Response(self.status, b'{"error": "invalid_grant"}')
+
+        assertion = json.loads(data)["assertion"].encode()
+        signing_input, signature = assertion.rsplit(b".", 1)
+
+        def decode(part):
+            return base64.urlsafe_b64decode(part + b"=" * (-len(part) % 4))
+
+        verify(signing_input, decode(signature), self.public_key)
+        self.claims = json.loads(decode(signing_input.split(b".")[1]))
+        body = {"access_token": f"token-{self.posts}", "expires_in": self.expires_in,
+                "token_type": "Bearer"}
+        return urequests.Response(200, json.dumps(body).encode())
+
+
+def routes(table):
+    """URL の先頭で振り分ける handler。table は {URLの先頭: handler}。"""
+    def handler(method, url, headers, data):
+        for prefix, target in table.items():
+            if url.startswith(prefix):
+                return target(method, url, headers, data)
+        return urequests.Response(404)
+    return handler
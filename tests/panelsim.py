@@ -0,0 +1,48 @@
+# panelsim.py
+# パネルのコントローラの動きを真似る SPI。コマンドを受け取ると BUSY を L にし、
+# 処理時間 (mpcompat.time_scale をかける) が過ぎたら H に戻す。
+import time
+
+import machine
+
+
+class PanelSPI(machine.SPI):
+    # BUSY を L にするコマンドと、その処理時間 (ミリ秒)
+    busy_ms = {
+        0x04: 100,   # POWER_ON
+        0x12: 15000, # DISPLAY_REFRESH
+        0x02: 100,   # POWER_OFF
+    }
+    dc_pin = 21
+    busy_pin = 12
+
+    # (コマンド, BUSY を L にした時刻, H に戻した時刻) (time.perf_counter() の秒)
+    events = []
+    # 最初のコマンドを受け取った時刻 (リセットが終わって初期化を始めた時刻)
+    first_command = None
+
+    def write(self, buf):
+        super().write(buf)
+        dc = machine.Pin.pins[self.dc_pin]
+        if not dc.level and PanelSPI.first_command is None:
+            PanelSPI.first_command = time.perf_counter()
+        if dc.level or len(buf) != 1 or buf[0] not in self.busy_ms:
+            return
+        busy = machine.Pin.pins[self.busy_pin]
+        event = [buf[0], time.perf_counter(), None]
+        PanelSPI.events.append(event)
+        busy.drive(0)
+
+        def release():
+            event[2] = time.perf_counter()
+            busy.drive(1)
+
+        machine.after_ms(self.busy_ms[buf[0]], release)
+
+    @classmethod
+    def released(cls, command):
+        """command の処理が終わった (最後の) 時刻。終わっていなければ None。"""
+        for cmd, _, end in reversed(cls.events):
+            if cmd == command:
+                return end
+        return None
@@ -0,0 +1,59 @@
+# rsakeys.py
+# テスト用の RSA 鍵。鍵の生成は遅いので、ビット数ごとに1回だけ作って使い回す。
+# lib/rsa の save_pkcs1 は pyasn1 が必要なので、PEM はここで DER を組み立てて作る。
+import base64
+
+import rsa
+from rsa.der import RSA_ENCRYPTION_OID
+
+_keys = {}
+
+
+def keypair(bits=512):
+    """(公開鍵, 秘密鍵) を返す。"""
+    if bits not in _keys:
+        _keys[bits] = rsa.newkeys(bits)
+    return _keys[bits]
+
+
+def _der_length(n):
+    if n < 0x80:
+        return bytes((n,))
+    data = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    return bytes((0x80 | len(data),)) + data
+
+
+def _der(tag, body):
+    return bytes((tag,)) + _der_length(len(body)) + body
+
+
+def _der_integer(value):
+    return _der(0x02, value.to_bytes(value.bit_length() // 8 + 1, "big"))
+
+
+def _pem(der, label):
+    b64 = base64.encodebytes(der).decode().replace("\n", "")
+    lines = [b64[i:i + 64] for i in range(0, len(b64), 64)]
+    return "\n".join(["-----BEGIN %s-----" % label] + lines + ["-----END %s-----" % label])
+
+
+def pkcs1_der(key):
+    """秘密鍵の PKCS#1 RSAPrivateKey (DER)。"""
+    return _der(0x30, b"".join(_der_integer(v) for v in (0, key.n, key.e, key.d, key.p, key.q,
+                                                          key.exp1, key.exp2, key.coef)))
+
+
+def pkcs8_der(key):
+    """秘密鍵の PKCS#8 PrivateKeyInfo (DER)。サービスアカウントの鍵と同じ形式。"""
+    algorithm = _der(0x30, _der(0x06, RSA_ENCRYPTION_OID) + _der(0x05, b""))
+    return _der(0x30, _der_integer(0) + algorithm + _der(0x04, pkcs1_der(key)))
+
+
+def pkcs1_pem(key):
+    """秘密鍵を PKCS#1 の PEM (BEGIN RSA PRIVATE KEY) にする。"""
+    return _pem(pkcs1_der(key), "RSA PRIVATE KEY")
+
+
+def pkcs8_pem(key):
+    """秘密鍵を PKCS#8 の PEM (BEGIN PRIVATE KEY) にする。"""
+    return _pem(pkcs8_der(key), "PRIVATE KEY")
@@ -0,0 +1,90 @@
+# quantize_row_bayer (セルごとのテーブル) を、以前のピクセルごとのディザリングと比べる
+import time
+
+import pytest
+
+import bmpcorpus
+import dither
+from dither import BAYER_MATRIX_2X2, DITHER_FACTOR, EPD_PALETTE, LUT_BITS, LUT_SHIFT
+
+WIDTH = bmpcorpus.EPD_WIDTH
+HEIGHT = bmpcorpus.EPD_HEIGHT
+
+
+def dithered_per_pixel(r, g, b, x, y, lut):
+    """以前の rgb_to_epd_color_dithered と同じ閾値 (浮動小数点) とクリッピングで LUT を引く。"""
+    bayer_value = BAYER_MATRIX_2X2[y % 2][x % 2]
+    threshold = int(((bayer_value / 3.0) - 0.5) * DITHER_FACTOR)
+    rd = max(0, min(255, r + threshold))
+    gd = max(0, min(255, g + threshold))
+    bd = max(0, min(255, b + threshold))
+    i = ((rd >> LUT_SHIFT) << (2 * LUT_BITS)) | ((gd >> LUT_SHIFT) << LUT_BITS) | (bd >> LUT_SHIFT)
+    return (lut[i >> 2] >> ((i & 3) << 1)) & 0b11
+
+
+def dithered_exact(r, g, b, x, y):
+    """LUT を使う前のディザリング (閾値を足してから全パレットを探す)。"""
+    bayer_value = BAYER_MATRIX_2X2[y % 2][x % 2]
+    threshold = int(((bayer_value / 3.0) - 0.5) * DITHER_FACTOR)
+    return dither.rgb_to_epd_color(max(0, min(255, r + threshold)),
+                                   max(0, min(255, g + threshold)),
+                                   max(0, min(255, b + threshold)), EPD_PALETTE)
+
+
+def bmp_row(pixels):
+    """(r, g, b) の並びを 24ビットBMPの1行 (BGR) にする。"""
+    return bytes(v for r, g, b in pixels for v in (b, g, r))
+
+
+@pytest.fixture(scope="module")
+def lut():
+    return dither.build_color_lut()
+
+
+@pytest.mark.parametrize("width", [WIDTH, 1, 2, 3, 7])
+def test_matches_per_pixel(lut, width):
+    image = bmpcorpus.gradient(width, 16)
+    # 端の値でクリッピングが効くように、黒と白の画素を混ぜる
+    image[0][0] = (0, 0, 0)
+    image[1][-1] = (255, 255, 255)
+    indices = bytearray(width)
+    for y, pixels in enumerate(image):
+        dither.quantize_row_bayer(bmp_row(pixels), y, width, indices, lut)
+        # パネルの x は BMP の行の右端から数える
+        expected = [dithered_per_pixel(*pixels[width - 1 - x], x, y, lut) for x in range(width)]
+        assert list(indices) == expected, y
+
+
+def test_throughput(lut, record_property):
+    """
+    168x400 の1フレーム分のディザリングの時間を比べる (CPython での目安)。
+    壁時計の時間は負荷で変わるので判定には使わず、record_property で残す。
+    """
+    image = bmpcorpus.gradient()
+    rows = [bmp_row(pixels) for pixels in image]
+    indices = bytearray(WIDTH)
+
+    def measure(convert):
+        start = time.perf_counter()
+        for y in range(HEIGHT):
+            convert(rows[y], y)
+        return time.perf_counter() - start
+
+    def tables(row, y):
+        dither.quantize_row_bayer(row, y, WIDTH, indices, lut)
+
+    def per_pixel(row, y):
+        for x in range(WIDTH):
+            p = (WIDTH - 1 - x) * 3
+            indices[x] = dithered_per_pixel(row[p + 2], row[p + 1], row[p], x, y, lut)
+
+    def exact(row, y):
+        for x in range(WIDTH):
+            p = (WIDTH - 1 - x) * 3
+            indices[x] = dithered_exact(row[p + 2], row[p + 1], row[p], x, y)
+
+    for name, convert in (("tables", tables), ("per_pixel_lut", per_pixel),
+                          ("per_pixel_exact", exact)):
+        seconds = measure(convert)
+        record_property("bayer_%s_ms" % name, seconds * 1000)
+        record_property("bayer_%s_pixels_per_s" % name, round(WIDTH * HEIGHT / seconds))
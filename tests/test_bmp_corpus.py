@@ -0,0 +1,111 @@
+# 生成したBMPのコーパスを BMPReader で読み、24ビット無圧縮の同じ画像と比べる
+import io
+
+import pytest
+import urequests
+
+import bmpcorpus
+import main
+from bmp import BMPReader
+from dither import EPD_PALETTE, rgb_to_epd_color
+
+WIDTH = 61 # 行末のパディングと、1/2/4ビットの半端なバイトが出る幅
+HEIGHT = 80
+
+
+def decode(data):
+    """すべての行を読み、上の行から並べた (r, g, b) の行のリストにする。"""
+    reader = BMPReader(io.BytesIO(data))
+    rows = []
+    for _ in range(reader.height):
+        bgr = reader.read_row()
+        rows.append([(bgr[i + 2], bgr[i + 1], bgr[i]) for i in range(0, reader.width * 3, 3)])
+    assert reader.short_rows == 0
+    return rows if reader.top_down else rows[::-1]
+
+
+def reference(image):
+    return decode(bmpcorpus.bmp24(image))
+
+
+@pytest.mark.parametrize("bpp", [1, 2, 4, 8])
+@pytest.mark.parametrize("top_down", [False, True])
+def test_indexed(bpp, top_down):
+    palette = bmpcorpus.COLORS[:min(1 << bpp, len(bmpcorpus.COLORS))]
+    image = bmpcorpus.indices(WIDTH, HEIGHT, colors=len(palette), seed=bpp)
+    rgb = bmpcorpus.to_rgb(image, palette)
+    assert decode(bmpcorpus.bmp_indexed(image, palette, bpp, top_down=top_down)) == reference(rgb)
+
+
+def test_os2_core_header():
+    image = bmpcorpus.indices(WIDTH, HEIGHT)
+    rgb = bmpcorpus.to_rgb(image)
+    assert decode(bmpcorpus.bmp_indexed(image, bmpcorpus.COLORS, 8, core=True)) == reference(rgb)
+
+
+@pytest.mark.parametrize("bpp", [4, 8])
+def test_rle(bpp):
+    image = bmpcorpus.indices(WIDTH, HEIGHT, seed=bpp + 10)
+    data = bmpcorpus.bmp_rle(image, bmpcorpus.COLORS, bpp)
+    assert decode(data) == reference(bmpcorpus.to_rgb(image))
+    # 圧縮されていること (エンコードモードが使われている)
+    assert len(data) < len(bmpcorpus.bmp_indexed(image, bmpcorpus.COLORS, bpp))
+
+
+@pytest.mark.parametrize("masks", [None, (0xF800, 0x07E0, 0x001F)])
+def test_16bit(masks):
+    rgb = bmpcorpus.to_rgb(bmpcorpus.indices(WIDTH, HEIGHT))
+    assert decode(bmpcorpus.bmp16(rgb, masks)) == reference(rgb)
+
+
+@pytest.mark.parametrize("masks", [None, (0x0000FF00, 0xFF000000, 0x000000FF)])
+def test_32bit(masks):
+    rgb = bmpcorpus.gradient(WIDTH, HEIGHT)
+    assert decode(bmpcorpus.bmp32(rgb, masks)) == reference(rgb)
+
+
+def test_truncated_rle_is_counted():
+    image = bmpcorpus.indices(WIDTH, HEIGHT)
+    data = bmpcorpus.bmp_rle(image, bmpcorpus.COLORS, 8)
+    reader = BMPReader(io.BytesIO(data[:len(data) // 2]))
+    for _ in range(reader.height):
+        reader.read_row()
+    assert reader.short_rows == 1
+
+
+def test_palette_map_exact():
+    image = bmpcorpus.indices(WIDTH, HEIGHT, colors=4)
+    reader = BMPReader(io.BytesIO(bmpcorpus.bmp_indexed(image, EPD_PALETTE, 2)))
+    index_map, exact = reader.palette_map(EPD_PALETTE, rgb_to_epd_color)
+    assert exact
+    assert list(index_map) == [0, 1, 2, 3]
+
+    out = bytearray(WIDTH)
+    for row in image[::-1]:
+        reader.read_row_indices(out, index_map, reverse=True)
+        assert list(out) == row[::-1]
+
+
+def test_palette_map_inexact():
+    palette = ((10, 10, 10), (250, 250, 250))
+    reader = BMPReader(io.BytesIO(bmpcorpus.bmp_indexed([[0, 1]], palette, 1)))
+    index_map, exact = reader.palette_map(EPD_PALETTE, rgb_to_epd_color)
+    assert not exact
+    assert list(index_map) == [0, 1]
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_indexed_panel_bmp_sends_same_frame(workdir, epd, monkeypatch, stream):
+    """EPDのパレットを持つ2ビットBMPは、同じ画像の24ビットBMPと同じフレームになる。"""
+    monkeypatch.setattr(main, "dither_mode", "none")
+    image = bmpcorpus.indices(colors=4)
+    frames = []
+    for data in (bmpcorpus.bmp24(bmpcorpus.to_rgb(image)),
+                 bmpcorpus.bmp_indexed(image, EPD_PALETTE, 2)):
+        monkeypatch.setattr(urequests, "handler",
+                            lambda method, url, headers, body: urequests.Response(200, data))
+        epd.spi.reset_counters()
+        main.display_bmp_from_url("http://example/image.bmp", epd, stream=stream)
+        frames.append(bytes(epd.spi.data))
+    assert frames[0] == frames[1]
+    assert len(frames[1]) > 16800
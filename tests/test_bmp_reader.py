@@ -0,0 +1,75 @@
+# BMPReader が行ごとにメモリを確保せずに読み込むことを、偽のストリームで確かめる
+import io
+import sys
+import tracemalloc
+
+import bmpcorpus
+from bmp import BMPReader
+
+
+class CountingStream:
+    """read / readinto の呼び出し回数を数えるストリーム。"""
+
+    def __init__(self, data, readinto=True):
+        self.stream = io.BytesIO(data)
+        self.reads = 0
+        self.readintos = 0
+        if not readinto:
+            self.readinto = None
+
+    def read(self, size=-1):
+        self.reads += 1
+        return self.stream.read(size)
+
+    def readinto(self, buf):
+        self.readintos += 1
+        return self.stream.readinto(buf)
+
+
+def read_rows(reader, count):
+    for _ in range(count):
+        reader.read_row()
+
+
+def test_rows_are_read_into_one_buffer():
+    image = bmpcorpus.gradient()
+    stream = CountingStream(bmpcorpus.bmp24(image))
+    reader = BMPReader(stream)
+    reads = stream.reads
+    readintos = stream.readintos
+
+    first = reader.read_row()
+    assert all(reader.read_row() is first for _ in range(10))
+    # ヘッダの後はすべて readinto で読み込む (1行につき1回)
+    assert stream.reads == reads
+    assert stream.readintos - readintos == 11
+
+
+def test_read_fallback_matches_readinto():
+    data = bmpcorpus.bmp24(bmpcorpus.gradient(seed=3))
+    with_readinto = BMPReader(CountingStream(data))
+    stream = CountingStream(data, readinto=False)
+    with_read = BMPReader(stream)
+
+    for _ in range(with_read.height):
+        assert bytes(with_read.read_row()) == bytes(with_readinto.read_row())
+    assert stream.readintos == 0
+    assert with_read.short_rows == 0
+
+
+def test_no_allocation_per_row():
+    image = bmpcorpus.gradient()
+    reader = BMPReader(CountingStream(bmpcorpus.bmp24(image)))
+    read_rows(reader, 10) # 初回の呼び出しで作られるものを除く
+
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        read_rows(reader, 300)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    # 残るメモリはなく、一時的に確保されるのも1行分より小さい
+    assert sys.getallocatedblocks() - blocks < 10
+    assert peak < reader.row_size
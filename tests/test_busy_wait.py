@@ -0,0 +1,149 @@
+# BUSY待ちを、エッジを起こせる偽の Pin で確かめる。
+# 同期版は machine.idle() の回数でエッジを起こし、asyncio版は別のタスクから起こす
+import asyncio
+
+import machine
+import mpcompat
+import pytest
+
+import epd3in0g
+import epd3in0g_async
+from epd3in0g import BUSY_LOG_SIZE, BusyTimeoutError
+
+
+@pytest.fixture
+def busy(epd):
+    epd.busy_pin.drive(0) # リフレッシュ中
+    return epd.busy_pin
+
+
+def test_edge_ends_wait(epd, busy):
+    machine.on_idle(3, lambda: busy.drive(1))
+    epd.ReadBusyH("refresh")
+    assert machine.idle_count == 3
+    assert busy.irqs == 1
+    assert busy.handler is None # 待ち終わったら割り込みを外す
+    assert epd.busy_log[-1][0] == "refresh"
+
+
+def test_falling_edge(epd, busy):
+    busy.drive(1)
+    machine.on_idle(2, lambda: busy.drive(0))
+    epd.ReadBusyL()
+    assert busy.irqs == 1 # 立ち下がりで割り込みが起きた
+    assert machine.idle_count == 2
+
+
+def test_glitch_keeps_waiting(epd, busy):
+    machine.on_idle(1, lambda: busy.glitch(1))
+    machine.on_idle(5, lambda: busy.drive(1))
+    epd.wait_busy(1)
+    assert busy.irqs == 2
+    assert machine.idle_count == 5
+
+
+def test_no_wait_when_already_released(epd):
+    epd.wait_busy(1)
+    assert machine.idle_count == 0
+    assert epd.busy_pin.handler is None
+
+
+def test_timeout(busy):
+    epd = epd3in0g.EPD(11, 21, 17, 12, busy_timeout_ms=5)
+    with pytest.raises(BusyTimeoutError):
+        epd.wait_busy(1, "refresh")
+    assert epd.busy_pin.handler is None
+    assert epd.busy_log == []
+
+
+def test_busy_log_is_capped(epd):
+    for i in range(BUSY_LOG_SIZE + 3):
+        epd.wait_busy(1, f"wait{i}")
+    assert len(epd.busy_log) == BUSY_LOG_SIZE
+    assert epd.busy_log[0][0] == "wait3"
+
+
+def test_refresh_idles_until_busy_released(epd, busy):
+    frame = bytearray(16800)
+    # POWER_ON, DISPLAY_REFRESH, POWER_OFF の後の3回の BUSY 待ち
+    for _ in range(3):
+        machine.on_idle(4, lambda: busy.drive(1))
+        machine.on_idle(5, lambda: busy.drive(0))
+    epd.display(frame)
+    assert [label for label, _ in epd.busy_log] == ["power_on", "refresh", "power_off"]
+
+
+def make_async_epd(**kwargs):
+    panel = epd3in0g_async.AsyncEPD(11, 21, 17, 12, **kwargs)
+    panel.cs_pin.drive(1)
+    return panel
+
+
+async def drive_later(pin, ms, level):
+    await asyncio.sleep(ms / 1000)
+    pin.drive(level)
+
+
+def test_async_edge_ends_wait():
+    async def run():
+        panel = make_async_epd()
+        ticks = 0
+
+        async def other_task():
+            nonlocal ticks
+            while panel.busy_pin.handler is not None or ticks == 0:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        waiter = asyncio.create_task(panel.wait_busy_async(1, "refresh"))
+        await asyncio.gather(waiter, other_task(), drive_later(panel.busy_pin, 50, 1))
+        return panel, ticks
+
+    panel, ticks = asyncio.run(run())
+    assert ticks > 1 # 待っている間に他のタスクが動く
+    assert panel.busy_pin.handler is None
+    assert panel.busy_log[-1][0] == "refresh"
+    assert panel.busy_log[-1][1] >= 40
+
+
+def test_async_glitch_keeps_waiting():
+    async def run():
+        panel = make_async_epd()
+
+        async def glitch():
+            await asyncio.sleep(0.02)
+            panel.busy_pin.glitch(1)
+
+        await asyncio.gather(panel.wait_busy_async(1), glitch(),
+                             drive_later(panel.busy_pin, 80, 1))
+        return panel
+
+    panel = asyncio.run(run())
+    assert panel.busy_pin.irqs == 2
+    assert panel.busy_log[-1][1] >= 70
+
+
+def test_async_timeout():
+    panel = make_async_epd(busy_timeout_ms=30)
+    with pytest.raises(BusyTimeoutError):
+        asyncio.run(panel.wait_busy_async(1))
+    assert panel.busy_pin.handler is None
+
+
+def test_async_wait_does_not_poll(monkeypatch):
+    monkeypatch.setattr(mpcompat, "time_scale", 1)
+    panel = make_async_epd()
+    reads = []
+    value = panel.busy_pin.value
+
+    def counting_value(*args):
+        reads.append(args)
+        return value(*args)
+
+    monkeypatch.setattr(panel.busy_pin, "value", counting_value)
+    machine.after_ms(100, lambda: panel.busy_pin.drive(1)) # 割り込みは別のスレッドから
+
+    asyncio.run(panel.wait_busy_async(1, "refresh"))
+    # 待ち始め (割り込みの設定前と後) と、割り込みで起きた後に読むだけ
+    assert len(reads) == 3
+    assert panel.busy_log[-1][1] >= 90
@@ -0,0 +1,60 @@
+# dither.py の量子化LUTを、厳密な最近傍探索 (rgb_to_epd_color) と比べる
+import pytest
+
+import dither
+from dither import EPD_PALETTE, build_color_lut, load_color_lut, rgb_to_epd_color
+
+
+def lut_entry(lut, r, g, b, bits):
+    """LUTのセル (r, g, b) (各 0〜2^bits-1) のパレットインデックス。"""
+    i = (r << (2 * bits)) | (g << bits) | b
+    return (lut[i >> 2] >> ((i & 3) << 1)) & 0b11
+
+
+@pytest.mark.parametrize("palette, bits", [
+    (EPD_PALETTE, dither.LUT_BITS),
+    (EPD_PALETTE, 4),
+    (((20, 20, 30), (240, 235, 220), (230, 200, 40), (180, 30, 30)), dither.LUT_BITS),
+])
+def test_lut_matches_nearest_color(palette, bits):
+    lut = build_color_lut(palette, bits)
+    levels = 1 << bits
+    shift = 8 - bits
+    half = (1 << shift) >> 1
+    assert len(lut) == levels ** 3 // 4
+    for r in range(levels):
+        for g in range(levels):
+            for b in range(levels):
+                # 各セルの中心値での厳密な最近傍探索と一致する
+                expected = rgb_to_epd_color((r << shift) + half, (g << shift) + half,
+                                            (b << shift) + half, palette)
+                assert lut_entry(lut, r, g, b, bits) == expected, (r, g, b)
+
+
+def test_nearest_engine_uses_lut_cells():
+    # エンジンの参照式 (上位ビットでセルを選ぶ) が LUT の並びと合っている
+    lut = build_color_lut()
+    levels = 1 << dither.LUT_BITS
+    engine = dither.NearestDither(levels, lut)
+    indices = bytearray(levels)
+    for r in range(0, levels, 3):
+        for g in range(0, levels, 3):
+            # BMP の行は BGR で、パネルの並びとは左右が逆
+            row = bytearray()
+            for b in reversed(range(levels)):
+                row += bytes((b << dither.LUT_SHIFT, g << dither.LUT_SHIFT, r << dither.LUT_SHIFT))
+            engine.convert_row(row, 0, indices)
+            assert list(indices) == [lut_entry(lut, r, g, b, dither.LUT_BITS) for b in range(levels)]
+
+
+def test_lut_cache_round_trip(workdir):
+    lut = load_color_lut("lut.bin")
+    assert lut == build_color_lut()
+    # 2回目はファイルから読む (作り直さない)
+    with open("lut.bin", "r+b") as f:
+        f.seek(len(dither._lut_header(EPD_PALETTE, dither.LUT_BITS)))
+        f.write(b"\xff")
+    assert load_color_lut("lut.bin")[0] == 0xff
+    # パレットが変わったら作り直す
+    other = ((0, 0, 0), (255, 255, 255), (0, 0, 255), (255, 0, 0))
+    assert load_color_lut("lut.bin", palette=other) == build_color_lut(other)
@@ -0,0 +1,109 @@
+# dither.py のディザリングエンジン (DITHER_ENGINES) を、モードごとに小さな画像で確かめ、
+# 168x400 の1フレームの時間とメモリのピークを記録する
+import time
+import tracemalloc
+
+import pytest
+
+import bmpcorpus
+import dither
+from dither import DITHER_ENGINES, EPD_PALETTE, make_dither_engine
+
+MODES = sorted(DITHER_ENGINES)
+
+
+def bmp_row(pixels):
+    """(r, g, b) の並びを 24ビットBMPの1行 (BGR) にする。"""
+    return bytes(v for r, g, b in pixels for v in (b, g, r))
+
+
+@pytest.fixture(scope="module")
+def lut():
+    return dither.build_color_lut()
+
+
+def convert(engine, image, extra=0):
+    """image を上の行から順に変換し、行ごとのインデックスのリストを返す。"""
+    out = []
+    indices = bytearray(b"\xff") * (engine.width + extra)
+    for y, pixels in enumerate(image):
+        engine.convert_row(bmp_row(pixels), y, indices)
+        out.append(bytes(indices))
+    return out
+
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("width", [1, 5, 24])
+def test_gradient_stays_in_palette(lut, mode, width):
+    image = bmpcorpus.gradient(width, 12)
+    engine = make_dither_engine(mode, width, lut)
+    assert isinstance(engine, DITHER_ENGINES[mode])
+    for row in convert(engine, image, extra=3):
+        # 幅の分だけ書き込み、その先 (番兵) には触れない
+        assert len(row) == width + 3
+        assert row[width:] == b"\xff\xff\xff"
+        assert all(0 <= index <= 3 for index in row[:width])
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_palette_colors_are_exact(lut, mode):
+    # パレットの色そのものは、どのモードでもそのインデックスになる (誤差が出ない)
+    width = 8
+    for index, color in enumerate(EPD_PALETTE):
+        engine = make_dither_engine(mode, width, lut)
+        for row in convert(engine, [[color] * width] * 4):
+            assert row == bytes([index]) * width, (mode, color)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_gray_uses_black_and_white(lut, mode):
+    # 中間の灰色: ディザリングのあるモードは黒と白を混ぜる
+    width = 16
+    engine = make_dither_engine(mode, width, lut)
+    used = set()
+    for row in convert(engine, [[(128, 128, 128)] * width] * 8):
+        used.update(row)
+    if mode == "none":
+        assert len(used) == 1
+    else:
+        assert used == {0, 1}
+
+
+def test_unknown_mode_falls_back_to_bayer(lut):
+    assert isinstance(make_dither_engine("unknown", 8, lut), dither.BayerDither)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_frame_time_and_memory(lut, mode, record_property):
+    """
+    168x400 の1フレームを変換する時間とメモリのピーク (CPython での目安)。
+    時間は負荷で変わるので record_property で残すだけにする。
+    メモリは行数によらず、行ごとの確保もないことを確かめる。
+    """
+    width = bmpcorpus.EPD_WIDTH
+    rows = [bmp_row(pixels) for pixels in bmpcorpus.gradient()]
+    indices = bytearray(width)
+
+    def run(height):
+        engine = make_dither_engine(mode, width, lut)
+        for y in range(height):
+            engine.convert_row(rows[y], y, indices)
+
+    def peak(height):
+        tracemalloc.start()
+        try:
+            run(height)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    run(2) # Bayerのテーブルなど、初回だけ作られるものを除く
+    start = time.perf_counter()
+    run(len(rows)) # tracemalloc は遅くなるので、時間は別に測る
+    record_property("%s_frame_ms" % mode, (time.perf_counter() - start) * 1000)
+
+    short_peak = peak(10)
+    frame_peak = peak(60)
+    record_property("%s_peak_bytes" % mode, frame_peak)
+    assert frame_peak < short_peak + 256
+    assert frame_peak < 64 * width
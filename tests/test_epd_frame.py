@@ -0,0 +1,135 @@
+# パック済みのフレーム (.epd) の表示を、偽のサーバーと SPI の記録で確かめる。
+# tools/bmp2epd.py で変換したフレームは BMP を直接表示したときと同じバイト列になり、
+# 壊れたフレーム (CRC の不一致, 途中で切れた転送, 知らないバージョン) はリフレッシュしない
+import io
+import os
+
+import pytest
+import urequests
+
+import bmp2epd
+import bmpcorpus
+import epdframe
+import main
+from fakeserver import ImageServer
+
+URL = "http://example/image.epd"
+
+
+def commands(log):
+    return [data[0] for dc, data in log if dc == 0]
+
+
+@pytest.fixture
+def server(workdir, monkeypatch):
+    image = ImageServer(b"")
+    monkeypatch.setattr(urequests, "handler", image)
+    return image
+
+
+def wake(epd, stream=False):
+    """1回の起動と同じように画像を表示する。表示しなかった場合は None を返す。"""
+    epd.spi.reset_counters()
+    commit = main.display_bmp_from_url(URL, epd, stream=stream)
+    if commit:
+        commit()
+    return commit
+
+
+def forget_image():
+    """次の起動で、同じ画像でもダウンロードしてリフレッシュさせる。"""
+    for path in (main.IMAGE_CACHE_FILE, main.FRAME_ROWS_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def epd_file(image=None, dither_mode="bayer"):
+    bmp = bmpcorpus.bmp24(image or bmpcorpus.gradient())
+    return bmp2epd.convert(io.BytesIO(bmp), dither_mode)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+@pytest.mark.parametrize("mode", ["bayer", "floyd-steinberg"])
+def test_epd_matches_bmp(server, epd, monkeypatch, mode, stream):
+    monkeypatch.setattr(main, "dither_mode", mode)
+    image = bmpcorpus.gradient(seed=3)
+    server.update(bmpcorpus.bmp24(image))
+    assert wake(epd, stream)
+    from_bmp = (bytes(epd.spi.data), commands(epd.spi.log))
+    assert 0x12 in from_bmp[1]
+
+    forget_image()
+    server.update(epd_file(image, mode))
+    assert wake(epd, stream)
+    assert (bytes(epd.spi.data), commands(epd.spi.log)) == from_bmp
+
+
+def test_header_round_trip():
+    header = epdframe.pack_header(168, 400, 0x89ABCDEF)
+    assert len(header) == epdframe.HEADER_SIZE
+    assert epdframe.parse_header(header) == (168, 400, 0x89ABCDEF)
+    for bad in (b"BM" + header[2:], header[:-1], b""):
+        with pytest.raises(ValueError):
+            epdframe.parse_header(bad)
+
+
+def assert_not_refreshed(epd, stream):
+    sent = commands(epd.spi.log)
+    assert 0x12 not in sent
+    if stream and sent:
+        # 途中まで送ったら電源を切って中断する
+        assert sent[-1] == 0x02
+    assert not os.path.exists(main.FRAME_ROWS_FILE)
+    assert not os.path.exists(main.IMAGE_CACHE_FILE)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_crc_mismatch_is_not_displayed(server, epd, stream):
+    data = bytearray(epd_file())
+    data[epdframe.HEADER_SIZE + 1000] ^= 0x01
+    server.update(bytes(data))
+    assert wake(epd, stream) is None
+    assert_not_refreshed(epd, stream)
+    if stream:
+        # ストリーミングでは送り終えてから CRC が分かる
+        assert 0x10 in commands(epd.spi.log)
+    else:
+        assert epd.spi.nbytes == 0
+
+    # 壊れたフレームはキャッシュされないので、次の起動で正しいフレームを表示できる
+    server.update(epd_file())
+    assert wake(epd, stream)
+    assert 0x12 in commands(epd.spi.log)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+@pytest.mark.parametrize("length", [10, epdframe.HEADER_SIZE, epdframe.HEADER_SIZE + 1000, -1])
+def test_truncated_frame_is_not_displayed(server, epd, stream, length):
+    data = epd_file()
+    server.update(data)
+    server.truncate = length % len(data) # 負の値は末尾から数える
+    assert wake(epd, stream) is None
+    assert_not_refreshed(epd, stream)
+    if server.truncate < epdframe.HEADER_SIZE or not stream:
+        assert epd.spi.nbytes == 0
+
+
+@pytest.mark.parametrize("offset, value", [
+    (0, b"EPDG"),       # マジックナンバー (BMP として読もうとして失敗する)
+    (4, b"\x02"),       # バージョン
+    (6, b"\xa7\x00"),   # 幅 167
+    (8, b"\x91\x01"),   # 高さ 401
+])
+def test_bad_header_is_not_displayed(server, epd, offset, value):
+    data = bytearray(epd_file())
+    data[offset:offset + len(value)] = value
+    server.update(bytes(data))
+    assert wake(epd, stream=True) is None
+    assert epd.spi.nbytes == 0
+    assert_not_refreshed(epd, True)
+
+
+def test_bmp2epd_rejects_truncated_bmp():
+    bmp = bmpcorpus.bmp24(bmpcorpus.gradient())
+    with pytest.raises(ValueError):
+        bmp2epd.convert(io.BytesIO(bmp[:-1000]))
@@ -0,0 +1,59 @@
+# EPD のSPI転送を偽の SPI で数える
+import epd3in0g
+
+
+def frame_bytes(size):
+    return bytes(i * 7 & 0xFF for i in range(size))
+
+
+def data_after(log, command):
+    """command の後に DC=H で送られたデータをつなげて返す。"""
+    out = bytearray()
+    found = False
+    for dc, data in log:
+        if dc == 0:
+            found = data == bytes((command,))
+            continue
+        if found:
+            out += data
+    return bytes(out)
+
+
+def test_display_sends_frame_in_one_write(epd):
+    frame = frame_bytes(epd3in0g.EPD_WIDTH * epd3in0g.EPD_HEIGHT // 4)
+    epd.display(frame)
+
+    assert (1, frame) in epd.spi.log
+    assert data_after(epd.spi.log, 0x10) == frame
+    # POWER_ON, 0x10, フレーム, DISPLAY_REFRESH (2回), POWER_OFF (2回)
+    assert epd.spi.writes == 7
+    assert epd.cs_pin.falls == 5
+
+
+def test_bulk_write_versus_per_byte(epd):
+    frame = frame_bytes(epd3in0g.EPD_WIDTH * epd3in0g.EPD_HEIGHT // 4)
+
+    epd.send_data_bulk(frame)
+    bulk = (epd.spi.writes, epd.cs_pin.falls)
+    epd.spi.reset_counters()
+    falls = epd.cs_pin.falls
+    for value in frame:
+        epd.send_data(value)
+    per_byte = (epd.spi.writes, epd.cs_pin.falls - falls)
+
+    assert bulk == (1, 1)
+    assert per_byte == (len(frame), len(frame))
+    assert bytes(epd.spi.data) == frame
+
+
+def test_chunked_bulk_write_keeps_one_transaction(epd):
+    frame = frame_bytes(16800)
+    epd.configure_spi(chunk_size=4096)
+    epd.spi.dc = epd.dc_pin
+    falls = epd.cs_pin.falls
+
+    epd.send_data_bulk(frame)
+
+    assert epd.spi.writes == 5
+    assert epd.cs_pin.falls - falls == 1
+    assert bytes(epd.spi.data) == frame
@@ -0,0 +1,80 @@
+# 条件付きリクエスト (ETag / Last-Modified) で、変わっていない画像の取得と
+# リフレッシュを省くことを、200 / 304 を返す偽のサーバーで確かめる
+import pytest
+import urequests
+
+import bmpcorpus
+import main
+from fakeserver import ImageServer
+
+URL = "http://example/image.bmp"
+
+
+@pytest.fixture
+def server(workdir, monkeypatch):
+    image = ImageServer(bmpcorpus.bmp24(bmpcorpus.gradient()))
+    monkeypatch.setattr(urequests, "handler", image)
+    return image
+
+
+def wake(epd, stream=False):
+    """1回の起動と同じように画像を表示し、送ったバイト数を返す。"""
+    epd.spi.reset_counters()
+    commit = main.display_bmp_from_url(URL, epd, stream=stream)
+    if commit:
+        commit()
+    return epd.spi.nbytes
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_not_modified_skips_download_and_refresh(server, epd, stream):
+    assert wake(epd, stream) > 16800
+    assert "If-None-Match" not in server.last_headers
+
+    assert wake(epd, stream) == 0
+    assert server.last_headers["If-None-Match"] == server.etag
+    assert server.last_headers["If-Modified-Since"] == server.last_modified
+
+
+def test_last_modified_only(server, epd):
+    server.etag = None
+    wake(epd)
+    assert "If-None-Match" not in server.last_headers
+    assert wake(epd) == 0
+    assert server.last_headers["If-Modified-Since"] == server.last_modified
+
+
+def test_changed_image_is_downloaded(server, epd):
+    wake(epd)
+    server.update(bmpcorpus.bmp24(bmpcorpus.gradient(seed=5)))
+    assert wake(epd) > 16800
+    assert wake(epd) == 0
+
+
+def test_same_content_with_new_etag_skips_refresh(server, epd):
+    wake(epd)
+    server.update(server.body)
+    # ダウンロードはするが、行ごとの CRC が同じなのでパネルには何も送らない
+    assert wake(epd) == 0
+    assert server.last_headers["If-None-Match"] != server.etag
+
+
+def test_truncated_body_is_not_cached(server, epd):
+    server.truncate = len(server.body) // 2
+    assert wake(epd) > 16800
+    wake(epd)
+    assert "If-None-Match" not in server.last_headers
+
+
+def test_cache_saved_only_after_commit(server, epd):
+    main.display_bmp_from_url(URL, epd) # リフレッシュが終わらなかった
+    wake(epd)
+    assert "If-None-Match" not in server.last_headers
+
+
+def test_dither_change_bypasses_cache(server, epd, monkeypatch):
+    wake(epd)
+    monkeypatch.setattr(main, "dither_mode", "none")
+    assert wake(epd) > 16800
+    assert "If-None-Match" not in server.last_headers
+    assert wake(epd) == 0
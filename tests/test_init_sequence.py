@@ -0,0 +1,105 @@
+# コマンドテーブルによる初期化を偽の SPI で数え、1バイトずつ送る場合と比べる
+import time
+
+import pytest
+
+import epd3in0g
+from epd3in0g import EPD, INIT_SEQUENCE
+
+
+def commands(table):
+    """コマンドテーブルを (コマンド, データ) のリストにする。"""
+    out = []
+    i = 0
+    while i < len(table):
+        n = table[i + 1]
+        out.append((table[i], bytes(table[i + 2:i + 2 + n])))
+        i += 2 + n
+    return out
+
+
+def send_per_byte(epd, table):
+    """テーブルを使わない場合と同じく、1バイトごとに send_command / send_data で送る。"""
+    for command, data in commands(table):
+        epd.send_command(command)
+        for value in data:
+            epd.send_data(value)
+
+
+def per_byte_log(log):
+    """(DC, データ) の記録を1バイトずつに分ける。"""
+    return [(dc, value) for dc, data in log for value in data]
+
+
+def test_init_registers_one_write_per_payload(epd):
+    falls = epd.cs_pin.falls
+    epd.init_registers()
+
+    expected = []
+    for command, data in commands(INIT_SEQUENCE):
+        expected.append((0, bytes((command,))))
+        expected.append((1, data))
+    assert epd.spi.log == expected
+    assert epd.spi.writes == 20
+    assert epd.cs_pin.falls - falls == 10
+
+
+def test_same_bytes_as_per_byte(epd):
+    epd.init_registers()
+    table = (epd.spi.writes, list(epd.spi.log))
+    epd.spi.reset_counters()
+    falls = epd.cs_pin.falls
+    send_per_byte(epd, INIT_SEQUENCE)
+
+    assert per_byte_log(epd.spi.log) == per_byte_log(table[1])
+    assert epd.spi.writes == len(INIT_SEQUENCE) - 10 # データ長の分を除いた全バイト
+    assert epd.cs_pin.falls - falls == epd.spi.writes
+    assert table[0] < epd.spi.writes
+
+
+def test_init_time(epd, record_property):
+    """
+    init_registers を繰り返し、1回あたりの書き込み回数とバイト数が変わらないことを確かめる。
+    時間は負荷で変わるので判定には使わず、record_property で残す。
+    """
+    epd.spi.dc = None
+    repeat = 200
+    falls = epd.cs_pin.falls
+    start = time.perf_counter()
+    for _ in range(repeat):
+        epd.init_registers()
+    record_property("init_registers_us", (time.perf_counter() - start) / repeat * 1000000)
+
+    assert epd.spi.writes == 20 * repeat
+    assert epd.spi.nbytes == (len(INIT_SEQUENCE) - 10) * repeat
+    assert epd.cs_pin.falls - falls == 10 * repeat
+
+
+def test_init_resets_panel(epd):
+    epd.init()
+    assert epd.rst_pin.falls == 1
+    assert epd.rst_pin.level == 1
+    assert epd.spi.writes == 20
+
+
+def test_deep_sleep_sequence(epd):
+    epd.enter_deep_sleep()
+    assert epd.spi.log == [(0, b"\x02"), (1, b"\x00"), (0, b"\x07"), (1, b"\xa5")]
+    assert epd.cs_pin.falls == 2
+
+
+@pytest.mark.parametrize("table", [bytes((0x01, 2, 0x0F)), bytes((0x50, 1, 0x37, 0x60))])
+def test_truncated_table(epd, table):
+    with pytest.raises(ValueError):
+        epd.send_sequence(table)
+
+
+def test_panel_variant_swaps_table(epd):
+    class Variant(EPD):
+        init_sequence = bytes((0x00, 2, 0x1F, 0x0D, 0x04, 0))
+
+    panel = Variant(11, 21, 17, 12)
+    panel.spi.dc = panel.dc_pin
+    panel.init_registers()
+    assert panel.spi.log == [(0, b"\x00"), (1, b"\x1f\x0d"), (0, b"\x04")]
+    assert epd3in0g.EPD.init_sequence is INIT_SEQUENCE
@@ -0,0 +1,60 @@
+# JWTBuilder の出力を、PyJWT と同じ手順 (json.dumps + base64url + RS256) で作った JWT と比べる
+import base64
+import json
+
+import pytest
+import rsa
+from rsa.pkcs1 import sign, verify
+
+from jwtsign import JWTBuilder
+
+
+@pytest.fixture(scope="module")
+def keys():
+    return rsa.newkeys(512)
+
+
+def b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def b64decode(part):
+    return base64.urlsafe_b64decode(part + b"=" * (-len(part) % 4))
+
+
+def reference_jwt(claims, key):
+    """PyJWT の jwt.encode(claims, key, algorithm="RS256") と同じ JWT。"""
+    header = json.dumps({"alg": "RS256", "typ": "JWT"}, separators=(",", ":"), sort_keys=True)
+    payload = json.dumps(claims, separators=(",", ":"))
+    signing_input = b64url(header.encode()) + b"." + b64url(payload.encode())
+    return (signing_input + b"." + b64url(sign(signing_input, key, "SHA-256"))).decode()
+
+
+# 固定部分の長さを変えて、base64url の3バイト境界のずれをすべて通す
+@pytest.mark.parametrize("email", ["a@example.com", "ab@example.com", "abc@example.com"])
+def test_matches_reference(keys, email):
+    public_key, private_key = keys
+    static = [("iss", email), ("sub", email), ("aud", "https://oauth2.googleapis.com/token"),
+              ("scope", "https://www.googleapis.com/auth/devstorage.read_only")]
+    builder = JWTBuilder(private_key, static)
+
+    for iat in (0, 1791849600, 1791849600 + 12345):
+        token = builder.build(iat, iat + 3600)
+        claims = dict(static, iat=iat, exp=iat + 3600)
+        assert token == reference_jwt(claims, private_key)
+
+        header, payload, signature = token.encode().split(b".")
+        assert json.loads(b64decode(header)) == {"alg": "RS256", "typ": "JWT"}
+        assert json.loads(b64decode(payload)) == claims
+        assert verify(header + b"." + payload, b64decode(signature), public_key) == "SHA-256"
+        assert b"=" not in token.encode()
+
+
+def test_tampered_claims_fail_verification(keys):
+    public_key, private_key = keys
+    token = JWTBuilder(private_key, [("iss", "a@example.com")]).build(100, 3700)
+    header, payload, signature = token.encode().split(b".")
+    forged = b64url(json.dumps({"iss": "a@example.com", "iat": 100, "exp": 99999},
+                               separators=(",", ":")).encode())
+    with pytest.raises(rsa.VerificationError):
+        verify(header + b"." + forged, b64decode(signature), public_key)
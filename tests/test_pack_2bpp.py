@@ -0,0 +1,60 @@
+# pack_2bpp を以前の1ピクセルずつのマスク書き込みと比べる
+import random
+import time
+
+import pytest
+
+from dither import pack_2bpp
+
+
+def pack_per_pixel(indices, out, offset=0):
+    """以前の display_bmp_from_url のループ (ピクセルごとに読み出し, マスク, 書き込み)。"""
+    for x, value in enumerate(indices):
+        index = offset + x // 4
+        shift = (3 - (x % 4)) * 2
+        out[index] &= ~(0b11 << shift)
+        out[index] |= value << shift
+    return offset + (len(indices) + 3) // 4
+
+
+@pytest.mark.parametrize("width", [168, 1, 2, 3, 4, 5, 167])
+def test_bit_identical_to_per_pixel(width):
+    rnd = random.Random(width)
+    for _ in range(20):
+        indices = bytearray(rnd.randrange(4) for _ in range(width))
+        expected = bytearray(width // 4 + 3)
+        actual = bytearray(width // 4 + 3)
+        assert pack_2bpp(indices, actual, 1) == pack_per_pixel(indices, expected, 1)
+        assert actual == expected
+
+        # 前の内容が残っていても、書き込む範囲はすべて上書きする
+        stale = bytearray(b"\xff") * len(actual)
+        end = pack_2bpp(indices, stale, 1)
+        assert stale[1:end] == expected[1:end]
+
+
+def test_full_frame(epd):
+    rnd = random.Random(0)
+    image = bytearray(rnd.randrange(4) for _ in range(epd.width * epd.height))
+    expected = bytearray(len(image) // 4)
+    pack_per_pixel(image, expected)
+    assert epd.getbuffer(image) == expected
+
+
+def test_throughput(record_property):
+    """
+    400行分をパックする時間を比べる (CPython での目安)。
+    壁時計の時間は負荷で変わるので判定には使わず、record_property で残す。
+    """
+    rnd = random.Random(1)
+    rows = [bytearray(rnd.randrange(4) for _ in range(168)) for _ in range(8)]
+    out = bytearray(42)
+
+    def measure(pack):
+        start = time.perf_counter()
+        for y in range(400):
+            pack(rows[y & 7], out)
+        return time.perf_counter() - start
+
+    record_property("pack_2bpp_ms", measure(pack_2bpp) * 1000)
+    record_property("per_pixel_ms", measure(pack_per_pixel) * 1000)
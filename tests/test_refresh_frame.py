@@ -0,0 +1,86 @@
+# 行ごとの CRC による差分判定と部分リフレッシュを、偽の SPI の記録で確かめる
+import os
+
+import pytest
+
+import epdframe
+import main
+
+
+def make_frame(seed, height=400, row=42):
+    return bytearray(b"".join(bytes([(y * 7 + seed) & 0xFF]) * row for y in range(height)))
+
+
+def change_rows(frame, start, end, row=42):
+    out = bytearray(frame)
+    for i in range(start * row, end * row):
+        out[i] ^= 0x55
+    return out
+
+
+def commands(log):
+    return [data[0] for dc, data in log if dc == 0]
+
+
+@pytest.fixture
+def shown(workdir, epd):
+    """frame を表示済み (行の CRC を保存済み) にする。"""
+    def show(frame):
+        rows = epdframe.row_crcs(frame, epd.width)
+        main.frame_commit(rows, main.refresh_frame(epd, rows, frame))()
+        epd.spi.reset_counters()
+        return rows
+    return show
+
+
+def test_identical_frame_is_skipped(shown, epd):
+    frame = make_frame(0)
+    rows = shown(frame)
+    assert not main.refresh_frame(epd, rows, frame)
+    assert epd.spi.writes == 0
+
+
+def test_streamed_identical_frame_powers_off(shown, epd):
+    frame = make_frame(0)
+    rows = shown(frame)
+    assert not main.refresh_frame(epd, rows)
+    assert commands(epd.spi.log) == [0x02] # display_abort()
+
+
+def test_rows_cleared_until_commit(shown, epd):
+    shown(make_frame(0))
+    frame = make_frame(1)
+    rows = epdframe.row_crcs(frame, epd.width)
+    commit = main.frame_commit(rows, main.refresh_frame(epd, rows, frame))
+    # リフレッシュ中は前のフレームの記録を残さない
+    assert not os.path.exists(main.FRAME_ROWS_FILE)
+    commit()
+    assert list(main.load_frame_rows(epd.height)) == list(rows)
+
+
+def test_partial_refresh_sends_changed_rows(shown, epd, monkeypatch):
+    monkeypatch.setattr(main, "partial_refresh", True)
+    base = make_frame(0)
+    shown(base)
+    frame = change_rows(base, 180, 212)
+    assert main.refresh_frame(epd, epdframe.row_crcs(frame, epd.width), frame)
+
+    assert commands(epd.spi.log) == [0x04, 0x91, 0x90, 0x10, 0x12, 0x02]
+    window = epd.spi.log[epd.spi.log.index((0, b"\x90")) + 1][1]
+    assert window == bytes((0, 0, 0, 167, 0, 180, 0, 211, 1))
+    assert (1, bytes(frame[180 * 42:212 * 42])) in epd.spi.log
+
+    # 次の全体の書き換えでは部分モードを抜ける
+    epd.spi.reset_counters()
+    epd.display(frame)
+    assert commands(epd.spi.log)[:3] == [0x04, 0x92, 0x10]
+
+
+def test_wide_change_uses_full_refresh(shown, epd, monkeypatch):
+    monkeypatch.setattr(main, "partial_refresh", True)
+    base = make_frame(0)
+    shown(base)
+    frame = change_rows(base, 0, main.PARTIAL_REFRESH_MAX_ROWS + 1)
+    main.refresh_frame(epd, epdframe.row_crcs(frame, epd.width), frame)
+    assert 0x91 not in commands(epd.spi.log)
+    assert (1, bytes(frame)) in epd.spi.log
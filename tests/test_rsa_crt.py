@@ -0,0 +1,61 @@
+# CRT による秘密鍵の演算 (lib/rsa/key.py) を、CRT を使わない pow(c, d, n) と比べる
+import random
+import time
+
+import pytest
+from rsa import common, transform
+from rsa.pkcs1 import HASH_ASN1, _pad_for_signing, compute_hash, sign, verify
+
+import rsakeys
+
+
+def plain_sign(message, key):
+    """CRT も blinding も使わずに、pow(m, d, n) だけで作る PKCS#1 v1.5 署名。"""
+    keylength = common.byte_size(key.n)
+    padded = _pad_for_signing(HASH_ASN1["SHA-256"] + compute_hash(message, "SHA-256"),
+                              keylength)
+    return transform.int2bytes(pow(transform.bytes2int(padded), key.d, key.n), keylength)
+
+
+@pytest.mark.parametrize("bits", [256, 512, 1024])
+def test_crt_pow_matches_plain_pow(bits):
+    _, key = rsakeys.keypair(bits)
+    rnd = random.Random(bits)
+    for value in [0, 1, 2, key.n - 1, key.p, key.q] + [rnd.randrange(key.n) for _ in range(50)]:
+        assert key._crt_pow(value) == pow(value, key.d, key.n)
+        assert key.blinded_decrypt(value) == pow(value, key.d, key.n)
+        assert key.blinded_encrypt(value) == pow(value, key.d, key.n)
+
+
+@pytest.mark.parametrize("bits", [512, 1024])
+def test_signatures_match_plain_pow(bits):
+    public_key, key = rsakeys.keypair(bits)
+    rnd = random.Random(bits + 1)
+    for _ in range(30):
+        message = bytes(rnd.randrange(256) for _ in range(rnd.randrange(200)))
+        signature = sign(message, key, "SHA-256")
+        assert signature == plain_sign(message, key)
+        assert verify(message, signature, public_key) == "SHA-256"
+
+
+def test_crt_pow_rejects_out_of_range():
+    _, key = rsakeys.keypair(512)
+    with pytest.raises(ValueError):
+        key._crt_pow(-1)
+    with pytest.raises(OverflowError):
+        key._crt_pow(key.n + 1)
+
+
+def test_sign_benchmark(record_property):
+    """1024ビット鍵での sign() の時間 (CRT あり/なし)。判定には使わず記録だけする。"""
+    _, key = rsakeys.keypair(1024)
+    message = b"x" * 64
+
+    def measure(func, repeat=20):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / repeat * 1000000
+
+    record_property("sign_crt_us", measure(lambda: sign(message, key, "SHA-256")))
+    record_property("sign_plain_us", measure(lambda: plain_sign(message, key)))
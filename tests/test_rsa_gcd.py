@@ -0,0 +1,80 @@
+# lib/rsa/common.py の extended_gcd (Lehmer) と inverse を、元のユークリッドの互除法と
+# pow(a, -1, m) と比べる
+import math
+import random
+
+import pytest
+from rsa import common
+
+
+def euclid_extended_gcd(a, b):
+    """Lehmer 化する前の extended_gcd (1ステップずつの互除法)。"""
+    x, y, lx, ly = 0, 1, 1, 0
+    oa, ob = a, b
+    while b != 0:
+        q = a // b
+        (a, b) = (b, a % b)
+        (x, lx) = ((lx - (q * x)), x)
+        (y, ly) = ((ly - (q * y)), y)
+    if lx < 0:
+        lx += ob
+    if ly < 0:
+        ly += oa
+    return a, lx, ly
+
+
+@pytest.fixture(params=["default", 12, 28])
+def lehmer_bits(request, monkeypatch):
+    """機械語の大きさで変わる _LEHMER_BITS を、32ビットの MicroPython の値 (28) などにもする。"""
+    if request.param != "default":
+        monkeypatch.setattr(common, "_LEHMER_BITS", request.param)
+    return common._LEHMER_BITS
+
+
+def pairs(rnd):
+    """(a, b) の組。大きさの違う数、同じ数、0、公約数を持つ数を混ぜる。"""
+    yield 0, 0
+    yield 0, 1 << 100
+    yield 1 << 100, 0
+    yield (1 << 200) + 1, (1 << 200) + 1
+    yield 65537, (1 << 2048) - 159
+    for _ in range(200):
+        a = rnd.getrandbits(rnd.randrange(1, 1100))
+        b = rnd.getrandbits(rnd.randrange(1, 1100))
+        if rnd.random() < 0.3:
+            factor = rnd.getrandbits(rnd.randrange(1, 200)) | 1
+            a, b = a * factor, b * factor
+        yield a, b
+
+
+def test_extended_gcd_matches_euclid(lehmer_bits):
+    rnd = random.Random(18)
+    for a, b in pairs(rnd):
+        r, i, j = common.extended_gcd(a, b)
+        assert (r, i, j) == euclid_extended_gcd(a, b), (a, b)
+        assert r == math.gcd(a, b)
+
+
+@pytest.mark.parametrize("have_pow_inverse", [True, False])
+def test_inverse_matches_pow(lehmer_bits, have_pow_inverse, monkeypatch):
+    monkeypatch.setattr(common, "_HAVE_POW_INVERSE", have_pow_inverse)
+    rnd = random.Random(180)
+    for _ in range(300):
+        m = rnd.getrandbits(rnd.randrange(2, 1100)) | 2
+        x = rnd.randrange(1, m)
+        if math.gcd(x, m) == 1:
+            assert common.inverse(x, m) == pow(x, -1, m), (x, m)
+        else:
+            with pytest.raises(common.NotRelativePrimeError) as excinfo:
+                common.inverse(x, m)
+            assert excinfo.value.d == math.gcd(x, m)
+
+
+@pytest.mark.parametrize("have_pow_inverse", [True, False])
+def test_inverse_not_relative_prime(have_pow_inverse, monkeypatch):
+    monkeypatch.setattr(common, "_HAVE_POW_INVERSE", have_pow_inverse)
+    p = (1 << 127) - 1
+    q = (1 << 89) - 1
+    for x, n in [(6, 4), (p, p * q), (p * 3, q * 3), (0, 7)]:
+        with pytest.raises(common.NotRelativePrimeError):
+            common.inverse(x, n)
@@ -0,0 +1,59 @@
+# lib/rsa/core.py のべき乗剰余のバックエンドを組み込みの pow() と比べ、
+# 鍵の長さごとの処理時間を記録する
+import random
+
+import pytest
+from rsa import core
+
+
+def cases(rnd, bits):
+    """(x, e, m) の組。端の値 (e=0, x=0, x>=m, 偶数の法) と乱数を混ぜる。"""
+    m = rnd.getrandbits(bits) | (1 << (bits - 1)) | 1
+    yield 0, 5, m
+    yield 1, m - 1, m
+    yield m - 1, 2, m
+    yield m + 7, 3, m
+    yield rnd.randrange(m), 0, m
+    yield rnd.randrange(m), 1, m
+    even = m + 1
+    yield rnd.randrange(even), rnd.getrandbits(bits), even
+    for _ in range(10):
+        yield rnd.randrange(m), rnd.getrandbits(bits), m
+
+
+@pytest.mark.parametrize("name", sorted(core.POW_BACKENDS))
+@pytest.mark.parametrize("bits", [2, 8, 64, 256, 1024])
+def test_backend_matches_builtin_pow(name, bits):
+    func = core.POW_BACKENDS[name]
+    rnd = random.Random(bits)
+    for x, e, m in cases(rnd, bits):
+        assert func(x, e, m) == pow(x, e, m), (x, e, m)
+
+
+@pytest.mark.parametrize("name", sorted(core.POW_BACKENDS))
+def test_small_moduli(name):
+    func = core.POW_BACKENDS[name]
+    for m in range(2, 40):
+        for x in range(0, m + 2):
+            for e in range(0, 12):
+                assert func(x, e, m) == pow(x, e, m), (x, e, m)
+
+
+@pytest.mark.parametrize("name", sorted(core.POW_BACKENDS))
+def test_select_backend(name):
+    selected = core.POW_BACKEND
+    try:
+        assert core.select_backend(name) == name
+        assert core.POW_BACKEND == name
+        assert core.fast_pow(7, 65537, 1000003) == pow(7, 65537, 1000003)
+    finally:
+        core.select_backend(selected)
+
+
+@pytest.mark.parametrize("name", sorted(core.POW_BACKENDS))
+@pytest.mark.parametrize("bits", [1024, 2048, 4096])
+def test_benchmark_backend(name, bits, record_property):
+    # 時間は環境で変わるので記録するだけ (pytest --junitxml で見る)
+    us = core.benchmark_backend(name, bits=bits, rounds=1)
+    record_property("%s_%d_us" % (name, bits), us)
+    assert us >= 0
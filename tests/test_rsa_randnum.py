@@ -0,0 +1,93 @@
+# lib/rsa/randnum.py の乱数が範囲に収まること、os.urandom() の呼び出しがプールの
+# 補充1回につき1回だけになることを確かめる
+import os
+import random
+
+import pytest
+from rsa import randnum
+
+
+@pytest.fixture
+def urandom(monkeypatch):
+    """os.urandom の代わり (シード付きの乱数)。呼ばれたときのバイト数を calls に残す。"""
+    rnd = random.Random(19)
+    calls = []
+
+    def fake_urandom(nbytes):
+        calls.append(nbytes)
+        return bytes(rnd.getrandbits(8) for _ in range(nbytes))
+
+    monkeypatch.setattr(os, "urandom", fake_urandom)
+    monkeypatch.setattr(randnum, "_pool", randnum.EntropyPool(64))
+    return calls
+
+
+def test_pool_refills_once_per_block(urandom):
+    pool = randnum._pool
+    for _ in range(4):
+        assert len(pool.read(16)) == 16
+    assert urandom == [64]
+    # 残りが足りなければ、プール1つ分をまとめて読み直す
+    assert len(pool.read(1)) == 1
+    assert urandom == [64, 64]
+    assert len(pool.read(63)) == 63
+    assert urandom == [64, 64]
+
+
+def test_pool_does_not_repeat_bytes(urandom):
+    pool = randnum._pool
+    data = b"".join(pool.read(8) for _ in range(16))
+    assert urandom == [64, 64]
+    assert data[:64] != data[64:]
+
+
+def test_large_read_bypasses_pool(urandom):
+    pool = randnum._pool
+    pool.read(10)
+    assert len(pool.read(100)) == 100
+    assert urandom == [64, 100]
+    # 大きな読み出しのあとも、プールに残っているバイトを使う
+    pool.read(54)
+    assert urandom == [64, 100]
+
+
+def test_pool_refills_after_fork(urandom, monkeypatch):
+    pool = randnum._pool
+    pool.read(8)
+    monkeypatch.setattr(randnum, "_getpid", lambda: -1)
+    pool.read(8)
+    assert urandom == [64, 64]
+
+
+def test_read_random_bits_range(urandom):
+    for nbits in range(1, 130):
+        for _ in range(20):
+            data = randnum.read_random_bits(nbits)
+            assert len(data) == (nbits + 7) // 8
+            assert int.from_bytes(data, "big") < 1 << nbits
+
+
+def test_read_random_int_sets_top_bit(urandom):
+    for nbits in range(1, 300, 7):
+        for _ in range(10):
+            assert randnum.read_random_int(nbits).bit_length() == nbits
+            value = randnum.read_random_odd_int(nbits)
+            assert value.bit_length() == nbits
+            assert value & 1
+
+
+@pytest.mark.parametrize("maxvalue", [1, 2, 3, 5, 8, 255, 256, 257, (1 << 64) - 1, 1 << 64])
+def test_randint_range(urandom, maxvalue):
+    seen = set()
+    for _ in range(300):
+        value = randnum.randint(maxvalue)
+        assert 1 <= value <= maxvalue
+        seen.add(value)
+    if maxvalue <= 8:
+        assert seen == set(range(1, maxvalue + 1))
+
+
+def test_randint_rejects_small_maxvalue(urandom):
+    for maxvalue in (0, -1):
+        with pytest.raises(ValueError):
+            randnum.randint(maxvalue)
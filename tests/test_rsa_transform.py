@@ -0,0 +1,107 @@
+# lib/rsa/transform.py の bytes2int / int2bytes を、1バイトずつ変換する素朴な実装と比べる。
+# int.from_bytes / int.to_bytes がない MicroPython 向けの、ワード単位の変換も試す
+import random
+
+import pytest
+from rsa import transform
+
+
+def naive_bytes2int(raw_bytes):
+    result = 0
+    for value in raw_bytes:
+        result = result * 256 + value
+    return result
+
+
+def naive_int2bytes(number, length):
+    out = bytearray(length)
+    for i in range(length - 1, -1, -1):
+        number, out[i] = divmod(number, 256)
+    assert number == 0
+    return bytes(out)
+
+
+@pytest.fixture(params=["native", "chunked"])
+def native(request, monkeypatch):
+    """int.to_bytes を使う場合と、使えない場合 (ワード単位の変換) の両方で試す。"""
+    monkeypatch.setattr(transform, "HAVE_NATIVE_INT_BYTES", request.param == "native")
+    return request.param
+
+
+def needed(number):
+    """number を表すのに必要なバイト数 (0 は 1 バイト)。"""
+    return max(1, (number.bit_length() + 7) // 8)
+
+
+def random_bytes(rnd):
+    """長さが 0〜70 バイトで、先頭に 0 が並ぶこともあるバイト列。"""
+    raw = bytes(rnd.getrandbits(8) for _ in range(rnd.randrange(71)))
+    if raw and rnd.random() < 0.3:
+        raw = bytes(rnd.randrange(1, 10)) + raw
+    return raw
+
+
+def test_bytes2int_matches_naive(native):
+    rnd = random.Random(16)
+    for _ in range(500):
+        raw = random_bytes(rnd)
+        assert transform.bytes2int(raw) == naive_bytes2int(raw), raw
+    # ワード単位の変換でも、端数のバイトだけ・ワードだけ・両方の場合が合う
+    for length in range(0, 3 * transform._WORD_BYTES + 2):
+        raw = bytes(range(1, length + 1))
+        assert transform._bytes2int_chunked(raw) == naive_bytes2int(raw)
+
+
+def test_zero(native):
+    assert transform.bytes2int(b"") == 0
+    assert transform.bytes2int(b"\x00\x00\x00") == 0
+    assert transform.int2bytes(0) == b"\x00"
+    assert transform.int2bytes(0, fill_size=5) == bytes(5)
+    assert transform.int2bytes(0, chunk_size=4) == bytes(4)
+    assert transform._int2bytes(0) == b"\x00"
+    assert transform._int2bytes(0, 3) == bytes(3)
+
+
+def test_leading_zeros_round_trip(native):
+    rnd = random.Random(160)
+    for _ in range(300):
+        raw = random_bytes(rnd)
+        number = transform.bytes2int(raw)
+        # fill_size なしでは先頭の 0 は消え、fill_size で元の長さに戻る
+        assert transform.int2bytes(number) == naive_int2bytes(number, needed(number))
+        if raw:
+            assert transform.int2bytes(number, fill_size=len(raw)) == raw
+            assert transform._int2bytes(number, len(raw)) == raw
+
+
+def test_chunk_size_pads_to_multiple(native):
+    rnd = random.Random(161)
+    for _ in range(300):
+        number = rnd.getrandbits(rnd.randrange(1, 600))
+        chunk = rnd.randrange(1, 20)
+        out = transform.int2bytes(number, chunk_size=chunk)
+        assert len(out) % chunk == 0
+        assert len(out) - chunk < needed(number) <= len(out)
+        assert out == naive_int2bytes(number, len(out))
+
+
+def test_fill_size_overflow(native):
+    number = 0x0102030405
+    with pytest.raises(OverflowError):
+        transform.int2bytes(number, fill_size=4)
+    with pytest.raises(OverflowError):
+        transform._int2bytes(number, 4)
+    # overflow=True なら切り詰めずにそのまま返す
+    assert transform.int2bytes(number, fill_size=4, overflow=True) == b"\x01\x02\x03\x04\x05"
+    assert transform.int2bytes(number, fill_size=5) == b"\x01\x02\x03\x04\x05"
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        transform.int2bytes(1, fill_size=4, chunk_size=4)
+    with pytest.raises(ValueError):
+        transform.int2bytes(-1)
+    with pytest.raises(ValueError):
+        transform._int2bytes(-1)
+    with pytest.raises(TypeError):
+        transform._int2bytes(1.0)
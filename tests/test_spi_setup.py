@@ -0,0 +1,127 @@
+# SPIの設定 (既定値, ベンチマーク, 保存した結果の扱い) を偽の SPI で確かめる
+import json
+import os
+
+import pytest
+
+import epd3in0g
+import main
+from epd3in0g import SPI_BAUDRATE, SPI_MAX_BAUDRATE
+
+
+class ByteClock:
+    """送ったバイト数とボーレートから時間を進める時計 (マイクロ秒)。"""
+
+    def __init__(self, epd, overhead_us=20):
+        self.epd = epd
+        self.overhead_us = overhead_us
+        self.now = 0
+        self.last = (0, 0)
+
+    def __call__(self):
+        spi = self.epd.spi
+        counters = (spi.writes, spi.nbytes)
+        if counters[0] >= self.last[0]:
+            writes = counters[0] - self.last[0]
+            nbytes = counters[1] - self.last[1]
+        else: # configure_spi() で作り直された
+            writes, nbytes = counters
+        self.now += writes * self.overhead_us + nbytes * 8 * 1000000 // spi.baudrate
+        self.last = counters
+        return self.now
+
+
+def test_select_prefers_lower_baudrate_within_margin():
+    results = [
+        (4000000, 0, [1000, 1001, 1000]),
+        (8000000, 0, [520, 521, 520]),
+        (10000000, 0, [500, 501, 500]),
+    ]
+    assert epd3in0g.select_spi_setting(results) == (8000000, 0)
+    assert epd3in0g.select_spi_setting(results, margin=0) == (10000000, 0)
+
+
+def test_select_skips_unstable_and_failed():
+    results = [
+        (4000000, 0, [1000, 1000, 1000]),
+        (8000000, 0, [500, 800, 500]), # ばらつきが大きい
+        (10000000, 0, []),             # 設定できなかった
+    ]
+    assert epd3in0g.select_spi_setting(results) == (4000000, 0)
+    assert epd3in0g.select_spi_setting([(4000000, 0, [])]) is None
+
+
+def test_benchmark_restores_setting(epd):
+    frame = bytearray(16800)
+    results = epd3in0g.benchmark_spi(epd, frame, clock=ByteClock(epd), repeats=2)
+    assert len(results) == (len(epd3in0g.SPI_BENCHMARK_BAUDRATES)
+                            * len(epd3in0g.SPI_BENCHMARK_CHUNKS))
+    assert all(baudrate <= SPI_MAX_BAUDRATE for baudrate, _, _ in results)
+    assert all(len(timings) == 2 for _, _, timings in results)
+    assert (epd.baudrate, epd.chunk_size) == (SPI_BAUDRATE, 0)
+    assert epd.spi.baudrate == SPI_BAUDRATE
+
+
+@pytest.mark.parametrize("baudrate", [0, SPI_MAX_BAUDRATE + 1])
+def test_configure_rejects_out_of_range(epd, baudrate):
+    with pytest.raises(ValueError):
+        epd.configure_spi(baudrate)
+    assert epd.baudrate == SPI_BAUDRATE
+
+
+@pytest.fixture
+def config(workdir, monkeypatch):
+    def set_config(baudrate=0, chunk=0, benchmark=False):
+        monkeypatch.setattr(main, "spi_baudrate", baudrate)
+        monkeypatch.setattr(main, "spi_chunk", chunk)
+        monkeypatch.setattr(main, "spi_benchmark", benchmark)
+    set_config()
+    return set_config
+
+
+def test_default_is_4mhz(config, epd):
+    main.setup_spi(epd)
+    assert epd.spi.baudrate == 4000000
+    assert not os.path.exists(main.SPI_CONFIG_FILE)
+
+
+def test_benchmark_is_opt_in_and_saved(config, epd, monkeypatch):
+    config(benchmark=True)
+    benchmark = epd3in0g.benchmark_spi
+    runs = []
+
+    def counting_benchmark(epd, frame, **kwargs):
+        runs.append(len(frame))
+        return benchmark(epd, frame, clock=ByteClock(epd))
+
+    monkeypatch.setattr(epd3in0g, "benchmark_spi", counting_benchmark)
+    main.setup_spi(epd)
+    with open(main.SPI_CONFIG_FILE) as f:
+        saved = json.load(f)
+    assert runs == [16800]
+    assert (epd.baudrate, epd.chunk_size) == (saved["baudrate"], saved["chunk"])
+    assert epd.baudrate <= SPI_MAX_BAUDRATE
+
+    # 次の起動では保存した結果を使い、測り直さない
+    panel = epd3in0g.EPD(11, 21, 17, 12)
+    main.setup_spi(panel)
+    assert runs == [16800]
+    assert panel.baudrate == saved["baudrate"]
+
+    # spi_benchmark を無効に戻すと保存した結果を消し、既定の設定に戻る
+    config(benchmark=False)
+    panel = epd3in0g.EPD(11, 21, 17, 12)
+    main.setup_spi(panel)
+    assert not os.path.exists(main.SPI_CONFIG_FILE)
+    assert panel.baudrate == SPI_BAUDRATE
+
+
+def test_explicit_baudrate(config, epd):
+    config(baudrate=8000000, chunk=4096)
+    main.setup_spi(epd)
+    assert (epd.spi.baudrate, epd.chunk_size) == (8000000, 4096)
+
+    config(baudrate=20000000)
+    panel = epd3in0g.EPD(11, 21, 17, 12)
+    main.setup_spi(panel)
+    assert panel.spi.baudrate == SPI_BAUDRATE
@@ -0,0 +1,60 @@
+# BMP をダウンロードしながら1行ずつパネルへ送るモードを、フレームバッファを使う
+# モードと比べる (送ったバイト列が同じで、フルフレームのバッファを確保しない)
+import tracemalloc
+
+import pytest
+import urequests
+
+import bmpcorpus
+import epdframe
+import main
+
+
+@pytest.fixture
+def serve_bmp(monkeypatch):
+    def serve(data):
+        monkeypatch.setattr(urequests, "handler",
+                            lambda method, url, headers, body: urequests.Response(200, data))
+    return serve
+
+
+def replay(epd, stream):
+    """BMP を表示し、そのときの Python のメモリ使用量のピークを返す。"""
+    epd.spi.reset_counters()
+    epd.spi.dc = None # 書き込みごとの記録はメモリを使うので取らない
+    tracemalloc.start()
+    try:
+        main.display_bmp_from_url("http://example/image.bmp", epd, stream=stream)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_stream_upload_sends_same_bytes(workdir, epd, serve_bmp):
+    serve_bmp(bmpcorpus.bmp24(bmpcorpus.gradient()))
+    replay(epd, stream=False) # 色変換のLUTなどを先に読み込んでおく
+
+    buffered_peak = replay(epd, stream=False)
+    buffered = (bytes(epd.spi.data), epd.spi.writes)
+    streamed_peak = replay(epd, stream=True)
+    streamed = (bytes(epd.spi.data), epd.spi.writes)
+
+    assert streamed[0] == buffered[0]
+    # 1行ごとに書き込むので、行数分だけ書き込みが増える
+    assert streamed[1] == buffered[1] + epd.height - 1
+    frame_size = epdframe.frame_size(epd.width, epd.height)
+    assert streamed_peak < buffered_peak - frame_size
+
+
+def test_top_down_bmp_falls_back_to_buffer(workdir, epd, serve_bmp, monkeypatch):
+    # ディザリングのパターンはファイルの行順で決まるので、比べるときは使わない
+    monkeypatch.setattr(main, "dither_mode", "none")
+    image = bmpcorpus.gradient(seed=2)
+    serve_bmp(bmpcorpus.bmp24(image))
+    replay(epd, stream=False)
+    bottom_up = bytes(epd.spi.data)
+
+    serve_bmp(bmpcorpus.bmp24(image, top_down=True))
+    replay(epd, stream=True)
+
+    assert bytes(epd.spi.data) == bottom_up
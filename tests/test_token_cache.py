@@ -0,0 +1,141 @@
+# アクセストークンのキャッシュを、署名とPOSTの回数を数える偽のトークンエンドポイントで確かめる
+import json
+
+import pytest
+import rsa
+import urequests
+import utime
+
+import jwtsign
+import main
+from fakeserver import TokenServer, routes
+from rsakeys import pkcs1_pem
+
+NOW = 1791849600
+
+
+@pytest.fixture(scope="module")
+def keys():
+    return rsa.newkeys(512)
+
+
+class Clock:
+    def __init__(self):
+        self.now = NOW
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = Clock()
+    monkeypatch.setattr(utime, "time", now)
+    return now
+
+
+@pytest.fixture
+def token_server(workdir, keys, clock, monkeypatch):
+    public_key, private_key = keys
+    with open(main.CREDENTIALS_FILE, "w") as f:
+        json.dump({"client_email": "epd@example.iam.gserviceaccount.com",
+                   "private_key": pkcs1_pem(private_key)}, f)
+    monkeypatch.setattr(main, "private_key", None)
+    monkeypatch.setattr(main, "jwt_builder", None)
+    monkeypatch.setattr(main, "ACCESS_TOKEN", "")
+
+    server = TokenServer(public_key)
+    server.signed = 0 # JWTBuilder.build() を呼んだ回数
+    build = jwtsign.JWTBuilder.build
+
+    def counting_build(self, *args, **kwargs):
+        server.signed += 1
+        return build(self, *args, **kwargs)
+
+    monkeypatch.setattr(jwtsign.JWTBuilder, "build", counting_build)
+    monkeypatch.setattr(urequests, "handler", routes({main.TOKEN_ENDPOINT: server}))
+    return server
+
+
+def test_token_is_reused_until_margin(token_server, clock):
+    main.renew_token()
+    assert main.ACCESS_TOKEN == "token-1"
+    assert (token_server.signed, token_server.posts) == (1, 1)
+    claims = token_server.claims
+    assert claims["aud"] == main.TOKEN_ENDPOINT
+    assert claims["iat"] == NOW and claims["exp"] == NOW + 3600
+
+    # 次の起動 (deepsleep 後はグローバル変数も消える)
+    main.ACCESS_TOKEN = ""
+    clock.now = NOW + 3600 - main.TOKEN_REFRESH_MARGIN - 1
+    main.renew_token()
+    assert main.ACCESS_TOKEN == "token-1"
+    assert (token_server.signed, token_server.posts) == (1, 1)
+
+    # 残りが余裕の秒数を切ったら先に取り直す
+    clock.now = NOW + 3600 - main.TOKEN_REFRESH_MARGIN
+    main.renew_token()
+    assert main.ACCESS_TOKEN == "token-2"
+    assert (token_server.signed, token_server.posts) == (2, 2)
+
+
+def test_expires_in_from_endpoint(token_server, clock):
+    token_server.expires_in = 600
+    main.renew_token()
+    clock.now = NOW + 600 - main.TOKEN_REFRESH_MARGIN
+    main.renew_token()
+    assert token_server.posts == 2
+
+
+def test_failed_request_is_not_cached(token_server):
+    token_server.status = 400
+    main.renew_token()
+    assert not main.ACCESS_TOKEN
+    assert main.load_token_cache() == {}
+
+    token_server.status = 200
+    main.renew_token()
+    assert main.ACCESS_TOKEN == "token-2"
+
+
+def test_unauthorized_download_clears_cache(token_server, epd, monkeypatch):
+    main.renew_token()
+    monkeypatch.setattr(urequests, "handler", routes({
+        main.TOKEN_ENDPOINT: token_server,
+        "http://example/": lambda method, url, headers, data: urequests.Response(401),
+    }))
+    assert main.display_bmp_from_url("http://example/image.bmp", epd) is None
+    assert main.load_token_cache() == {}
+
+    main.renew_token()
+    assert token_server.posts == 2
+
+
+def test_key_is_parsed_once(token_server, monkeypatch):
+    main.renew_token()
+    # 次の起動では事前計算済みの鍵を読み込み、PEM は解析しない
+    monkeypatch.setattr(main, "private_key", None)
+    monkeypatch.setattr(main, "jwt_builder", None)
+    monkeypatch.setattr(main, "parse_private_key", None)
+    main.clear_token_cache()
+    main.renew_token()
+    assert token_server.posts == 2
+
+
+@pytest.mark.parametrize("status", [500, None])
+def test_failed_refresh_keeps_valid_cached_token(token_server, clock, monkeypatch, status):
+    main.renew_token()
+    clock.now = NOW + 3600 - main.TOKEN_REFRESH_MARGIN + 10 # 余裕はないが期限内
+    if status is None:
+        def unreachable(method, url, headers, data):
+            raise OSError("ECONNRESET")
+        monkeypatch.setattr(urequests, "handler", unreachable)
+    else:
+        token_server.status = status
+    main.renew_token()
+    assert main.ACCESS_TOKEN == "token-1"
+
+    # 期限が切れていれば使わない
+    clock.now = NOW + 3600
+    main.renew_token()
+    assert not main.ACCESS_TOKEN
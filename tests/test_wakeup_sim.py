@@ -0,0 +1,106 @@
+# 1回の起動 (main.main から deepsleep まで) を、時間を縮めた偽のハードウェアで動かし、
+# 同期版と asyncio版で処理の順番 (パネルの初期化と Wi-Fi 接続の重なり) を比べる。
+# 起動時間は比べずに記録するだけ (CI の負荷で揺れるため)。
+# 待ち時間 (sleep, Wi-Fi 接続, BUSY) は SCALE 倍に縮め、結果は元の時間 (ミリ秒) に戻す
+import asyncio
+import os
+import time
+
+import machine
+import mpcompat
+import network
+import pytest
+import urequests
+
+import bmpcorpus
+import epd3in0g
+import epd3in0g_async
+import main
+from fakeserver import ImageServer
+from panelsim import PanelSPI
+
+SCALE = 0.05
+WIFI_CONNECT_MS = 2500
+TOKEN_MS = 500
+
+
+@pytest.fixture
+def wakeup(workdir, monkeypatch):
+    monkeypatch.setattr(mpcompat, "time_scale", SCALE)
+    monkeypatch.setattr(time, "sleep", mpcompat.sleep)
+    monkeypatch.setattr(epd3in0g_async, "sleep_ms",
+                        lambda ms: asyncio.sleep(ms / 1000 * SCALE))
+    monkeypatch.setattr(epd3in0g, "SPI", PanelSPI)
+    monkeypatch.setattr(PanelSPI, "events", [])
+    monkeypatch.setattr(PanelSPI, "first_command", None)
+
+    monkeypatch.setattr(network.WLAN, "connect_delay_ms", WIFI_CONNECT_MS)
+    monkeypatch.setattr(main, "wlan", network.WLAN(network.STA_IF))
+    monkeypatch.setattr(main, "epd", None) # main() が create_epd() で作る
+
+    # credentials.json の代わり
+    monkeypatch.setattr(main, "load_config", lambda: None)
+    monkeypatch.setattr(main, "url", "http://example/image.bmp")
+    monkeypatch.setattr(main, "dither_mode", "none")
+    monkeypatch.setattr(main, "is_active_time", lambda: True)
+
+    def renew_token():
+        time.sleep_ms(TOKEN_MS) # JWTの署名とトークンの取得
+        main.ACCESS_TOKEN = "token"
+
+    monkeypatch.setattr(main, "renew_token", renew_token)
+    monkeypatch.setattr(urequests, "handler", ImageServer(bmpcorpus.bmp24(bmpcorpus.gradient())))
+
+    def run(async_main):
+        monkeypatch.setattr(main, "async_main", async_main)
+        PanelSPI.first_command = None
+        start = time.perf_counter()
+        with pytest.raises(machine.DeepSleep):
+            main.main()
+        return (time.perf_counter() - start) * 1000 / SCALE
+    return run
+
+
+def test_async_overlaps_reset_with_wifi(wakeup, record_property):
+    sync_ms = wakeup(False)
+    sync_refresh = PanelSPI.released(0x12)
+    sync_init = PanelSPI.first_command
+    sync_connect = main.wlan.connect_started_at
+    sync_wifi_off = main.wlan.disconnected_at
+    os.remove(main.FRAME_ROWS_FILE) # 同じ画像でも2回目もリフレッシュさせる
+    os.remove(main.IMAGE_CACHE_FILE)
+
+    async_ms = wakeup(True)
+    async_refresh = PanelSPI.released(0x12)
+    async_init = PanelSPI.first_command
+    async_connect = main.wlan.connect_started_at
+    async_wifi_off = main.wlan.disconnected_at
+    record_property("wakeup_sync_ms", round(sync_ms))
+    record_property("wakeup_async_ms", round(async_ms))
+
+    # 同期版はリセットが終わってから Wi-Fi に繋ぎ、
+    # asyncio版は Wi-Fi の接続を待つ間にリセットを終える
+    assert sync_init < sync_connect
+    assert async_connect < async_init < async_connect + WIFI_CONNECT_MS * SCALE / 1000
+    # 同期版はリフレッシュが終わってから、asyncio版はリフレッシュ中に Wi-Fi を切る
+    assert sync_wifi_off > sync_refresh
+    assert async_wifi_off < async_refresh
+    assert os.path.exists(main.FRAME_ROWS_FILE)
+    assert os.path.exists(main.IMAGE_CACHE_FILE)
+
+
+def test_commit_waits_for_refresh(wakeup, monkeypatch):
+    class ShortTimeoutEPD(epd3in0g_async.AsyncEPD):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, busy_timeout_ms=100, **kwargs)
+
+    monkeypatch.setattr(epd3in0g_async, "AsyncEPD", ShortTimeoutEPD)
+    monkeypatch.setitem(PanelSPI.busy_ms, 0x12, 3600000) # リフレッシュが終わらない
+    # BUSY が戻らなくてもリセットせずにディープスリープする
+    wakeup(True)
+    assert PanelSPI.released(0x12) is None
+    assert main.epd.busy_log[-1][0] == "power_on"
+
+    # リフレッシュが終わっていないので、キャッシュも行の CRC も保存しない
+    assert not os.path.exists(main.FRAME_ROWS_FILE)
+    assert not os.path.exists(main.IMAGE_CACHE_FILE)
@@ -0,0 +1,48 @@
+# bmp2epd.py
+# BMPをパネルにそのまま送れる .epd フレームに変換するホスト側のツール。
+# デバイスと同じ bmp.py / dither.py / epdframe.py を使うので、出力は
+# デバイスでBMPを変換した結果と一致する。
+#
+# 使い方: python tools/bmp2epd.py input.bmp output.epd [--dither bayer]
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import epdframe  # noqa: E402
+from bmp import BMPReader  # noqa: E402
+from dither import DITHER_ENGINES, build_color_lut  # noqa: E402
+
+
+def convert(src, dither_mode="bayer"):
+    """BMPのストリームを読み込み、.epd ファイルの内容 (ヘッダ + フレーム) を返す。"""
+    reader = BMPReader(src)
+    converter = epdframe.BMPFrameConverter(reader, dither_mode, lut=build_color_lut())
+    row_bytes = epdframe.row_bytes(reader.width)
+    frame = bytearray(epdframe.frame_size(reader.width, reader.height))
+    for y in range(reader.height):
+        converter.convert_row(y, frame, converter.panel_row(y) * row_bytes)
+    if reader.short_rows:
+        raise ValueError(f"BMP is truncated ({reader.short_rows} rows missing)")
+    header = epdframe.pack_header(reader.width, reader.height, epdframe.update_crc(frame))
+    return header + frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a BMP into a pre-packed .epd frame.")
+    parser.add_argument("input", help="input BMP file")
+    parser.add_argument("output", help="output .epd file")
+    parser.add_argument("--dither", default="bayer", choices=sorted(DITHER_ENGINES),
+                        help="dither mode (same as \"dither\" in credentials.json)")
+    args = parser.parse_args()
+
+    with open(args.input, "rb") as f:
+        data = convert(f, args.dither)
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print(f"Wrote {len(data)} bytes to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
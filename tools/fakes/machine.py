@@ -0,0 +1,173 @@
+# machine.py
+# ホスト (CPython) でテストやシミュレーションを動かすための machine モジュールの代わり。
+# Pin はテストからレベルを変えて割り込みを起こせる。SPI は書き込みを記録する。
+import threading
+
+import mpcompat
+
+
+class DeepSleep(BaseException):
+    """deepsleep() が呼ばれた (main() の except Exception では捕まらない)。"""
+
+
+class Reset(BaseException):
+    """reset() が呼ばれた。"""
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    # ピン番号 (または名前) → 最後に作った Pin
+    pins = {}
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self.pull = pull
+        self.level = 0 if value is None else value
+        self.handler = None
+        self.trigger = 0
+        self.falls = 0 # 1 → 0 の回数 (CS ならトランザクションの数)
+        self.irqs = 0  # 呼び出した割り込みハンドラの数
+        Pin.pins[id] = self
+
+    def value(self, level=None):
+        if level is None:
+            return self.level
+        self.drive(level)
+
+    def on(self):
+        self.drive(1)
+
+    def off(self):
+        self.drive(0)
+
+    high = on
+    low = off
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        self.handler = handler
+        self.trigger = trigger
+
+    def drive(self, level):
+        """レベルを変え、設定されたエッジなら割り込みハンドラを呼ぶ。"""
+        level = 1 if level else 0
+        old = self.level
+        self.level = level
+        if old == level:
+            return
+        if not level:
+            self.falls += 1
+        edge = Pin.IRQ_RISING if level else Pin.IRQ_FALLING
+        if self.handler is not None and self.trigger & edge:
+            self.irqs += 1
+            self.handler(self)
+
+    def glitch(self, level):
+        """一瞬だけ level にして元に戻す (割り込みは起きるが、レベルは元のまま)。"""
+        old = self.level
+        self.drive(level)
+        self.drive(old)
+
+
+class SPI:
+    """
+    書き込みを記録する SPI。dc に Pin を設定すると、書き込みごとの
+    DC のレベルも log に (DC, データ) で残す。
+    """
+
+    def __init__(self, id, baudrate=1000000, polarity=0, phase=0, bits=8, firstbit=0,
+                 sck=None, mosi=None, miso=None):
+        self.id = id
+        self.baudrate = baudrate
+        self.writes = 0
+        self.nbytes = 0
+        self.data = bytearray()
+        self.dc = None
+        self.log = []
+
+    def init(self, baudrate=None, **kwargs):
+        if baudrate is not None:
+            self.baudrate = baudrate
+
+    def deinit(self):
+        pass
+
+    def write(self, buf):
+        data = bytes(buf)
+        self.writes += 1
+        self.nbytes += len(data)
+        self.data += data
+        if self.dc is not None:
+            self.log.append((self.dc.value(), data))
+
+    def reset_counters(self):
+        self.writes = 0
+        self.nbytes = 0
+        self.data = bytearray()
+        self.log = []
+
+
+# idle() が呼ばれた回数と、その回数に達したら呼ぶ関数
+idle_count = 0
+_idle_events = []
+# after_ms() で予定したタイマー
+_timers = []
+
+
+def on_idle(count, func):
+    """これから count 回目の idle() で func() を呼ぶ (BUSY のエッジを起こすのに使う)。"""
+    _idle_events.append((idle_count + count, func))
+    _idle_events.sort(key=lambda event: event[0])
+
+
+def after_ms(ms, func):
+    """
+    ms ミリ秒 (mpcompat.time_scale をかける) 後に別のスレッドから func() を呼ぶ。
+    ハードウェアの処理時間 (BUSY の長さなど) を表すのに使う。func から Pin.drive() すると、
+    割り込みハンドラも実機と同じくメインの処理とは別のところから呼ばれる。
+    """
+    timer = threading.Timer(ms * mpcompat.time_scale / 1000, func)
+    timer.daemon = True
+    _timers.append(timer)
+    timer.start()
+
+
+def idle():
+    global idle_count
+    idle_count += 1
+    while _idle_events and _idle_events[0][0] <= idle_count:
+        _idle_events.pop(0)[1]()
+
+
+def lightsleep(ms=None):
+    idle()
+
+
+def deepsleep(ms=None):
+    raise DeepSleep(ms)
+
+
+def reset():
+    raise Reset()
+
+
+def freq(hz=None):
+    return 125000000
+
+
+def reset_state():
+    """テストごとに Pin の一覧と idle() やタイマーの予定を消す。"""
+    global idle_count
+    Pin.pins.clear()
+    idle_count = 0
+    del _idle_events[:]
+    for timer in _timers:
+        timer.cancel()
+    del _timers[:]
@@ -0,0 +1,55 @@
+# mpcompat.py
+# CPython の time / gc / sys に、このリポジトリが使う MicroPython 固有の関数を足す。
+# tools/fakes の machine などを import すると読み込まれる。
+import gc
+import sys
+import time
+import traceback
+
+# time.sleep_ms() で実際に待つ時間の倍率 (0 なら待たない)
+time_scale = 1.0
+
+_sleep = time.sleep
+
+
+def sleep(seconds):
+    """倍率をかけた time.sleep() (テストで time.sleep を差し替えて使う)。"""
+    if time_scale:
+        _sleep(seconds * time_scale)
+
+
+def sleep_ms(ms):
+    sleep(ms / 1000)
+
+
+def ticks_ms():
+    return int(time.perf_counter() * 1000)
+
+
+def ticks_us():
+    return int(time.perf_counter() * 1000000)
+
+
+def ticks_diff(end, start):
+    return end - start
+
+
+def ticks_add(ticks, delta):
+    return ticks + delta
+
+
+def print_exception(exc, file=None):
+    traceback.print_exception(type(exc), exc, exc.__traceback__, file=file)
+
+
+for _name, _func in (("sleep_ms", sleep_ms), ("ticks_ms", ticks_ms), ("ticks_us", ticks_us),
+                     ("ticks_diff", ticks_diff), ("ticks_add", ticks_add)):
+    if not hasattr(time, _name):
+        setattr(time, _name, _func)
+
+if not hasattr(gc, "mem_free"):
+    gc.mem_free = lambda: 0
+    gc.mem_alloc = lambda: 0
+
+if not hasattr(sys, "print_exception"):
+    sys.print_exception = print_exception
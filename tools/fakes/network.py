@@ -0,0 +1,40 @@
+# network.py
+# 偽の network モジュール。WLAN は connect() から connect_delay_ms 後に接続済みになる。
+import time
+
+import mpcompat  # noqa: F401
+
+STA_IF = 0
+AP_IF = 1
+
+
+class WLAN:
+    # connect() から接続済みになるまでの時間 (ミリ秒, time.sleep_ms と同じく倍率をかける)
+    connect_delay_ms = 0
+
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self._active = False
+        self._connected_at = None
+        self.connect_started_at = None
+        self.disconnected_at = None
+
+    def active(self, state=None):
+        if state is None:
+            return self._active
+        self._active = bool(state)
+
+    def connect(self, ssid=None, password=None):
+        delay = self.connect_delay_ms * mpcompat.time_scale / 1000
+        self.connect_started_at = time.perf_counter()
+        self._connected_at = self.connect_started_at + delay
+
+    def isconnected(self):
+        return self._connected_at is not None and time.perf_counter() >= self._connected_at
+
+    def disconnect(self):
+        self._connected_at = None
+        self.disconnected_at = time.perf_counter()
+
+    def ifconfig(self):
+        return ("192.168.0.2", "255.255.255.0", "192.168.0.1", "192.168.0.1")
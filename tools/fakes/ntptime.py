@@ -0,0 +1,7 @@
+# ntptime.py
+# 偽の ntptime モジュール。settime() は何もしない。
+host = "pool.ntp.org"
+
+
+def settime():
+    pass
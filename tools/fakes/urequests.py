@@ -0,0 +1,49 @@
+# urequests.py
+# 偽の urequests モジュール。リクエストは handler(method, url, headers, data) に渡し、
+# handler が返した Response をそのまま返す。テストで handler を差し替えて使う。
+import io
+import json as _json
+
+
+class Response:
+    def __init__(self, status_code=200, body=b"", headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.raw = io.BytesIO(body)
+        self.closed = False
+        self._body = body
+
+    @property
+    def content(self):
+        return self._body
+
+    @property
+    def text(self):
+        return self._body.decode()
+
+    def json(self):
+        return _json.loads(self._body)
+
+    def close(self):
+        self.closed = True
+
+
+def _no_server(method, url, headers, data):
+    raise OSError(f"no fake server for {method} {url}")
+
+
+handler = _no_server
+
+
+def request(method, url, data=None, json=None, headers=None, stream=None, timeout=None):
+    if json is not None:
+        data = _json.dumps(json)
+    return handler(method, url, headers or {}, data)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
@@ -0,0 +1,2 @@
+import mpcompat  # noqa: F401
+from time import *  # noqa: F401,F403
@@ -0,0 +1,75 @@
+# framediff_sim.py
+# 差分更新でパネルへ送るバイト数をホスト側で見積もるシミュレーション。
+# tools/fakes の machine モジュール (書き込みを数える SPI) を使い、
+# 合成したフレームの差分ごとに、全体の書き換えと部分リフレッシュの転送量を比べる。
+#
+# 使い方: python tools/framediff_sim.py
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools", "fakes"))
+
+import epdframe  # noqa: E402
+from epd3in0g import EPD  # noqa: E402
+
+
+class SimulatedEPD(EPD):
+    """BUSYを待たずに、送ったバイト数だけを記録する EPD。"""
+
+    def wait_busy(self, level, label="busy"):
+        return 0
+
+    def bytes_sent(self, update):
+        self.spi.reset_counters()
+        update()
+        return self.spi.nbytes
+
+
+def make_frame(epd, seed):
+    """行ごとに異なる内容のフレーム (seed を変えると全行が変わる)。"""
+    row_len = epdframe.row_bytes(epd.width)
+    frame = bytearray(epdframe.frame_size(epd.width, epd.height))
+    for y in range(epd.height):
+        frame[y * row_len:(y + 1) * row_len] = bytes([(y * 7 + seed) & 0xFF]) * row_len
+    return frame
+
+
+def change_rows(epd, frame, start, end):
+    row_len = epdframe.row_bytes(epd.width)
+    out = bytearray(frame)
+    for i in range(start * row_len, end * row_len):
+        out[i] ^= 0x55
+    return out
+
+
+def scenarios(epd, base):
+    yield "identical", base
+    yield "clock digits (rows 180-211)", change_rows(epd, base, 180, 212)
+    yield "single row (row 0)", change_rows(epd, base, 0, 1)
+    yield "header band (rows 0-47)", change_rows(epd, base, 0, 48)
+    yield "two bands (rows 20-39, 360-379)", change_rows(epd, change_rows(epd, base, 20, 40), 360, 380)
+    yield "whole frame", make_frame(epd, 1)
+
+
+def main():
+    epd = SimulatedEPD(0, 0, 0, 0)
+    base = make_frame(epd, 0)
+    base_rows = epdframe.row_crcs(base, epd.width)
+    full = epd.bytes_sent(lambda: epd.display(base))
+
+    print(f"{'scenario':34} {'rows':>9} {'full':>7} {'partial':>8} {'saved':>6}")
+    for name, frame in scenarios(epd, base):
+        changed = epdframe.diff_rows(base_rows, epdframe.row_crcs(frame, epd.width))
+        if changed is None:
+            print(f"{name:34} {'-':>9} {full:7} {0:8} {100:5}%")
+            continue
+        start, end = changed
+        partial = epd.bytes_sent(lambda: epd.display_partial(frame, start, end))
+        saved = 100 * (full - partial) // full
+        print(f"{name:34} {f'{start}-{end - 1}':>9} {full:7} {partial:8} {saved:5}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# spi_bench_sim.py
+# SPIベンチマークの設定選び (epd3in0g.benchmark_spi / select_spi_setting) を
+# ホスト側で確かめるシミュレーション。
+# tools/fakes の machine モジュールを使い、SPI はボーレートと1回の書き込みの
+# オーバーヘッドから転送時間を計算するものに差し替える。ceiling (配線やパネルが
+# 実際に受けられる上限) を超えるボーレートでは、転送時間は変わらずにパネル側の
+# データだけが壊れるとする。
+# 送信側の時間からはこれを見分けられないので、選ばれた設定が壊れるかどうかも表示する。
+#
+# 使い方: python tools/spi_bench_sim.py [--ceiling 16000000] [--overhead 20]
+import argparse
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools", "fakes"))
+
+import machine  # noqa: E402
+
+import epd3in0g  # noqa: E402
+import epdframe  # noqa: E402
+
+
+class VirtualClock:
+    """SPIの転送時間だけ進む時計 (マイクロ秒)。"""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return int(self.now)
+
+
+class BusModel:
+    clock = VirtualClock()
+    # RP2040 の SPI は clk_peri (125MHz) を偶数で割ったボーレートしか出せない
+    peripheral_clock = 125000000
+    ceiling = 16000000   # 配線やパネルの都合で正しく送れる上限
+    overhead_us = 20     # spi.write() 1回あたりのオーバーヘッド
+
+
+class ModelSPI(machine.SPI):
+    def __init__(self, spi_id, baudrate=1000000, **kwargs):
+        divisor = max(2, -(-BusModel.peripheral_clock // baudrate))
+        divisor += divisor % 2
+        super().__init__(spi_id, BusModel.peripheral_clock // divisor, **kwargs)
+
+    def write(self, buf):
+        self.writes += 1
+        self.nbytes += len(buf)
+        BusModel.clock.now += BusModel.overhead_us + len(buf) * 8 * 1000000 / self.baudrate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the SPI benchmark on the host.")
+    parser.add_argument("--ceiling", type=int, default=BusModel.ceiling,
+                        help="highest stable baudrate of the modelled bus")
+    parser.add_argument("--overhead", type=float, default=BusModel.overhead_us,
+                        help="overhead of one spi.write() call in microseconds")
+    args = parser.parse_args()
+    BusModel.ceiling = args.ceiling
+    BusModel.overhead_us = args.overhead
+    epd3in0g.SPI = ModelSPI
+
+    epd = epd3in0g.EPD(0, 0, 0, 0)
+    frame = bytearray([0x55]) * epdframe.frame_size(epd.width, epd.height)
+    results = epd3in0g.benchmark_spi(epd, frame, clock=BusModel.clock)
+    for baudrate, chunk, timings in results:
+        print(f"{baudrate:>9} Hz  chunk {chunk:>5}: {timings} us")
+
+    setting = epd3in0g.select_spi_setting(results)
+    print("selected:", setting)
+    if setting is not None:
+        epd.configure_spi(*setting)
+        if epd.spi.baudrate > BusModel.ceiling:
+            print(f"WARNING: {epd.spi.baudrate} Hz exceeds the bus ceiling; "
+                  "the panel would receive corrupted data with unchanged timings")
+
+
+if __name__ == "__main__":
+    main()